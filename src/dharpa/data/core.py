@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 import collections
 import copy
+import threading
 import typing
 import uuid
 from enum import Enum
 
+from dharpa.data.fingerprints import get_value_fingerprint
+from dharpa.data.frozen import freeze, is_frozen
+from dharpa.data.memory import PickledSpillFile
+
 
 class DataType(Enum):
     def __new__(cls, *args, **kwds):
@@ -25,6 +30,34 @@ class DataType(Enum):
     table = {"id": "table", "python": typing.List[typing.Dict]}
 
 
+class VersionCounter(object):
+    """A global, monotonic counter, used to version changes to values and module states."""
+
+    def __init__(self):
+
+        self._lock: threading.Lock = threading.Lock()
+        self._current: int = 0
+
+    @property
+    def current(self) -> int:
+        return self._current
+
+    def bump(self) -> int:
+
+        with self._lock:
+            self._current = self._current + 1
+            return self._current
+
+
+VERSIONS = VersionCounter()
+
+
+def get_current_version() -> int:
+    """Return the most recent version number that was handed out."""
+
+    return VERSIONS.current
+
+
 class DataSchema(object):
     def __init__(
         self,
@@ -73,16 +106,21 @@ class DataItem(object):
         self._id: str = str(uuid.uuid4())
         self._schema = schema
         self._value: typing.Any = None
+        self._released: bool = False
+        self._fingerprint: typing.Optional[str] = None
+        self._fingerprint_computed: bool = False
 
         self._is_streaming: bool = False
+        self._version: int = VERSIONS.bump()
 
         if self._schema.default:
             if callable(self._schema.default):
                 self._data: typing.Any = self._schema.default()
             else:
-                self._data = copy.deepcopy(self._schema.default)
+                # frozen values can be shared, so there's no need to copy the default
+                self._data = freeze(self._schema.default)
 
-        self._callbacks: typing.List[typing.Callable] = []
+        self._callbacks: typing.List[typing.Tuple[typing.Callable, bool]] = []
 
     @property
     def schema(self) -> DataSchema:
@@ -90,37 +128,163 @@ class DataItem(object):
 
     @property
     def value(self) -> typing.Any:
+        if isinstance(self._value, PickledSpillFile):
+            return self._value.load()
         return self._value
 
+    @property
+    def version(self) -> int:
+        """The version of the last change to this item."""
+        return self._version
+
+    @property
+    def fingerprint(self) -> typing.Optional[str]:
+        """The fingerprint of the current value, or 'None' if the value can't be fingerprinted.
+
+        The fingerprint is only computed once per value, and kept if the value is spilled or released.
+        """
+
+        if not self._fingerprint_computed:
+            self._fingerprint = get_value_fingerprint(self._value)
+            self._fingerprint_computed = True
+        return self._fingerprint
+
     @value.setter
     def value(self, value: typing.Any):
         self.set_value(value)
 
-    def set_value(self, value: typing.Any):
+    def _get_new_fingerprint(
+        self, value: typing.Any
+    ) -> typing.Tuple[bool, typing.Optional[str]]:
+        """Check whether a new value is equal to the current one, also returns the fingerprint of the new value."""
+
+        old_value = self._value
+        if self._released:
+            return (False, None)
+        if old_value is None or value is None:
+            return (old_value is None and value is None, None)
+        if (
+            type(value) is not type(old_value)
+            and not isinstance(value, PickledSpillFile)
+            and not isinstance(old_value, PickledSpillFile)
+        ):
+            return (False, None)
+        if value is old_value:
+            if is_frozen(value):
+                return (True, None)
+            if not self._fingerprint_computed:
+                # the value might have been changed in-place, there's no way to tell
+                return (False, None)
+
+        fingerprint = get_value_fingerprint(value)
+        if fingerprint is None:
+            return (False, None)
+        return (fingerprint == self.fingerprint, fingerprint)
+
+    def set_value(self, value: typing.Any) -> bool:
+        """Set a new value, callbacks are only triggered if it is different from the current value.
+
+        The value is frozen (see 'dharpa.data.frozen'), so it can be passed on to callbacks by reference.
+
+        Returns:
+            bool: whether the value changed
+        """
+
+        value = freeze(value)
+        unchanged, fingerprint = self._get_new_fingerprint(value)
+        if unchanged:
+            return False
+
         self._pre_value_set(value)
         old_value = self._value
         self._value = value
+        self._released = False
+        self._fingerprint = fingerprint
+        self._fingerprint_computed = fingerprint is not None
+        self._version = VERSIONS.bump()
         self._post_value_set(old_value)
         self._is_streaming = False
+        return True
 
     @property
     def valid(self) -> bool:
-        return self._value is not None
+        """Whether this item has a value.
+
+        Released items count as valid: their value was computed, and consumers that needed it already got it, but it
+        can't be read anymore (check 'is_released' before accessing it).
+        """
+        return self._value is not None or self._released
+
+    @property
+    def is_released(self) -> bool:
+        """Whether the value was released to free memory (the item still counts as valid, but its value is 'None')."""
+        return self._released
+
+    @property
+    def is_spilled(self) -> bool:
+        """Whether the value was spilled to disk, in which case it is read back from there on every access."""
+        return isinstance(self._value, PickledSpillFile)
+
+    def release(self) -> None:
+        """Drop the reference to the current value, without invalidating this item or triggering callbacks."""
+
+        # a fingerprint that wasn't computed so far can't be computed anymore
+        self._fingerprint_computed = True
+        self._value = None
+        self._released = True
+
+    def spill(self, spilled_value: PickledSpillFile) -> None:
+        """Replace the current value with a reference to its spilled copy, without triggering callbacks."""
+
+        # make sure the fingerprint is available without reading the value back
+        self.fingerprint
+        self._value = spilled_value
 
     def _pre_value_set(self, value_to_set: typing.Any):
         pass
 
     def _post_value_set(self, old_value: typing.Any):
 
-        for cb in self._callbacks:
-            cb(self.value)
+        value = None
+        for cb, pass_stored_value in self._callbacks:
+            if pass_stored_value:
+                # spilled values are passed on as references, they are only read back when accessed
+                cb(self._value)
+                continue
+            if value is None:
+                value = self.value
+            cb(value)
 
     @property
     def is_streaming(self) -> bool:
         return self._is_streaming
 
-    def add_callback(self, callback: typing.Callable):
-        self._callbacks.append(callback)
+    def add_callback(
+        self, callback: typing.Callable, pass_stored_value: bool = False
+    ):
+        """Add a callback that is called with the new value, every time the value changes.
+
+        Args:
+            callback: the callback
+            pass_stored_value: pass on the value as it is stored (e.g. a reference to a spilled value), only meant for links between data items
+        """
+        self._callbacks.append((callback, pass_stored_value))
+
+    def remove_callback(self, callback: typing.Callable) -> None:
+        """Remove a callback that was added with 'add_callback'."""
+
+        self._callbacks = [c for c in self._callbacks if c[0] is not callback]
+
+    def snapshot(self) -> "DataItem":
+        """Return a copy of this item that keeps the current value (and version), without callbacks.
+
+        Values are frozen, so they are shared with the snapshot, not copied.
+        """
+
+        item = copy.copy(self)
+        item._id = str(uuid.uuid4())
+        item._callbacks = []
+        return item
 
     def clone_item(
         self,
@@ -138,10 +302,12 @@ class DataItem(object):
                 for cb in callbacks:
                     item.add_callback(cb)
 
-        if copy_value:
-            item.value = copy.deepcopy(self.value)
-        else:
-            item.value = self.value
+        value = self.value
+        if copy_value and not is_frozen(value):
+            # only values that could be changed in-place need to be copied
+            value = copy.deepcopy(value)
+        item.value = value
+        return item
 
     def __hash__(self):
 
@@ -201,6 +367,12 @@ class DataItems(collections.abc.MutableMapping):
     def __len__(self):
         return len(self._data_items)
 
+    @property
+    def items__version(self) -> int:
+        """The version of the most recent change to any of these items."""
+
+        return max((item.version for item in self._data_items.values()), default=0)
+
     @property
     def items__are_valid(self) -> bool:
 
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Fingerprints of values, used to detect whether a value actually changed, and as keys for caching.
+
+A fingerprint is a short hex digest, computed from the structure and content of a value. Two values with the same
+fingerprint are considered equal. Fingerprints are designed to be fast to compute, and to never consider two
+different values equal: in rare cases (e.g. dicts with the same items in a different order inside of large tables)
+two equal values can have different fingerprints, which only means a change is detected where there is none.
+
+Values can provide their own (cheaper, or cached) fingerprint by implementing a 'get_fingerprint' method. Values of
+other types than the standard scalars and containers can't be fingerprinted, they are always considered changed.
+"""
+import collections.abc
+import hashlib
+import os
+import pickle
+import typing
+
+FINGERPRINT_CHUNK_SIZE = 1024
+"""The number of rows of a table that are hashed at once."""
+
+_PICKLED_TYPES = frozenset([type(None), bool, int, float, str, bytes])
+"""The types of values that are hashed by pickling them, if they are part of a table."""
+
+
+class _Unhashable(Exception):
+    pass
+
+
+def _create_hasher():
+    return hashlib.blake2b(digest_size=16)
+
+
+def _update(hasher, value: typing.Any) -> None:
+
+    value_type = type(value)
+    if value is None:
+        hasher.update(b"N;")
+    elif value_type is bool:
+        hasher.update(b"T;" if value else b"F;")
+    elif value_type is int:
+        hasher.update(b"i%d;" % value)
+    elif value_type is float:
+        hasher.update(b"f%s;" % repr(value).encode())
+    elif value_type is str:
+        data = value.encode("utf-8", "surrogatepass")
+        hasher.update(b"s%d:" % len(data))
+        hasher.update(data)
+    elif value_type is bytes:
+        hasher.update(b"b%d:" % len(value))
+        hasher.update(value)
+    elif isinstance(value, collections.abc.Mapping):
+        hasher.update(b"d%d:" % len(value))
+        try:
+            keys = sorted(value.keys())
+        except TypeError:
+            keys = sorted(value.keys(), key=repr)
+        for k in keys:
+            _update(hasher, k)
+            _update(hasher, value[k])
+    elif isinstance(value, (list, tuple)):
+        if len(value) > FINGERPRINT_CHUNK_SIZE:
+            _update_table(hasher, value)
+            return
+        hasher.update(b"%s%d:" % (b"t" if value_type is tuple else b"l", len(value)))
+        for v in value:
+            _update(hasher, v)
+    elif hasattr(value_type, "get_fingerprint"):
+        fingerprint = value.get_fingerprint()
+        if fingerprint is None:
+            raise _Unhashable()
+        hasher.update(b"x%s;" % fingerprint.encode())
+    elif isinstance(value, (set, frozenset)):
+        item_fingerprints = sorted(_get_fingerprint(v) for v in value)
+        hasher.update(b"S%d:" % len(item_fingerprints))
+        for fp in item_fingerprints:
+            hasher.update(fp.encode())
+    else:
+        # there's no reliable way to tell whether two objects of other types are equal (pickles of equal objects can
+        # differ, and pickles of different objects can be equal), so they are always considered changed
+        raise _Unhashable()
+
+
+def _get_row_data(row: typing.Any) -> typing.Any:
+    """Return the data of a row that is pickled to hash it, raises an exception for rows that can't be pickled as is."""
+
+    # rows are split into keys and values, so dict subclasses (e.g. frozen rows) are hashed like dicts
+    if isinstance(row, dict):
+        values = tuple(row.values())
+        if _PICKLED_TYPES.issuperset(map(type, values)):
+            return (tuple(row), values)
+    elif type(row) in _PICKLED_TYPES:
+        return row
+    # containers are hashed by their content instead, so frozen and plain ones are hashed the same way
+    raise _Unhashable()
+
+
+def _update_table(hasher, rows: typing.Sequence[typing.Any]) -> None:
+    """Hash a (long) list of rows chunk-wise, which is a lot faster than hashing every value on its own."""
+
+    hasher.update(b"r%d:" % len(rows))
+    for start in range(0, len(rows), FINGERPRINT_CHUNK_SIZE):
+        end = start + FINGERPRINT_CHUNK_SIZE
+        chunk = rows[start:end]
+        try:
+            data = pickle.dumps([_get_row_data(row) for row in chunk], protocol=4)
+        except Exception:
+            for row in chunk:
+                _update(hasher, row)
+            continue
+        hasher.update(b"%d:" % len(data))
+        hasher.update(data)
+
+
+def _get_fingerprint(value: typing.Any) -> str:
+
+    hasher = _create_hasher()
+    _update(hasher, value)
+    return hasher.hexdigest()
+
+
+def get_value_fingerprint(value: typing.Any) -> typing.Optional[str]:
+    """Return the fingerprint of a value, or 'None' if the value can't be fingerprinted.
+
+    Values without fingerprint are always considered changed.
+    """
+
+    if hasattr(type(value), "get_fingerprint"):
+        return value.get_fingerprint()
+    return get_content_fingerprint(value)
+
+
+def get_content_fingerprint(value: typing.Any) -> typing.Optional[str]:
+    """Return the fingerprint of a value, computed from its content (even if the value provides its own fingerprint)."""
+
+    try:
+        return _get_fingerprint(value)
+    except (_Unhashable, RecursionError):
+        return None
+
+
+def get_file_fingerprint(path: typing.Union[str, os.PathLike]) -> str:
+    """Return a fingerprint for a file, based on its location, size and modification time (not its content)."""
+
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return _get_fingerprint((path, stat.st_ino, stat.st_size, stat.st_mtime_ns))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Immutable values.
+
+Every value that is set on a data item is frozen: dicts become 'FrozenDict's, lists become 'FrozenList's (so tables
+become frozen lists of frozen dicts), and sets become frozensets. Frozen values can't be changed in-place, which means
+they can be passed between data items (and modules) by reference, without ever copying them.
+
+Freezing a value copies all (nested) containers that are not frozen yet, so a value that is set on a data item can't
+be changed through references the producer still holds. Frozen values it contains are shared as they are.
+
+Modules that want to change a value call 'mutable_copy()' on it: this returns a shallow, mutable copy, nested values
+stay frozen (and shared) until they are copied themselves (copy-on-write). 'thaw' returns a mutable deep copy.
+"""
+import collections.abc
+import typing
+
+from dharpa.data.fingerprints import get_content_fingerprint
+
+_SCALAR_TYPES = frozenset([type(None), bool, int, float, str, bytes])
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError(
+        f"'{self.__class__.__name__}' values are read-only, use 'mutable_copy()' to get a copy that can be changed."
+    )
+
+
+class FrozenDict(dict):
+    """A read-only dict, all nested values are frozen as well."""
+
+    __slots__ = ("_fingerprint",)
+
+    def __init__(self, data: typing.Any = None):
+
+        if data is None:
+            data = {}
+        super().__init__(data)
+        self._fingerprint: typing.Optional[str] = None
+        for k, v in dict.items(self):
+            if type(v) not in _FROZEN_TYPES:
+                dict.__setitem__(self, k, freeze(v))
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    __ior__ = _read_only  # type: ignore
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+
+    def mutable_copy(self) -> typing.Dict[typing.Any, typing.Any]:
+        """Return a mutable (shallow) copy of this dict, nested values are shared."""
+        return dict(self)
+
+    def get_fingerprint(self) -> typing.Optional[str]:
+
+        if self._fingerprint is None:
+            self._fingerprint = get_content_fingerprint(self)
+        return self._fingerprint
+
+    def __hash__(self):
+        return hash(self.get_fingerprint())
+
+    def __reduce__(self):
+        return (_restore_frozen_dict, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class FrozenList(list):
+    """A read-only list, all items are frozen as well."""
+
+    __slots__ = ("_fingerprint",)
+
+    def __init__(self, data: typing.Iterable[typing.Any] = ()):
+
+        super().__init__(data)
+        self._fingerprint: typing.Optional[str] = None
+        for i, v in enumerate(list.__iter__(self)):
+            if type(v) not in _FROZEN_TYPES:
+                list.__setitem__(self, i, freeze(v))
+
+    def __reversed__(self):
+        return reversed(self[:])
+
+    def __add__(self, other):
+        return self.mutable_copy() + other
+
+    def __mul__(self, n):
+        return self.mutable_copy() * n
+
+    __rmul__ = __mul__
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    __iadd__ = _read_only  # type: ignore
+    __imul__ = _read_only  # type: ignore
+    append = _read_only
+    clear = _read_only
+    extend = _read_only
+    insert = _read_only
+    pop = _read_only
+    remove = _read_only
+    reverse = _read_only
+    sort = _read_only
+
+    def mutable_copy(self) -> typing.List[typing.Any]:
+        """Return a mutable (shallow) copy of this list, nested values are shared."""
+        return list(self)
+
+    copy = mutable_copy
+
+    def get_fingerprint(self) -> typing.Optional[str]:
+
+        if self._fingerprint is None:
+            self._fingerprint = get_content_fingerprint(self)
+        return self._fingerprint
+
+    def __hash__(self):
+        return hash(self.get_fingerprint())
+
+    def __reduce__(self):
+        return (_restore_frozen_list, (list(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+_FROZEN_TYPES = _SCALAR_TYPES | {FrozenDict, FrozenList}
+
+
+def _restore_frozen_dict(data: typing.Dict[typing.Any, typing.Any]) -> FrozenDict:
+
+    # pickled values were frozen already
+    result = FrozenDict.__new__(FrozenDict)
+    dict.update(result, data)
+    result._fingerprint = None
+    return result
+
+
+def _restore_frozen_list(data: typing.List[typing.Any]) -> FrozenList:
+
+    result = FrozenList.__new__(FrozenList)
+    list.extend(result, data)
+    result._fingerprint = None
+    return result
+
+
+def is_frozen(value: typing.Any) -> bool:
+    """Whether a value can be shared safely, because it (and everything it contains) can't be changed in-place."""
+
+    value_type = type(value)
+    if value_type in _FROZEN_TYPES:
+        return True
+    if value_type is tuple or value_type is frozenset:
+        return all(is_frozen(v) for v in value)
+    return False
+
+
+def freeze(value: typing.Any) -> typing.Any:
+    """Return an immutable version of a value, frozen values are returned as they are.
+
+    Values of other types than the standard containers (e.g. lazy tables) are returned unchanged.
+    """
+
+    # exact type checks first, since this is called for every row of a table
+    value_type = type(value)
+    if value_type in _FROZEN_TYPES:
+        return value
+    if value_type is dict:
+        return FrozenDict(value)
+    if value_type is list:
+        return FrozenList(value)
+    if value_type is tuple:
+        return tuple([freeze(v) for v in value])
+    if value_type is set or value_type is frozenset:
+        return frozenset([freeze(v) for v in value])
+
+    if isinstance(value, collections.abc.MutableMapping):
+        return FrozenDict(value)
+    if isinstance(value, list):
+        return FrozenList(value)
+    return value
+
+
+def thaw(value: typing.Any) -> typing.Any:
+    """Return a mutable deep copy of a (frozen) value."""
+
+    if isinstance(value, collections.abc.Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    if type(value) is tuple:
+        return tuple([thaw(v) for v in value])
+    if type(value) is frozenset:
+        return {thaw(v) for v in value}
+    return value
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import atexit
+import collections.abc
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import typing
+import weakref
+
+from dharpa.data.fingerprints import get_value_fingerprint
+
+if typing.TYPE_CHECKING:
+    from dharpa.data.core import DataItem
+
+
+_DEFAULT_SPILL_DIR: typing.Optional[str] = None
+
+
+def get_default_spill_dir() -> str:
+    """Return a temporary folder to spill values into, shared within this process and deleted on exit."""
+
+    global _DEFAULT_SPILL_DIR
+    if _DEFAULT_SPILL_DIR is None:
+        _DEFAULT_SPILL_DIR = tempfile.mkdtemp(prefix="dharpa_spill_")
+        atexit.register(shutil.rmtree, _DEFAULT_SPILL_DIR, ignore_errors=True)
+    return _DEFAULT_SPILL_DIR
+
+
+def estimate_size(value: typing.Any, _seen: typing.Optional[typing.Set[int]] = None) -> int:
+    """Estimate the memory used by a value (including the values it contains), in bytes."""
+
+    if _seen is None:
+        _seen = set()
+
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, bytearray)):
+        return size
+    if isinstance(value, collections.abc.Mapping):
+        for k, v in value.items():
+            size = size + estimate_size(k, _seen) + estimate_size(v, _seen)
+    elif isinstance(value, list):
+        for v in value:
+            size = size + estimate_size(v, _seen)
+    elif isinstance(value, (tuple, set, frozenset)):
+        for v in value:
+            size = size + estimate_size(v, _seen)
+    return size
+
+
+class PickledSpillFile(object):
+    """A reference to a value that was spilled into a (pickle) file.
+
+    The whole value is unpickled from the file every time it is accessed, it is never cached (so it doesn't take up
+    memory between accesses). The file is deleted once the last reference to this object is gone.
+    """
+
+    def __init__(
+        self,
+        value: typing.Any,
+        spill_dir: str,
+        fingerprint: typing.Optional[str] = None,
+    ):
+
+        fd, path = tempfile.mkstemp(prefix="value_", suffix=".pickle", dir=spill_dir)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self._path: str = path
+        self._finalizer = weakref.finalize(self, os.remove, path)
+        self._fingerprint: typing.Optional[str] = fingerprint
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def load(self) -> typing.Any:
+
+        with open(self._path, "rb") as f:
+            return pickle.load(f)
+
+    def get_fingerprint(self) -> typing.Optional[str]:
+        """Return the fingerprint of the spilled value (this only reads the value back if it wasn't provided)."""
+
+        if self._fingerprint is None:
+            self._fingerprint = get_value_fingerprint(self.load())
+        return self._fingerprint
+
+    def __repr__(self):
+        return f"PickledSpillFile(path={self._path})"
+
+
+class MemoryBudget(object):
+    """Keeps the memory used by intermediate values of a workflow run within a budget.
+
+    Values are registered together with all the data items that reference them, and the number of consumers
+    that still need to read them. Once all consumers are finished, the value is released from all of its items. If the
+    memory used by the remaining values exceeds the budget, the largest of them are spilled into pickle files.
+
+    Args:
+        max_bytes: the memory budget, in bytes
+        spill_dir: the folder to spill values into (a temporary folder that is deleted on exit, if not provided)
+    """
+
+    def __init__(self, max_bytes: int, spill_dir: typing.Optional[str] = None):
+
+        self._max_bytes: int = max_bytes
+        self._spill_dir: typing.Optional[str] = spill_dir
+
+        self._items: typing.Dict[str, typing.List["DataItem"]] = {}
+        self._consumers: typing.Dict[str, int] = {}
+        self._keep: typing.Dict[str, bool] = {}
+        self._sizes: typing.Dict[str, int] = {}
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    @property
+    def spill_dir(self) -> str:
+        if self._spill_dir is None:
+            self._spill_dir = get_default_spill_dir()
+        return self._spill_dir
+
+    def add_value(
+        self,
+        key: str,
+        items: typing.Iterable["DataItem"],
+        consumers: int,
+        keep: bool = False,
+    ) -> None:
+        """Register a value that was just produced.
+
+        Args:
+            key: a unique key for the value
+            items: all data items that reference the value
+            consumers: the number of consumers that need to read the value before it can be released
+            keep: whether the value must be kept around after all consumers are finished (e.g. workflow outputs)
+        """
+
+        _items = list(items)
+        self._items[key] = _items
+        self._consumers[key] = consumers
+        self._keep[key] = keep
+        self._sizes[key] = estimate_size(_items[0]._value) if _items else 0
+
+        if consumers <= 0 and not keep:
+            self._release(key)
+
+    def consumer_finished(self, key: str) -> None:
+        """Mark that one of the consumers of a value doesn't need it anymore."""
+
+        if key not in self._consumers.keys():
+            return
+
+        self._consumers[key] = self._consumers[key] - 1
+        if self._consumers[key] <= 0 and not self._keep[key]:
+            self._release(key)
+
+    def _release(self, key: str) -> None:
+
+        for item in self._items.pop(key):
+            item.release()
+        self._sizes.pop(key)
+        self._consumers.pop(key)
+        self._keep.pop(key)
+
+    def enforce(self) -> None:
+        """Spill the largest values that are still in memory, until the used memory is within the budget."""
+
+        used = self.used_bytes
+        if used <= self._max_bytes:
+            return
+
+        for key, size in sorted(self._sizes.items(), key=lambda x: x[1], reverse=True):
+            if size == 0:
+                break
+            items = self._items[key]
+            spilled = PickledSpillFile(
+                items[0].value,
+                spill_dir=self.spill_dir,
+                fingerprint=items[0].fingerprint,
+            )
+            for item in items:
+                item.spill(spilled)
+            self._sizes[key] = 0
+            used = used - size
+            if used <= self._max_bytes:
+                break
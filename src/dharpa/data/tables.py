@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+import collections.abc
+import csv
+import json
+import mmap
+import os
+import threading
+import typing
+from abc import ABCMeta, abstractmethod
+from array import array
+from pathlib import Path
+
+from dharpa.data.fingerprints import get_file_fingerprint, get_value_fingerprint
+
+
+class LazyTable(collections.abc.Sequence, metaclass=ABCMeta):
+    """Base class for read-only tables whose rows are only loaded/parsed when they are accessed.
+
+    Rows are returned as dicts, so a lazy table can be used wherever a table value (a list of dicts) is expected.
+    Pickling a lazy table only pickles the reference to the underlying file. Tables can be shared between threads.
+    """
+
+    def __init__(self, path: typing.Union[str, Path]):
+
+        if isinstance(path, str):
+            path = Path(os.path.expanduser(path))
+
+        self._path: Path = path
+        # guards the (lazily built) state that is needed to read rows
+        self._lock: threading.RLock = threading.RLock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @abstractmethod
+    def _get_row(self, index: int) -> typing.Dict[str, typing.Any]:
+        pass
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            return [self._get_row(i) for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index = len(self) + index
+        if index < 0:
+            raise IndexError("table index out of range")
+        return self._get_row(index)
+
+    def __reduce__(self):
+        return (self.__class__, (str(self._path),))
+
+    def get_fingerprint(self) -> typing.Optional[str]:
+        """Return the fingerprint of this table, which is based on the file and the options it is read with.
+
+        This doesn't read the file, so it takes constant time for any table size.
+        """
+
+        cls, args = self.__reduce__()[0:2]
+        return get_value_fingerprint(
+            (cls.__name__, args[1:], get_file_fingerprint(self._path))
+        )
+
+    def get_reference(self) -> typing.Dict[str, typing.Any]:
+        """Return a reference to this table (its type, file, fingerprint and number of rows), without loading its rows."""
+
+        return {
+            "table_type": self.__class__.__name__,
+            "path": str(self._path),
+            "fingerprint": self.get_fingerprint(),
+            "rows": len(self),
+        }
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(path={self._path})"
+
+
+class MemoryMappedLinesTable(LazyTable):
+    """A lazy table, backed by a memory-mapped text file with one row per line (or per record).
+
+    The offsets of rows are indexed incrementally, only as far as rows are accessed. Only calling 'len()' requires
+    the whole file to be scanned once.
+    """
+
+    def __init__(self, path: typing.Union[str, Path], encoding: str = "utf-8"):
+
+        super().__init__(path=path)
+        self._encoding: str = encoding
+
+        self._mmap: typing.Optional[typing.Union[mmap.mmap, bytes]] = None
+        self._offsets: array = None  # type: ignore
+        self._fully_indexed: bool = False
+
+    @property
+    def data(self) -> typing.Union[mmap.mmap, bytes]:
+
+        if self._mmap is None:
+            with self._lock:
+                if self._mmap is None:
+                    with open(self._path, "rb") as f:
+                        if os.fstat(f.fileno()).st_size == 0:
+                            # empty files can't be memory-mapped
+                            self._mmap = b""
+                        else:
+                            self._mmap = mmap.mmap(
+                                f.fileno(), 0, access=mmap.ACCESS_READ
+                            )
+        return self._mmap  # type: ignore
+
+    def _find_record_end(self, start: int) -> int:
+        """Return the offset after the end of the record that starts at 'start'."""
+
+        end = self.data.find(b"\n", start)
+        if end == -1:
+            return len(self.data)
+        return end + 1
+
+    def _data_start(self) -> int:
+        return 0
+
+    def _index_to(self, index: int) -> array:
+        """Index the offsets of all rows up to the provided one, and return the offsets."""
+
+        with self._lock:
+            if self._offsets is None:
+                self._offsets = array("q", [self._data_start()])
+
+            data = self.data
+            size = len(data)
+            offsets = self._offsets
+            while not self._fully_indexed and len(offsets) <= index + 1:
+                start = offsets[-1]
+                if start >= size:
+                    self._fully_indexed = True
+                    break
+                end = self._find_record_end(start)
+                if not data[start:end].strip():
+                    # skip empty lines
+                    offsets[-1] = end
+                    continue
+                offsets.append(end)
+            return offsets
+
+    def _get_record(self, index: int) -> str:
+
+        with self._lock:
+            offsets = self._index_to(index)
+            if index + 1 >= len(offsets):
+                raise IndexError("table index out of range")
+            start = offsets[index]
+            end = offsets[index + 1]
+            data = self.data
+        return data[start:end].decode(self._encoding)
+
+    def __len__(self) -> int:
+
+        with self._lock:
+            offsets = self._index_to(-1 if self._fully_indexed else 2 ** 62)
+            return len(offsets) - 1
+
+    def close(self) -> None:
+
+        with self._lock:
+            if isinstance(self._mmap, mmap.mmap):
+                self._mmap.close()
+            self._mmap = None
+            self._offsets = None  # type: ignore
+            self._fully_indexed = False
+
+    def __del__(self):
+        self.close()
+
+
+class CsvTable(MemoryMappedLinesTable):
+    """A lazy table, backed by a memory-mapped CSV file (the first row must contain the column names)."""
+
+    def __init__(
+        self,
+        path: typing.Union[str, Path],
+        delimiter: str = ",",
+        encoding: str = "utf-8",
+    ):
+
+        super().__init__(path=path, encoding=encoding)
+        self._delimiter: str = delimiter
+        self._header: typing.Optional[typing.List[str]] = None
+        self._header_end: int = 0
+
+    def __reduce__(self):
+        return (self.__class__, (str(self._path), self._delimiter, self._encoding))
+
+    def _find_record_end(self, start: int) -> int:
+
+        # quoted fields can contain newlines, so a record only ends at a newline outside of quotes
+        data = self.data
+        end = start
+        quotes = 0
+        while True:
+            next_end = super()._find_record_end(end)
+            quotes = quotes + data[end:next_end].count(b'"')
+            end = next_end
+            if quotes % 2 == 0 or end >= len(data):
+                return end
+
+    @property
+    def header(self) -> typing.List[str]:
+
+        if self._header is None:
+            with self._lock:
+                if self._header is None:
+                    end = self._find_record_end(0)
+                    line = self.data[0:end].decode(self._encoding)
+                    self._header_end = end
+                    self._header = next(
+                        csv.reader(
+                            line.splitlines(keepends=True), delimiter=self._delimiter
+                        ),
+                        [],
+                    )
+        return self._header  # type: ignore
+
+    def _data_start(self) -> int:
+
+        self.header
+        return self._header_end
+
+    def _get_row(self, index: int) -> typing.Dict[str, typing.Any]:
+
+        record = self._get_record(index)
+        values = next(
+            csv.reader(record.splitlines(keepends=True), delimiter=self._delimiter)
+        )
+        return dict(zip(self.header, values))
+
+
+class JsonLinesTable(MemoryMappedLinesTable):
+    """A lazy table, backed by a memory-mapped JSON-lines file (one json object per line)."""
+
+    def __reduce__(self):
+        return (self.__class__, (str(self._path), self._encoding))
+
+    def _get_row(self, index: int) -> typing.Dict[str, typing.Any]:
+        return json.loads(self._get_record(index))
+
+
+class ParquetTable(LazyTable):
+    """A lazy table, backed by a memory-mapped Parquet file, loaded one row group at a time.
+
+    This requires the 'pyarrow' package to be installed.
+    """
+
+    def __init__(self, path: typing.Union[str, Path]):
+
+        super().__init__(path=path)
+
+        self._parquet_file: typing.Any = None
+        self._row_group_offsets: typing.List[int] = None  # type: ignore
+        self._cached_row_group: typing.Optional[int] = None
+        self._cached_rows: typing.List[typing.Dict[str, typing.Any]] = []
+
+    @property
+    def parquet_file(self) -> typing.Any:
+
+        if self._parquet_file is None:
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise Exception(
+                    "Can't load parquet file, package 'pyarrow' not available. Please install it into the current virtualenv."
+                )
+
+            with self._lock:
+                if self._parquet_file is None:
+                    parquet_file = pq.ParquetFile(str(self._path), memory_map=True)
+                    offsets = [0]
+                    for i in range(parquet_file.num_row_groups):
+                        offsets.append(
+                            offsets[-1] + parquet_file.metadata.row_group(i).num_rows
+                        )
+                    self._row_group_offsets = offsets
+                    self._parquet_file = parquet_file
+        return self._parquet_file
+
+    def __len__(self) -> int:
+        return self.parquet_file.metadata.num_rows
+
+    def _get_row(self, index: int) -> typing.Dict[str, typing.Any]:
+
+        if index >= len(self):
+            raise IndexError("table index out of range")
+
+        offsets = self._row_group_offsets
+        row_group = 0
+        while offsets[row_group + 1] <= index:
+            row_group = row_group + 1
+
+        with self._lock:
+            if self._cached_row_group != row_group:
+                self._cached_rows = self.parquet_file.read_row_group(
+                    row_group
+                ).to_pylist()
+                self._cached_row_group = row_group
+            rows = self._cached_rows
+
+        return rows[index - offsets[row_group]]
+
+
+TABLE_FORMATS: typing.Dict[str, typing.Type[LazyTable]] = {
+    "csv": CsvTable,
+    "jsonl": JsonLinesTable,
+    "parquet": ParquetTable,
+}
+
+TABLE_FORMAT_EXTENSIONS: typing.Dict[str, str] = {
+    "csv": "csv",
+    "tsv": "csv",
+    "jsonl": "jsonl",
+    "ndjson": "jsonl",
+    "parquet": "parquet",
+    "pq": "parquet",
+}
+
+
+def open_lazy_table(
+    path: typing.Union[str, Path],
+    table_format: typing.Optional[str] = None,
+    **options: typing.Any,
+) -> LazyTable:
+    """Open a file as lazy table, if no format is provided, it is determined by the file extension."""
+
+    if isinstance(path, str):
+        path = Path(os.path.expanduser(path))
+
+    if table_format is None:
+        ext = path.name.rsplit(".", maxsplit=1)[-1].lower()
+        table_format = TABLE_FORMAT_EXTENSIONS.get(ext, None)
+        if table_format is None:
+            raise ValueError(
+                f"Can't determine table format for file '{path}', supported extensions: {', '.join(TABLE_FORMAT_EXTENSIONS.keys())}"
+            )
+        if ext == "tsv":
+            options.setdefault("delimiter", "\t")
+
+    table_cls = TABLE_FORMATS.get(table_format, None)
+    if table_cls is None:
+        raise ValueError(
+            f"Invalid table format '{table_format}', supported formats: {', '.join(TABLE_FORMATS.keys())}"
+        )
+
+    if not path.is_file():
+        raise ValueError(f"Can't open table, not a file: {path}")
+
+    return table_cls(path, **options)  # type: ignore
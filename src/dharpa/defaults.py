@@ -22,10 +22,21 @@ DHARPA_TOOLBOX_DEFAULT_WORKFLOWS_FOLDER = os.path.join(
     DHARPA_TOOLBOX_RESOURCES_FOLDER, "workflows"
 )
 
+DHARPA_TOOLBOX_CHECKPOINTS_FOLDER = os.path.join(
+    dharpa_app_dirs.user_cache_dir, "checkpoints"
+)
+"""Default folder to store checkpoints of module outputs in."""
+
+DHARPA_TOOLBOX_RUNTIME_STATS_FILE = os.path.join(
+    dharpa_app_dirs.user_data_dir, "runtime_stats.json"
+)
+"""Default file to store the runtime statistics of module types in."""
+
 VALID_WORKFLOW_FILE_EXTENSIONS = ["yaml", "yml", "json"]
 DEFAULT_MODULES_TO_LOAD = (
     "dharpa.processing.core.logic_gates",
     "dharpa.processing.core.dummy",
+    "dharpa.processing.core.corpus",
 )
 
 MODULE_TYPE_KEY = "module_type"
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import asyncclick as click
+import json
 import sys
 import typing
 from rich import print as rich_print
@@ -10,7 +11,10 @@ from dharpa.processing.processing_module import (
     ProcessingModule,
     get_doc_from_module_class,
 )
+from dharpa.processing.remote import DEFAULT_WORKER_PORT, WorkerServer
 from dharpa.utils import get_data_from_file
+from dharpa.workflows.checkpoints import CheckpointStore
+from dharpa.workflows.sweeps import ParameterSweep
 from dharpa.workflows.workflow import DharpaWorkflow, WorkflowProcessingModule
 
 # workflow_descriptions_folder = (
@@ -19,6 +23,39 @@ from dharpa.workflows.workflow import DharpaWorkflow, WorkflowProcessingModule
 # load_workflows(workflow_descriptions_folder)
 
 
+def _parse_sweep_parameters(
+    parameters: typing.Iterable[str],
+) -> typing.Dict[str, typing.List[typing.Any]]:
+    """Parse parameters of the form 'name=value1,value2', values are parsed as json (if possible)."""
+
+    result: typing.Dict[str, typing.List[typing.Any]] = {}
+    for parameter in parameters:
+        if "=" not in parameter:
+            raise click.BadParameter(
+                f"Invalid parameter '{parameter}', must be of the form 'name=value1,value2,...'"
+            )
+        name, values = parameter.split("=", maxsplit=1)
+        parsed = []
+        for value in values.split(","):
+            try:
+                parsed.append(json.loads(value))
+            except ValueError:
+                parsed.append(value)
+        result.setdefault(name, []).extend(parsed)
+    return result
+
+
+def _get_type_name(prop: typing.Mapping[str, typing.Any]) -> str:
+    """Return the type of a property of a json schema, nested models are referenced by their name."""
+
+    if "type" in prop.keys():
+        return prop["type"]
+    for ref in [prop, *prop.get("allOf", [])]:
+        if "$ref" in ref.keys():
+            return ref["$ref"].rsplit("/", maxsplit=1)[-1]
+    return "any"
+
+
 @click.group()
 async def cli():
     pass
@@ -34,6 +71,11 @@ def run():
     pass
 
 
+@module.group()
+def sweep():
+    pass
+
+
 @module.group()
 def state_json():
     pass
@@ -55,23 +97,121 @@ for name in dharpa.DHARPA_MODULES.all_names:
             ignore_unknown_options=True,
         ),
     )
+    @click.option(
+        "--checkpoints",
+        "-c",
+        help="save the outputs of all (child-)modules, and resume from previously saved ones",
+        is_flag=True,
+        default=False,
+    )
+    @click.option(
+        "--output",
+        "-o",
+        help="only compute this output (and skip all modules that are not needed for it), can be used multiple times",
+        multiple=True,
+    )
+    @click.option(
+        "--continue-on-error",
+        "-e",
+        help="keep processing independent modules if a module fails",
+        is_flag=True,
+        default=False,
+    )
     @click.argument("path_to_inputs", nargs=1, required=False)
-    async def module_run_command(path_to_inputs, name=name):
+    async def module_run_command(
+        path_to_inputs, checkpoints, output, continue_on_error, name=name
+    ):
 
         dw: DharpaWorkflow = dharpa.create_workflow(name)
+        if checkpoints and dw.is_pipeline:
+            dw.checkpoint_store = CheckpointStore()
+        if continue_on_error and dw.is_pipeline:
+            dw.continue_on_error = True
         if path_to_inputs:
             inputs = get_data_from_file(path_to_inputs)
             dw.inputs = inputs
 
         if dw.state != ModuleState.STALE:
-            await dw.process()
+            if output and dw.is_pipeline:
+                await dw.process(outputs=output)
+            else:
+                await dw.process()
             print("\nResult:\n")
             print(dw.outputs.ALL)
+            if dw.is_pipeline and dw.last_run_stats and dw.last_run_stats.errors:
+                print("\nFailed modules:\n")
+                for k, v in dw.last_run_stats.errors.items():
+                    print(f"  {k}: {v}")
         else:
             print("Not all inputs ready.")
             for k, v in dw.inputs.items():
                 print(f"  {k}: {v.value}")
 
+    short_help = f"execute workflow '{name}' for every combination of the provided input values"
+
+    @sweep.command(
+        name=name,
+        short_help=short_help,
+        context_settings=dict(
+            ignore_unknown_options=True,
+        ),
+    )
+    @click.option(
+        "--parameter",
+        "-p",
+        help="the values of a swept input, in the form 'name=value1,value2,...' (values are parsed as json, if possible), can be used multiple times",
+        multiple=True,
+    )
+    @click.option(
+        "--grid",
+        "-g",
+        help="a json or yaml file that contains the values of all swept inputs, keyed by input name",
+        type=click.Path(exists=True, dir_okay=False),
+    )
+    @click.option(
+        "--continue-on-error",
+        "-e",
+        help="keep processing independent modules if a module fails",
+        is_flag=True,
+        default=False,
+    )
+    @click.argument("path_to_inputs", nargs=1, required=False)
+    async def module_sweep_command(
+        path_to_inputs, parameter, grid, continue_on_error, name=name
+    ):
+
+        dw: DharpaWorkflow = dharpa.create_workflow(name)
+        if not dw.is_pipeline:
+            print(f"Module '{name}' is not a workflow, only workflows can be swept.")
+            sys.exit(1)
+        if continue_on_error:
+            dw.continue_on_error = True
+        if path_to_inputs:
+            inputs = get_data_from_file(path_to_inputs)
+            dw.inputs = inputs
+
+        parameters: typing.Dict[str, typing.List[typing.Any]] = {}
+        if grid:
+            parameters.update(get_data_from_file(grid))
+        parameters.update(_parse_sweep_parameters(parameter))
+        if not parameters:
+            print("No swept inputs provided.")
+            sys.exit(1)
+
+        workflow_sweep = ParameterSweep(dw, parameters)
+        print(
+            f"\nProcessing {len(workflow_sweep.combinations)} combinations, modules are processed:\n"
+        )
+        for module_id, variants in workflow_sweep.module_variants.items():
+            print(f"  {module_id}: {variants} time(s)")
+
+        runs = await workflow_sweep.process()
+        for combination, workflow_run in zip(workflow_sweep.combinations, runs):
+            print(f"\nResult ({', '.join(f'{k}={v}' for k, v in combination.items())}):\n")
+            print(workflow_run.outputs.ALL)
+            if workflow_run.error:
+                print(f"\nError: {workflow_run.error}")
+
     short_help = f"print the state of module '{name}' as json"
 
     @state_json.command(  # noqa
@@ -163,9 +303,11 @@ def info(module_names):
             else:
                 n_str = f"    [i]{name}[/i]:"
             rich_print(n_str)
-            rich_print(f"      [i]type[/i]: {prop['type']}")
+            rich_print(f"      [i]type[/i]: {_get_type_name(prop)}")
             if prop.get("default", None) is not None:
                 rich_print(f"      [i]required[/i]: no (default: {prop['default']})")
+            elif name not in schema.get("required", []):
+                rich_print("      [i]required[/i]: no")
             else:
                 rich_print("      [i]required[/i]: yes")
 
@@ -198,15 +340,59 @@ def list(details: bool = False):
                 else:
                     n_str = f"    [i]{name}[/i]:"
                 rich_print(n_str)
-                rich_print(f"      [i]type[/i]: {prop['type']}")
+                rich_print(f"      [i]type[/i]: {_get_type_name(prop)}")
                 if prop.get("default", None) is not None:
                     rich_print(
                         f"      [i]required[/i]: no (default: {prop['default']})"
                     )
+                elif name not in schema.get("required", []):
+                    rich_print("      [i]required[/i]: no")
                 else:
                     rich_print("      [i]required[/i]: yes")
 
 
+@cli.command()
+@click.option(
+    "--host",
+    help="the interface to listen on",
+    default="127.0.0.1",
+    show_default=True,
+)
+@click.option(
+    "--port",
+    "-p",
+    help="the port to listen on",
+    type=int,
+    default=DEFAULT_WORKER_PORT,
+    show_default=True,
+)
+@click.option(
+    "--heartbeat-interval",
+    help="the interval (in seconds) of heartbeats while processing",
+    type=float,
+    default=1.0,
+    show_default=True,
+)
+@click.option(
+    "--warmup",
+    "-w",
+    help="set up the (pooled) modules of this module type or workflow before accepting tasks, can be used multiple times",
+    multiple=True,
+)
+def worker(host, port, heartbeat_interval, warmup):
+    """Start a worker that processes modules for remote clients."""
+
+    server = WorkerServer(host=host, port=port, heartbeat_interval=heartbeat_interval)
+    if warmup:
+        print(f"warming up: {', '.join(warmup)}", file=sys.stderr)
+        server.warmup(*warmup)
+    print(f"worker listening on: {server.address}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
 def main():
     cli()
 
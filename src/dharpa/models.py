@@ -18,6 +18,7 @@ class ModuleState(Enum):
     INPUTS_READY = "inputs_ready"
     RESULTS_INCOMING = "results_incoming"
     RESULTS_READY = "results_ready"
+    FAILED = "failed"
 
 
 class WorkflowModuleModel(BaseModel):
@@ -55,17 +56,138 @@ class WorkflowModuleModel(BaseModel):
         return wf
 
 
+class WorkloadType(Enum):
+
+    CPU = "cpu"
+    IO = "io"
+    ASYNC = "async"
+
+
+class ResourceHints(BaseModel):
+    """Hints about the resources a processing module needs, used by resource-aware executors."""
+
+    cpu_slots: int = Field(
+        default=1, ge=0, description="the number of cpu cores the module keeps busy"
+    )
+    memory: int = Field(
+        default=0, ge=0, description="the estimated peak memory use of the module, in bytes"
+    )
+    workload: WorkloadType = Field(
+        default=WorkloadType.CPU,
+        description="whether the module is cpu bound, io bound, or async (doesn't block the event loop)",
+    )
+    max_concurrency: typing.Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="the maximum number of modules of this type that are processed at the same time (unlimited if not set)",
+    )
+
+    class Config:
+        use_enum_values = True
+        validate_all = True
+        extra = Extra.forbid
+
+
+class RetryPolicy(BaseModel):
+    """Describes how often, and after which delay, processing of a module is retried if it fails."""
+
+    max_attempts: int = Field(
+        default=1, ge=1, description="the maximum number of attempts (including the first one)"
+    )
+    backoff: float = Field(
+        default=1.0, ge=0, description="the delay (in seconds) before the first retry"
+    )
+    backoff_factor: float = Field(
+        default=2.0, ge=1, description="the factor the delay grows by with every retry"
+    )
+    max_backoff: typing.Optional[float] = Field(
+        default=None, ge=0, description="the maximum delay (in seconds) between two attempts"
+    )
+
+    class Config:
+        extra = Extra.forbid
+
+    def get_delay(self, attempt: int) -> float:
+        """Return the delay (in seconds) before the retry that follows the provided (failed) attempt."""
+
+        delay = self.backoff * self.backoff_factor ** (attempt - 1)
+        if self.max_backoff is not None:
+            delay = min(delay, self.max_backoff)
+        return delay
+
+
+class RunOptions(BaseModel):
+    """Options for processing a workflow, nested workflows are processed with the same options.
+
+    Options are read-only, use 'copy(update=...)' to change them.
+    """
+
+    checkpoint_store: typing.Any = Field(
+        default=None,
+        description="the store ('CheckpointStore') to restore module results from, and save them to (disabled if not set)",
+    )
+    memory_budget: typing.Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="the memory budget (in bytes) for intermediate values of a run (unlimited if not set)",
+    )
+    flatten: bool = Field(
+        default=False,
+        description="whether nested workflows are inlined, so all child modules are scheduled as a whole",
+    )
+    prune_unused_modules: bool = Field(
+        default=False,
+        description="whether modules that don't contribute to any workflow output are skipped",
+    )
+    deduplicate_modules: bool = Field(
+        default=False,
+        description="whether modules with the same type, configuration and inputs are only processed once",
+    )
+    runtime_stats: typing.Any = Field(
+        default=None,
+        description="the store ('RuntimeStatsStore') to record module runtimes in, and schedule modules by (disabled if not set)",
+    )
+    save_runtime_stats: bool = Field(
+        default=True,
+        description="whether the runtime stats are saved after a run (nested workflows leave that to the outermost one)",
+    )
+    continue_on_error: bool = Field(
+        default=False,
+        description="whether independent modules keep processing when a module fails",
+    )
+    publish_outputs_early: bool = Field(
+        default=False,
+        description="whether outputs of child modules are passed on as soon as they are set, before processing finished",
+    )
+    structure: typing.Any = Field(
+        default=None,
+        description="the analysed structure ('WorkflowStructure') of the workflow, runs only create their module objects from it",
+    )
+
+    class Config:
+        extra = Extra.forbid
+        allow_mutation = False
+
+
 class ProcessingModuleConfig(BaseModel):
     """Base class that describes the configuration a ProcessingModule class accepts.
 
     This is stored in the `_processing_step_config_cls` attribute in each ProcessingModule class. By default,
-    such a ProcessingModule is not configurable.
+    such a ProcessingModule is not configurable, except for its resource hints and whether it is pooled.
     """
 
-    # class Config:
-    #     extra = Extra.forbid
+    class Config:
+        # configurations are shared (e.g. between pooled module instances), so they can't be changed after validation
+        allow_mutation = False
 
-    pass
+    resources: typing.Optional[ResourceHints] = Field(
+        default=None,
+        description="resource hints for this module, overriding the defaults of the module class",
+    )
+    pooled: typing.Optional[bool] = Field(
+        default=None,
+        description="whether instances of this module are shared via the processing module pool, and kept across workflow runs (overrides the default of the module class)",
+    )
 
 
 class WorkflowProcessingModuleConfig(ProcessingModuleConfig):
@@ -172,6 +294,15 @@ class ProcessingConfig(BaseModel):
     def create_processing_module(self) -> "ProcessingModule":
 
         processing_cls: typing.Type[ProcessingModule] = DHARPA_MODULES.get(self.module_type, True)  # type: ignore
+        pooled = self.module_config.get("pooled", None)
+        if pooled is None:
+            pooled = processing_cls._pooled
+        if pooled:
+            from dharpa.processing.pool import get_processing_module_pool
+
+            return get_processing_module_pool().get(
+                self.module_type, self.module_config, self.meta
+            )
         return processing_cls(meta=self.meta, **self.module_config)
 
 
@@ -205,6 +336,7 @@ class ModuleDetails(BaseModel):
     outputs: typing.Dict[str, ValueItem]
     execution_stage: typing.Optional[int] = None
     doc: typing.Optional[str] = None
+    error: typing.Optional[str] = None
     pipeline_structure: typing.Optional["WorkflowStructureDetails"] = None
 
     class Config:
@@ -253,4 +385,46 @@ class WorkflowStructureDetails(BaseModel):
         extra = Extra.forbid
 
 
+class WorkflowRunStats(BaseModel):
+    """Statistics about a single run of a workflow."""
+
+    workflow_id: str
+    duration: float = Field(default=0.0, description="the duration of the run, in seconds")
+    modules_total: int = Field(
+        default=0, description="the number of (child-)modules in the workflow"
+    )
+    modules_processed: int = Field(
+        default=0, description="the number of modules that were processed"
+    )
+    modules_restored: int = Field(
+        default=0, description="the number of modules that were restored from a checkpoint"
+    )
+    modules_reused: int = Field(
+        default=0,
+        description="the number of modules that were not processed, because their results were still current",
+    )
+    modules_pruned: int = Field(
+        default=0,
+        description="the number of modules that were skipped, because they don't contribute to any requested output",
+    )
+    modules_deduplicated: int = Field(
+        default=0,
+        description="the number of modules that were skipped, because an identical module was processed in their place",
+    )
+    duplicate_groups: typing.Dict[str, typing.List[str]] = Field(
+        default_factory=dict,
+        description="the aliases of deduplicated modules, keyed by the alias of the module that was processed in their place",
+    )
+    modules_failed: int = Field(
+        default=0, description="the number of modules that failed to process"
+    )
+    errors: typing.Dict[str, str] = Field(
+        default_factory=dict,
+        description="the error messages of failed modules, keyed by module alias",
+    )
+
+    class Config:
+        extra = Extra.forbid
+
+
 ModuleDetails.update_forward_refs()
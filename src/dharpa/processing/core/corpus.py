@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import typing
+from pydantic import Field
+
+from dharpa.data.core import DataSchema, DataType
+from dharpa.data.tables import open_lazy_table
+from dharpa.models import ProcessingModuleConfig, ResourceHints, WorkloadType
+from dharpa.processing.processing_module import ProcessingModule
+from dharpa.workflows.modules import InputItems, OutputItems
+
+
+class LoadCorpusProcessingModuleConfig(ProcessingModuleConfig):
+    """Configuration for the 'load_corpus' processing module."""
+
+    table_format: typing.Optional[str] = Field(
+        default=None,
+        description="the format of the corpus file ('csv', 'jsonl' or 'parquet'), determined by the file extension if not provided",
+    )
+    delimiter: typing.Optional[str] = Field(
+        default=None,
+        description="the delimiter for csv files (defaults to ',', or a tab for '.tsv' files)",
+    )
+
+
+class LoadCorpusProcessingModule(ProcessingModule):
+    """Loads a corpus from a csv, json-lines or parquet file.
+
+    The file is memory-mapped, and the resulting table is lazy: rows are only parsed when they are accessed by a
+    downstream module. This means loading takes (nearly) constant time and memory, independent of the corpus size.
+    """
+
+    _module_name = "load_corpus"
+
+    _processing_step_config_cls = LoadCorpusProcessingModuleConfig
+
+    _resource_hints = ResourceHints(cpu_slots=0, workload=WorkloadType.IO)
+
+    def _create_input_schema(self) -> typing.Mapping[str, DataSchema]:
+
+        return {"path_to_data": DataSchema(DataType.string)}
+
+    def _create_output_schema(self) -> typing.Mapping[str, DataSchema]:
+
+        return {"corpus": DataSchema(DataType.table)}
+
+    async def _process(self, inputs: InputItems, outputs: OutputItems) -> None:
+
+        options = {}
+        if self.config.delimiter:
+            options["delimiter"] = self.config.delimiter
+
+        outputs.corpus = open_lazy_table(
+            inputs.path_to_data, table_format=self.config.table_format, **options
+        )
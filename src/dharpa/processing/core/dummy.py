@@ -4,7 +4,7 @@ import typing
 from pydantic import Field
 
 from dharpa.data.core import DataSchema
-from dharpa.models import ProcessingModuleConfig
+from dharpa.models import ProcessingModuleConfig, ResourceHints, WorkloadType
 from dharpa.workflows.modules import ProcessingModule
 
 if typing.TYPE_CHECKING:
@@ -30,6 +30,14 @@ class DummyProcessingModuleConfig(ProcessingModuleConfig):
         description="the delay in seconds from processing start to when the (dummy) outputs are returned",
         default=0,
     )
+    output_delays: typing.Mapping[str, float] = Field(
+        description="delays in seconds from processing start to when individual (dummy) outputs are returned, outputs that are not listed use 'delay'",
+        default_factory=dict,
+    )
+    setup_delay: float = Field(
+        description="the delay in seconds it takes to set up an instance of this module (e.g. to simulate loading a model)",
+        default=0,
+    )
 
 
 class DummyProcessingModule(ProcessingModule):
@@ -39,30 +47,49 @@ class DummyProcessingModule(ProcessingModule):
 
     _processing_step_config_cls = DummyProcessingModuleConfig
 
+    # only simulates work by sleeping
+    _resource_hints = ResourceHints(cpu_slots=0, workload=WorkloadType.IO)
+
     def _create_input_schema(self) -> typing.Mapping[str, DataSchema]:
         result = {}
-        for k, v in self.config.get("input_schema").items():  # type: ignore
+        for k, v in self.config.input_schema.items():
             result[k] = DataSchema(**v)
         return result
 
     def _create_output_schema(self) -> typing.Mapping[str, DataSchema]:
         result = {}
-        for k, v in self.config.get("output_schema").items():  # type: ignore
+        for k, v in self.config.output_schema.items():
             result[k] = DataSchema(**v)
         return result
 
-    async def _process(self, inputs: "InputItems", outputs: "OutputItems") -> None:
+    async def _setup(self) -> None:
+
+        time.sleep(self.config.setup_delay)
 
-        time.sleep(self.config.get("delay"))  # type: ignore
+    async def _process(self, inputs: "InputItems", outputs: "OutputItems") -> None:
 
-        output_values: typing.Mapping = self.config.get("outputs")  # type: ignore
-        outputs.set_values(**output_values)
+        output_values: typing.Mapping = self.config.outputs
+        if not self.config.output_delays:
+            time.sleep(self.config.delay)
+            outputs.set_values(**output_values)
+            return
+
+        started = time.monotonic()
+        delays = {
+            k: self.config.output_delays.get(k, self.config.delay)
+            for k in output_values.keys()
+        }
+        for k in sorted(delays.keys(), key=lambda k: delays[k]):
+            remaining = delays[k] - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+            outputs.set_values(**{k: output_values[k]})
 
     def _get_doc(self) -> str:
 
-        doc = self.config.get("doc", None)
+        doc = self.config.doc
 
         if doc:
-            return self.config["doc"]
+            return doc
         else:
             return super()._get_doc()
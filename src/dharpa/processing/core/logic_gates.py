@@ -39,7 +39,7 @@ class NotProcessingModule(LogicProcessingModule):
 
     async def _process(self, inputs: InputItems, outputs: OutputItems) -> None:
 
-        time.sleep(self.config.get("delay"))  # type: ignore
+        time.sleep(self.config.delay)
 
         outputs.y = not inputs.a
 
@@ -59,7 +59,7 @@ class AndProcessingModule(LogicProcessingModule):
 
     async def _process(self, inputs: InputItems, outputs: OutputItems) -> None:
 
-        time.sleep(self.config.get("delay"))  # type: ignore
+        time.sleep(self.config.delay)
         outputs.y = inputs.a and inputs.b
 
 
@@ -78,5 +78,5 @@ class OrProcessingModule(LogicProcessingModule):
 
     async def _process(self, inputs: InputItems, outputs: OutputItems) -> None:
 
-        time.sleep(self.config.get("delay"))  # type: ignore
+        time.sleep(self.config.delay)
         outputs.y = inputs.a or inputs.b
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
 import anyio
 import atexit
+import os
+import pickle
+import threading
 import typing
 from abc import ABCMeta, abstractmethod
 from anyio import create_task_group
-from concurrent.futures import ALL_COMPLETED, wait
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool, ProcessPoolExecutor
 from concurrent.futures.thread import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import partial
+
+from dharpa.models import ResourceHints, WorkloadType
+from dharpa.utils import ThreadSafeNotifier, wait_for_future
 
 if typing.TYPE_CHECKING:
     from dharpa.processing.processing_module import ProcessingModule
@@ -24,6 +32,18 @@ def get_default_executor() -> typing.Optional["Processor"]:
     return _DEFAULT_EXECUTOR
 
 
+async def run_in_threadpool(
+    threadpool: ThreadPoolExecutor, func: typing.Callable, *args: typing.Any
+) -> typing.Any:
+    """Run an async function in its own event loop, in a thread of the provided pool.
+
+    If waiting is cancelled, the function is only cancelled if it didn't start yet, otherwise it keeps running in
+    the background and its result is discarded.
+    """
+
+    return await wait_for_future(threadpool.submit(anyio.run, func, *args))
+
+
 @dataclass
 class ProcessingBundle(object):
 
@@ -33,6 +53,11 @@ class ProcessingBundle(object):
 
 
 class Processor(metaclass=ABCMeta):
+    @property
+    def max_concurrency(self) -> typing.Optional[int]:
+        """The maximum number of modules this processor can process at the same time ('None' if unlimited)."""
+        return None
+
     @abstractmethod
     async def process(self, *modules: "WorkflowModule"):
         pass
@@ -61,19 +86,316 @@ class ThreadPoolProcessor(Processor):
             atexit.register(self._threadpool.shutdown, wait=False)
         return self._threadpool
 
+    @property
+    def max_concurrency(self) -> typing.Optional[int]:
+        return self.threadpool._max_workers
+
+    async def process(
+        self,
+        *modules: "WorkflowModule",
+    ):
+        async with create_task_group() as tg:
+            for m in modules:
+                if m.is_pipeline:
+                    # workflows only orchestrate their child modules, which are sent to the thread pool
+                    await tg.spawn(m.process, self)
+                else:
+                    await tg.spawn(
+                        partial(m.process, process_func=self._process_in_thread)
+                    )
+
+    async def _process_in_thread(
+        self,
+        processing_module: "ProcessingModule",
+        inputs: "InputItems",
+        outputs: "OutputItems",
+    ) -> None:
+
+        from dharpa.processing.pool import process_pooled
+
+        # only the processing itself happens in the thread: the outputs it writes to are private to this processing
+        # run, the module publishes them (and updates its state) on the event loop it belongs to
+        await run_in_threadpool(
+            self.threadpool, process_pooled, processing_module, inputs, outputs
+        )
+
+
+def run_processing_module(
+    module_type: str,
+    module_config: typing.Mapping[str, typing.Any],
+    meta: typing.Mapping[str, typing.Any],
+    inputs: typing.Mapping[str, typing.Any],
+    on_output: typing.Optional[typing.Callable[[str, typing.Any], None]] = None,
+) -> typing.Dict[str, typing.Any]:
+    """Create a processing module, process the provided input values, and return the output values.
+
+    This only uses picklable arguments and return values, so it can be used in another process. Pooled modules are
+    taken from the module pool of the process that runs this (e.g. a worker), so they are only created and set up
+    once there. All other modules are created, set up and torn down for every call.
+
+    Args:
+        module_type: the module type
+        module_config: the module configuration
+        meta: the module metadata
+        inputs: the input values
+        on_output: called with the name and value of every output, as soon as it is set (while processing is still going on)
+    """
+
+    from dharpa.models import ProcessingConfig
+    from dharpa.processing.pool import process_pooled
+    from dharpa.workflows.modules import InputItems, OutputItems
+
+    processing_obj = ProcessingConfig(
+        module_type=module_type, module_config=module_config, meta=meta
+    ).create_processing_module()
+
+    _inputs = InputItems(**processing_obj.input_schemas)
+    _inputs.set_values(**inputs)
+    _outputs = OutputItems(**processing_obj.output_schemas)
+    if on_output is not None:
+        for name, item in _outputs.items():
+            item.add_callback(partial(on_output, name))
+
+    async def process():
+        try:
+            await process_pooled(processing_obj, _inputs, _outputs)
+        finally:
+            # pooled modules are kept set up by the pool, all others are only used once
+            if processing_obj._pool_key is None:
+                await processing_obj.teardown()
+
+    anyio.run(process)
+    return dict(_outputs.ALL)
+
+
+def run_pickled_processing_module(data: bytes) -> typing.Dict[str, typing.Any]:
+    """Same as 'run_processing_module', with the (pickled) arguments as a single tuple."""
+
+    return run_processing_module(*pickle.loads(data))
+
+
+class ResourceAwareProcessor(Processor):
+    """Processes modules according to their resource hints, within a node-level resource budget.
+
+    A module is only started once enough cpu slots and memory (according to its resource hints) are available, and
+    less than the maximum number of modules of the same type are running. A module that needs more than the whole
+    budget is started once no other module is running. Modules are then run in the lane that fits their workload:
+
+    - 'async' modules (and workflows, whose child modules claim their own resources) run on the event loop
+    - 'io' modules run in a thread
+    - 'cpu' modules run in a process pool, so they don't compete for the GIL (this falls back to a thread if the
+      module or its values can't be sent to another process)
+
+    Args:
+        cpu_slots: the number of cpu slots available (defaults to the number of cpu cores)
+        memory: the memory available to modules, in bytes (unlimited if not provided)
+        max_io_workers: the maximum number of io bound modules that run at the same time
+        use_processes: whether to run cpu bound modules in a process pool (otherwise they run in a thread)
+        concurrency_limits: the maximum number of modules of a type that run at the same time, keyed by module type (overrides the resource hints of modules)
+    """
+
+    def __init__(
+        self,
+        cpu_slots: typing.Optional[int] = None,
+        memory: typing.Optional[int] = None,
+        max_io_workers: int = 32,
+        use_processes: bool = True,
+        concurrency_limits: typing.Optional[typing.Mapping[str, int]] = None,
+    ):
+
+        if cpu_slots is None:
+            cpu_slots = os.cpu_count() or 1
+
+        self._cpu_slots: int = cpu_slots
+        self._memory: typing.Optional[int] = memory
+        self._max_io_workers: int = max_io_workers
+        self._use_processes: bool = use_processes
+        if concurrency_limits is None:
+            concurrency_limits = {}
+        self._concurrency_limits: typing.Mapping[str, int] = concurrency_limits
+
+        self._used_cpu_slots: int = 0
+        self._used_memory: int = 0
+        self._running: int = 0
+        self._running_per_type: typing.Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._released = ThreadSafeNotifier()
+
+        self._process_pool: typing.Optional[ProcessPoolExecutor] = None
+        self._threadpool: typing.Optional[ThreadPoolExecutor] = None
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self._cpu_slots)
+            atexit.register(self._process_pool.shutdown, wait=False)
+        return self._process_pool
+
+    @property
+    def threadpool(self) -> ThreadPoolExecutor:
+        if self._threadpool is None:
+            self._threadpool = ThreadPoolExecutor(max_workers=self._max_io_workers)
+            atexit.register(self._threadpool.shutdown, wait=False)
+        return self._threadpool
+
+    async def _process_in_thread(
+        self,
+        processing_module: "ProcessingModule",
+        inputs: "InputItems",
+        outputs: "OutputItems",
+    ) -> None:
+
+        from dharpa.processing.pool import process_pooled
+
+        # results are published by the module, on the event loop it belongs to
+        await run_in_threadpool(
+            self.threadpool, process_pooled, processing_module, inputs, outputs
+        )
+
+    def _get_concurrency_limit(
+        self, module_type: str, resources: ResourceHints
+    ) -> typing.Optional[int]:
+
+        return self._concurrency_limits.get(module_type, resources.max_concurrency)
+
+    def _fits(self, module_type: str, resources: ResourceHints) -> bool:
+
+        limit = self._get_concurrency_limit(module_type, resources)
+        if limit is not None and self._running_per_type.get(module_type, 0) >= limit:
+            return False
+        if self._running == 0:
+            # otherwise, a module that needs more than the whole budget would never run
+            return True
+        if self._used_cpu_slots + resources.cpu_slots > self._cpu_slots:
+            return False
+        if (
+            self._memory is not None
+            and self._used_memory + resources.memory > self._memory
+        ):
+            return False
+        return True
+
+    def _try_acquire(self, module_type: str, resources: ResourceHints) -> bool:
+
+        with self._lock:
+            if not self._fits(module_type, resources):
+                return False
+            self._used_cpu_slots = self._used_cpu_slots + resources.cpu_slots
+            self._used_memory = self._used_memory + resources.memory
+            self._running = self._running + 1
+            self._running_per_type[module_type] = (
+                self._running_per_type.get(module_type, 0) + 1
+            )
+            return True
+
+    def _release(self, module_type: str, resources: ResourceHints) -> None:
+
+        with self._lock:
+            self._used_cpu_slots = self._used_cpu_slots - resources.cpu_slots
+            self._used_memory = self._used_memory - resources.memory
+            self._running = self._running - 1
+            self._running_per_type[module_type] = (
+                self._running_per_type[module_type] - 1
+            )
+        self._released.notify_all()
+
+    async def _acquire(self, module_type: str, resources: ResourceHints) -> None:
+
+        if self._try_acquire(module_type, resources):
+            return
+
+        acquired = []
+
+        def check() -> bool:
+            if self._try_acquire(module_type, resources):
+                acquired.append(True)
+            return bool(acquired)
+
+        # modules of nested workflows might run their event loops in different threads, waiting doesn't block any
+        # of them
+        try:
+            await self._released.wait_for(check)
+        except BaseException:
+            if acquired:
+                self._release(module_type, resources)
+            raise
+
     async def process(
         self,
         *modules: "WorkflowModule",
     ):
-        def run(callable, *args):
-            anyio.run(callable, *args)
+        async with create_task_group() as tg:
+            for m in modules:
+                await tg.spawn(self._process_module, m)
+
+    async def _process_module(self, module: "WorkflowModule") -> None:
+
+        if module.is_pipeline:
+            await module.process(self)
+            return
 
-        futures = []
-        for m in modules:
-            if m.is_pipeline:
-                future = self.threadpool.submit(run, m.process, self)
+        resources = module.resources
+        await self._acquire(module.module_type, resources)
+        try:
+            if resources.workload == WorkloadType.ASYNC.value:
+                await module.process()
+            elif resources.workload == WorkloadType.CPU.value and self._use_processes:
+                await module.process(process_func=self._process_in_subprocess)
             else:
-                future = self.threadpool.submit(run, m.process)
-            futures.append(future)
+                await module.process(process_func=self._process_in_thread)
+        finally:
+            self._release(module.module_type, resources)
+
+    def _discard_process_pool(self, pool: ProcessPoolExecutor) -> None:
+
+        if self._process_pool is pool:
+            self._process_pool = None
+        pool.shutdown(wait=False)
+
+    def _check_process_pool(self, pool: ProcessPoolExecutor, future: Future) -> None:
+
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            # a worker process died (e.g. it was killed because it ran out of memory), later modules use a new pool
+            self._discard_process_pool(pool)
+
+    async def _process_in_subprocess(
+        self,
+        processing_module: "ProcessingModule",
+        inputs: "InputItems",
+        outputs: "OutputItems",
+    ) -> None:
+
+        def submit() -> typing.Optional[Future]:
+
+            try:
+                data = pickle.dumps(
+                    (
+                        processing_module._module_name,  # type: ignore
+                        processing_module.config,
+                        processing_module.meta,
+                        dict(inputs.ALL),
+                    )
+                )
+            except (pickle.PicklingError, AttributeError, TypeError):
+                # the module, its configuration or its values can't be sent to another process
+                return None
+
+            pool = self.process_pool
+            try:
+                future = pool.submit(run_pickled_processing_module, data)
+            except BrokenProcessPool:
+                self._discard_process_pool(pool)
+                raise
+            future.add_done_callback(partial(self._check_process_pool, pool))
+            return future
+
+        # new worker processes are forked from the thread that submits work, so this must not be a thread that
+        # runs an event loop (or an anyio worker thread)
+        future = await wait_for_future(self.threadpool.submit(submit))
+        if future is None:
+            await self._process_in_thread(processing_module, inputs, outputs)
+            return
 
-        wait(futures, timeout=None, return_when=ALL_COMPLETED)
+        # if cancelled, the child process can't be interrupted, but its result is discarded
+        result = await wait_for_future(future)
+        outputs.set_values(**result)
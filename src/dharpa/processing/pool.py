@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+import anyio
+import json
+import threading
+import typing
+
+from dharpa import DHARPA_MODULES
+from dharpa.utils import ThreadSafeNotifier
+
+if typing.TYPE_CHECKING:
+    from dharpa.processing.processing_module import ProcessingModule
+    from dharpa.workflows.modules import InputItems, OutputItems
+
+PoolKey = typing.Tuple[str, str]
+# the module configuration and metadata
+PoolConfig = typing.Tuple[typing.Mapping[str, typing.Any], typing.Mapping[str, typing.Any]]
+
+
+def _get_pool_key(
+    module_type: str,
+    module_config: typing.Mapping[str, typing.Any],
+    meta: typing.Mapping[str, typing.Any],
+) -> PoolKey:
+
+    # only used to look up instances, they are created from the original configuration
+    data = json.dumps(
+        {"config": module_config, "meta": meta}, sort_keys=True, default=str
+    )
+    return (module_type, data)
+
+
+class ProcessingModulePool(object):
+    """Keeps instances of pooled processing modules, so they are only created (and set up) once per process.
+
+    Only modules of classes that have the '_pooled' class attribute set (or that are configured with 'pooled') are
+    pooled. Instances are shared by all workflow modules (and workflow runs) with the same module type and
+    configuration. While a module is processed, the instance it uses is checked out of the pool, so an instance never
+    processes two modules at the same time. If all instances for a module type and configuration are in use, and the
+    maximum number of instances is reached, processing waits until one is returned.
+
+    By default, there is only one instance per module type and configuration, which means modules with the same
+    configuration are processed one at a time (in any workflow run). Use 'max_instances' or 'max_instances_per_type'
+    to let them be processed concurrently, at the cost of creating (and setting up) more instances.
+
+    Args:
+        max_instances: the maximum number of instances per module type and configuration
+        max_instances_per_type: overrides for the maximum number of instances, keyed by module type
+    """
+
+    def __init__(
+        self,
+        max_instances: int = 1,
+        max_instances_per_type: typing.Optional[typing.Mapping[str, int]] = None,
+    ):
+
+        if max_instances_per_type is None:
+            max_instances_per_type = {}
+
+        self._max_instances: int = max_instances
+        self._max_instances_per_type: typing.Mapping[
+            str, int
+        ] = max_instances_per_type
+
+        self._instances: typing.Dict[PoolKey, typing.List["ProcessingModule"]] = {}
+        self._idle: typing.Dict[PoolKey, typing.List["ProcessingModule"]] = {}
+        self._creating: typing.Dict[PoolKey, int] = {}
+        # the configuration and metadata new instances are created with
+        self._configs: typing.Dict[PoolKey, PoolConfig] = {}
+        self._lock = threading.Lock()
+        self._changed = ThreadSafeNotifier()
+
+    def get_max_instances(self, module_type: str) -> int:
+        return self._max_instances_per_type.get(module_type, self._max_instances)
+
+    def _create(self, key: PoolKey) -> "ProcessingModule":
+
+        module_type = key[0]
+        module_config, meta = self._configs[key]
+        processing_cls: typing.Type["ProcessingModule"] = DHARPA_MODULES.get(module_type, True)  # type: ignore
+        instance = processing_cls(meta=dict(meta), **module_config)
+        instance._pool_key = key
+        return instance
+
+    def get(
+        self,
+        module_type: str,
+        module_config: typing.Mapping[str, typing.Any],
+        meta: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+    ) -> "ProcessingModule":
+        """Return a (shared) instance of a processing module, it is only created if there isn't one yet.
+
+        The returned instance can be used to access the schemas and documentation of a module. To process, use
+        'acquire' to get an instance for exclusive use.
+        """
+
+        if meta is None:
+            meta = {}
+        key = _get_pool_key(module_type, module_config, meta)
+
+        with self._lock:
+            instances = self._instances.get(key, None)
+            if instances:
+                return instances[0]
+            self._creating[key] = self._creating.get(key, 0) + 1
+            self._configs.setdefault(key, (dict(module_config), dict(meta)))
+
+        # creating an instance might take a while, so this doesn't hold the lock
+        try:
+            instance = self._create(key)
+        finally:
+            with self._lock:
+                self._creating[key] = self._creating[key] - 1
+
+        with self._lock:
+            instances = self._instances.setdefault(key, [])
+            if instances:
+                # another thread was faster
+                return instances[0]
+            instances.append(instance)
+            self._idle.setdefault(key, []).append(instance)
+        self._changed.notify_all()
+        return instance
+
+    def _try_acquire(
+        self, key: PoolKey
+    ) -> typing.Optional[typing.Tuple[typing.Optional["ProcessingModule"], bool]]:
+        """Check out an idle instance, or reserve the creation of a new one ('None' if neither is possible)."""
+
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if idle:
+                return (idle.pop(), False)
+            total = len(self._instances.get(key, [])) + self._creating.get(key, 0)
+            if total < self.get_max_instances(key[0]):
+                self._creating[key] = self._creating.get(key, 0) + 1
+                return (None, True)
+            return None
+
+    def _undo_acquire(
+        self, key: PoolKey, instance: typing.Optional["ProcessingModule"]
+    ) -> None:
+
+        if instance is not None:
+            self.release(instance)
+            return
+        with self._lock:
+            self._creating[key] = self._creating[key] - 1
+        self._changed.notify_all()
+
+    async def acquire(self, processing_module: "ProcessingModule") -> "ProcessingModule":
+        """Check out an instance with the same type and configuration as the provided one, for exclusive use.
+
+        Instances that are not managed by this pool are returned as they are. Every acquired instance must be
+        returned with 'release'.
+        """
+
+        key: typing.Optional[PoolKey] = getattr(processing_module, "_pool_key", None)
+        if key is None:
+            return processing_module
+
+        with self._lock:
+            # the instance might have been created by another pool
+            self._configs.setdefault(
+                key, (dict(processing_module.config), dict(processing_module.meta))
+            )
+
+        checked_out = self._try_acquire(key)
+        if checked_out is None:
+            checked_out_while_waiting = []
+
+            def check() -> bool:
+                result = self._try_acquire(key)
+                if result is not None:
+                    checked_out_while_waiting.append(result)
+                return result is not None
+
+            # callers of this pool might run their event loops in different threads, waiting doesn't block any of them
+            try:
+                await self._changed.wait_for(check)
+            except BaseException:
+                # otherwise, the instance that was checked out (if any) would be lost
+                if checked_out_while_waiting:
+                    self._undo_acquire(key, checked_out_while_waiting[0][0])
+                raise
+            checked_out = checked_out_while_waiting[0]
+
+        instance, create = checked_out
+        if instance is not None:
+            return instance
+
+        try:
+            instance = await anyio.run_sync_in_worker_thread(self._create, key)
+        finally:
+            with self._lock:
+                self._creating[key] = self._creating[key] - 1
+                if instance is not None:
+                    self._instances.setdefault(key, []).append(instance)
+            self._changed.notify_all()
+        return instance  # type: ignore
+
+    def release(self, processing_module: "ProcessingModule") -> None:
+        """Return an instance that was checked out with 'acquire'."""
+
+        key: typing.Optional[PoolKey] = getattr(processing_module, "_pool_key", None)
+        if key is None:
+            return
+
+        with self._lock:
+            self._idle.setdefault(key, []).append(processing_module)
+        self._changed.notify_all()
+
+    async def warmup(
+        self, processing_module: "ProcessingModule", instances: typing.Optional[int] = None
+    ) -> None:
+        """Set up and warm up instances with the same type and configuration as the provided one.
+
+        Args:
+            processing_module: the processing module
+            instances: the number of instances to warm up (defaults to the maximum number of instances)
+        """
+
+        if getattr(processing_module, "_pool_key", None) is None:
+            await processing_module.warmup()
+            return
+
+        if instances is None:
+            instances = self.get_max_instances(processing_module._module_name)  # type: ignore
+        instances = min(instances, self.get_max_instances(processing_module._module_name))  # type: ignore
+
+        acquired: typing.List["ProcessingModule"] = []
+        try:
+            for _ in range(instances):
+                acquired.append(await self.acquire(processing_module))
+            async with anyio.create_task_group() as tg:
+                for instance in acquired:
+                    await tg.spawn(instance.warmup)
+        finally:
+            for instance in acquired:
+                self.release(instance)
+
+    async def clear(self) -> None:
+        """Remove all idle instances from this pool, and tear them down.
+
+        Instances that are checked out at the moment are kept.
+        """
+
+        with self._lock:
+            removed = []
+            for key, idle in self._idle.items():
+                instances = self._instances.get(key, [])
+                for instance in idle:
+                    instances.remove(instance)
+                    removed.append(instance)
+            self._idle = {}
+            self._instances = {k: v for k, v in self._instances.items() if v}
+            self._configs = {
+                k: v
+                for k, v in self._configs.items()
+                if k in self._instances or self._creating.get(k, 0)
+            }
+
+        for instance in removed:
+            await instance.teardown()
+
+
+_PROCESSING_MODULE_POOL = ProcessingModulePool()
+
+
+def set_processing_module_pool(pool: ProcessingModulePool):
+    global _PROCESSING_MODULE_POOL
+    _PROCESSING_MODULE_POOL = pool
+
+
+def get_processing_module_pool() -> ProcessingModulePool:
+    return _PROCESSING_MODULE_POOL
+
+
+async def process_pooled(
+    processing_module: "ProcessingModule",
+    inputs: "InputItems",
+    outputs: "OutputItems",
+) -> None:
+    """Process inputs with an instance of the provided processing module that is checked out of the module pool."""
+
+    pool = get_processing_module_pool()
+    instance = await pool.acquire(processing_module)
+    try:
+        await instance.process(inputs, outputs)
+    finally:
+        pool.release(instance)
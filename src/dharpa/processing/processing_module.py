@@ -1,16 +1,83 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import inspect
+import json
+import threading
 import typing
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from types import MappingProxyType
 
 from dharpa.data.core import DataSchema
-from dharpa.models import ProcessingModuleConfig
+from dharpa.models import ProcessingModuleConfig, ResourceHints
 
 if typing.TYPE_CHECKING:
     from dharpa.workflows.modules import InputItems, OutputItems
 
 """Global variable to store unique/used module ids per type."""
 
+SCHEMA_CACHE_SIZE = 256
+"""The maximum number of (module class, configuration) combinations whose schemas are shared between instances."""
+
+_SCHEMA_CACHE: "OrderedDict[typing.Tuple[type, str, str], typing.Mapping[str, DataSchema]]" = OrderedDict()
+_SCHEMA_CACHE_LOCK = threading.Lock()
+
+
+class ConfigView(dict):
+    """A read-only view of a (validated) module configuration, values can be accessed as keys or attributes.
+
+    Values are kept as they are (so e.g. a list in a configuration can be used as table value), they must not be
+    changed. A view is hashable (by the fingerprint of its content), and can be serialized to json.
+    """
+
+    def __init__(self, data: typing.Mapping[str, typing.Any] = None):
+
+        if data is None:
+            data = {}
+        super().__init__(data)
+        object.__setattr__(self, "_hash", None)
+
+    def __getattr__(self, item):
+
+        try:
+            return self[item]
+        except KeyError:
+            raise AttributeError(item)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Module configurations are read-only.")
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    __setattr__ = _read_only  # type: ignore
+    clear = _read_only
+    pop = _read_only
+    popitem = _read_only
+    setdefault = _read_only
+    update = _read_only
+
+    def __hash__(self):
+
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(get_config_fingerprint(self)))
+        return self._hash  # type: ignore
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def get_config_fingerprint(config: typing.Mapping[str, typing.Any]) -> str:
+    """Return a fingerprint for a module configuration, identical configurations have the same fingerprint."""
+
+    data = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
 
 def get_doc_from_module_class(cls: typing.Type) -> str:
 
@@ -34,6 +101,18 @@ class ProcessingModule(metaclass=ABCMeta):
         ProcessingModuleConfig
     ] = ProcessingModuleConfig
 
+    _resource_hints: ResourceHints = ResourceHints()
+    """The default resource hints for this module class."""
+
+    _cache_schemas: bool = True
+    """Whether the schemas of instances of this class only depend on their configuration, so they can be shared."""
+
+    _pooled: bool = False
+    """Whether instances of this class are shared via the processing module pool by default (for modules that are expensive to create or set up).
+
+    This can be overridden per module, with the 'pooled' configuration option.
+    """
+
     def __init__(
         self,
         meta: typing.Optional[typing.Mapping[str, typing.Any]] = None,
@@ -48,20 +127,45 @@ class ProcessingModule(metaclass=ABCMeta):
         self._config: ProcessingModuleConfig = (
             self.__class__._processing_step_config_cls(**config)
         )
+        self._config_view: typing.Optional[ConfigView] = None
+        self._config_fingerprint: typing.Optional[str] = None
 
         self._input_schemas: typing.Mapping[str, DataSchema] = None  # type: ignore
         self._output_schemas: typing.Mapping[str, DataSchema] = None  # type: ignore
 
         self._doc: str = None  # type: ignore
+        # set if this instance is managed by a processing module pool
+        self._pool_key: typing.Optional[typing.Tuple[str, str]] = None
+        self._is_set_up: bool = False
+        self._is_warmed_up: bool = False
 
     @property
-    def config(self) -> typing.Mapping[str, typing.Any]:
-        return self._config.dict()
+    def config(self) -> ConfigView:
+        """The (validated) configuration of this module, as read-only view."""
+
+        if self._config_view is None:
+            self._config_view = ConfigView(self._config.dict())
+        return self._config_view
+
+    @property
+    def config_fingerprint(self) -> str:
+
+        if self._config_fingerprint is None:
+            self._config_fingerprint = get_config_fingerprint(self.config)
+        return self._config_fingerprint
 
     @property
     def meta(self) -> typing.Mapping[str, typing.Any]:
         return self._meta
 
+    @property
+    def resources(self) -> ResourceHints:
+        """The resources this module needs, either from its configuration or the class defaults."""
+
+        if self._config.resources is not None:
+            return self._config.resources
+        return self.__class__._resource_hints
+
     @property
     def input_names(self) -> typing.Iterable[str]:
         return self.input_schemas.keys()
@@ -70,16 +174,40 @@ class ProcessingModule(metaclass=ABCMeta):
     def output_names(self) -> typing.Iterable[str]:
         return self.output_schemas.keys()
 
+    def _get_schemas(
+        self, kind: str, create: typing.Callable[[], typing.Mapping[str, DataSchema]]
+    ) -> typing.Mapping[str, DataSchema]:
+
+        if not self.__class__._cache_schemas:
+            return MappingProxyType(dict(create()))
+
+        # schemas only depend on the class and configuration of a module, so they are shared between instances
+        key = (self.__class__, self.config_fingerprint, kind)
+        with _SCHEMA_CACHE_LOCK:
+            schemas = _SCHEMA_CACHE.get(key, None)
+            if schemas is not None:
+                _SCHEMA_CACHE.move_to_end(key)
+                return schemas
+
+        schemas = MappingProxyType(dict(create()))
+        with _SCHEMA_CACHE_LOCK:
+            schemas = _SCHEMA_CACHE.setdefault(key, schemas)
+            while len(_SCHEMA_CACHE) > SCHEMA_CACHE_SIZE:
+                _SCHEMA_CACHE.popitem(last=False)
+        return schemas
+
     @property
     def input_schemas(self) -> typing.Mapping[str, DataSchema]:
         if self._input_schemas is None:
-            self._input_schemas = self._create_input_schema()
+            self._input_schemas = self._get_schemas("input", self._create_input_schema)
         return self._input_schemas
 
     @property
     def output_schemas(self) -> typing.Mapping[str, DataSchema]:
         if self._output_schemas is None:
-            self._output_schemas = self._create_output_schema()
+            self._output_schemas = self._get_schemas(
+                "output", self._create_output_schema
+            )
         return self._output_schemas
 
     @property
@@ -109,8 +237,53 @@ class ProcessingModule(metaclass=ABCMeta):
     async def _process(self, inputs: "InputItems", outputs: "OutputItems") -> None:
         pass
 
+    async def _setup(self) -> None:
+        """Create expensive state (e.g. load a model, open a database file), once per instance.
+
+        Override this instead of doing expensive work in the constructor or in '_process'. To keep that state across
+        workflow runs, the class should also be '_pooled' (or the module configured with 'pooled').
+        """
+        pass
+
+    async def _warmup(self) -> None:
+        """Prepare an instance for its first request (e.g. fill caches), called once per instance, after setup."""
+        pass
+
+    async def _teardown(self) -> None:
+        """Release the state that was created in '_setup'."""
+        pass
+
+    @property
+    def is_set_up(self) -> bool:
+        return self._is_set_up
+
+    async def setup(self) -> None:
+
+        if self._is_set_up:
+            return
+        await self._setup()
+        self._is_set_up = True
+
+    async def warmup(self) -> None:
+
+        await self.setup()
+        if self._is_warmed_up:
+            return
+        await self._warmup()
+        self._is_warmed_up = True
+
+    async def teardown(self) -> None:
+
+        if not self._is_set_up:
+            return
+        self._is_set_up = False
+        self._is_warmed_up = False
+        await self._teardown()
+
     async def process(self, inputs: "InputItems", outputs: "OutputItems") -> None:
 
+        if not self._is_set_up:
+            await self.setup()
         await self._process(inputs=inputs, outputs=outputs)
 
     def __eq__(self, other):
@@ -118,11 +291,11 @@ class ProcessingModule(metaclass=ABCMeta):
         if self.__class__ != other.__class__:
             return False
 
-        return self.config == other.config
+        return self.config_fingerprint == other.config_fingerprint
 
     def __hash__(self):
 
-        return hash(self.config)
+        return hash((self.__class__, self.config_fingerprint))
 
     def __repr__(self):
 
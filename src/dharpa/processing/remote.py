@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""Processing of modules on remote workers.
+
+Workers are started with ``dharpa-toolbox worker``, and receive tasks over a simple socket protocol: every message is
+a json object, prefixed with its length (4 bytes, big-endian). The client sends a 'task' message (containing module
+type, config and input values), the worker answers with 'heartbeat' messages while it is processing, an 'output'
+message for every output value as soon as the module sets it, and a final 'result' (or 'error') message.
+"""
+import anyio
+import collections
+import collections.abc
+import json
+import socketserver
+import struct
+import sys
+import threading
+import time
+import typing
+import uuid
+from anyio.streams.buffered import BufferedByteReceiveStream
+from functools import partial
+from pydantic.json import pydantic_encoder
+
+from dharpa.processing.executors import Processor, run_processing_module
+from dharpa.processing.pool import get_processing_module_pool
+from dharpa.utils import set_event_nowait
+
+if typing.TYPE_CHECKING:
+    from dharpa.processing.processing_module import ProcessingModule
+    from dharpa.workflows.modules import InputItems, OutputItems, WorkflowModule
+
+DEFAULT_WORKER_PORT = 8765
+"""The default port workers listen on."""
+
+_HEADER = struct.Struct("!I")
+
+
+def _encode_value(value: typing.Any) -> typing.Any:
+
+    if isinstance(value, collections.abc.Sequence):
+        # e.g. lazy tables
+        return list(value)
+    return pydantic_encoder(value)
+
+
+def encode_message(message: typing.Mapping[str, typing.Any]) -> bytes:
+
+    data = json.dumps(message, default=_encode_value).encode()
+    return _HEADER.pack(len(data)) + data
+
+
+def read_message(
+    rfile: typing.BinaryIO,
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """Read a message from a (blocking) file object, returns 'None' if the connection was closed."""
+
+    header = rfile.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (length,) = _HEADER.unpack(header)
+    data = rfile.read(length)
+    if len(data) < length:
+        return None
+    return json.loads(data)
+
+
+async def receive_message(
+    stream: BufferedByteReceiveStream,
+) -> typing.Dict[str, typing.Any]:
+
+    header = await stream.receive_exactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    data = await stream.receive_exactly(length)
+    return json.loads(data)
+
+
+def parse_worker_address(address: str) -> typing.Tuple[str, int]:
+
+    if ":" in address:
+        host, port = address.rsplit(":", maxsplit=1)
+        return (host, int(port))
+    return (address, DEFAULT_WORKER_PORT)
+
+
+class _WorkerRequestHandler(socketserver.StreamRequestHandler):
+
+    server: "WorkerServer"
+
+    def handle(self):
+
+        send_lock = threading.Lock()
+
+        def send(message: typing.Mapping[str, typing.Any]):
+            with send_lock:
+                self.wfile.write(encode_message(message))
+                self.wfile.flush()
+
+        try:
+            while True:
+                message = read_message(self.rfile)
+                if message is None:
+                    return
+                if message.get("type") == "task":
+                    self._run_task(message, send)
+                else:
+                    send(
+                        {
+                            "type": "error",
+                            "task_id": message.get("task_id", None),
+                            "error": f"Invalid message type: {message.get('type')}",
+                        }
+                    )
+        except (BrokenPipeError, ConnectionResetError):
+            # the client is gone, nothing to do anymore
+            pass
+
+    def _run_task(self, message: typing.Mapping[str, typing.Any], send: typing.Callable):
+
+        task_id = message["task_id"]
+        finished = threading.Event()
+
+        def send_heartbeats():
+            while not finished.wait(self.server.heartbeat_interval):
+                try:
+                    send({"type": "heartbeat", "task_id": task_id})
+                except OSError:
+                    return
+
+        # outputs are sent as soon as they are set, heartbeats keep being sent in between
+        def send_output(name: str, value: typing.Any):
+            send({"type": "output", "task_id": task_id, "name": name, "value": value})
+
+        heartbeat_thread = threading.Thread(target=send_heartbeats, daemon=True)
+        heartbeat_thread.start()
+
+        print(
+            f"processing task {task_id}: {message['module_type']}", file=sys.stderr
+        )
+        error: typing.Optional[str] = None
+        try:
+            run_processing_module(
+                message["module_type"],
+                message.get("module_config", {}),
+                message.get("meta", {}),
+                message.get("inputs", {}),
+                on_output=send_output,
+            )
+        except Exception as e:
+            error = str(e)
+        finally:
+            finished.set()
+            heartbeat_thread.join()
+
+        if error is not None:
+            send({"type": "error", "task_id": task_id, "error": error})
+            return
+
+        send({"type": "result", "task_id": task_id})
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    """A worker that processes modules for a RemoteProcessor, every connection is handled in its own thread.
+
+    Args:
+        host: the interface to listen on
+        port: the port to listen on ('0' picks a free port)
+        heartbeat_interval: the interval (in seconds) of heartbeat messages while a task is processed
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_WORKER_PORT,
+        heartbeat_interval: float = 1.0,
+    ):
+
+        self.heartbeat_interval: float = heartbeat_interval
+        super().__init__((host, port), _WorkerRequestHandler)
+
+    @property
+    def address(self) -> str:
+        host, port = self.server_address[0:2]
+        return f"{host}:{port}"
+
+    def warmup(self, *module_types: str) -> None:
+        """Set up and warm up the pooled modules of the provided module types or workflows, before tasks arrive."""
+
+        import dharpa
+
+        async def warmup_all():
+            async with anyio.create_task_group() as tg:
+                for module_type in module_types:
+                    await tg.spawn(dharpa.create_workflow(module_type).warmup)
+
+        anyio.run(warmup_all)
+
+    def server_close(self) -> None:
+
+        super().server_close()
+        # pooled modules live as long as the worker
+        anyio.run(get_processing_module_pool().clear)
+
+
+class RemoteProcessor(Processor):
+    """Processes modules on remote workers.
+
+    Every worker processes one module at a time. If a worker can't be reached, or doesn't send a heartbeat in time,
+    its task is re-assigned to another worker, and the failed worker is not used again until the cooldown is over.
+    Errors that happen while a module is processed are not retried. Nested workflows are processed locally, their
+    child modules are distributed.
+
+    Args:
+        workers: the addresses ('host:port') of the workers
+        heartbeat_timeout: the time (in seconds) after which a worker that didn't send a message is considered failed
+        max_attempts: the maximum number of workers a task is sent to, before processing is considered failed
+        failure_cooldown: the time (in seconds) before a failed worker is tried again
+    """
+
+    def __init__(
+        self,
+        workers: typing.Iterable[str],
+        heartbeat_timeout: float = 10.0,
+        max_attempts: int = 3,
+        failure_cooldown: float = 30.0,
+    ):
+
+        self._workers: typing.List[typing.Tuple[str, int]] = [
+            parse_worker_address(w) for w in workers
+        ]
+        if not self._workers:
+            raise ValueError("No remote workers provided.")
+
+        self._heartbeat_timeout: float = heartbeat_timeout
+        self._max_attempts: int = max_attempts
+        self._failure_cooldown: float = failure_cooldown
+
+        self._busy: typing.Set[typing.Tuple[str, int]] = set()
+        self._failed: typing.Dict[typing.Tuple[str, int], float] = {}
+        # tasks that wait for a worker to be released
+        self._waiting: typing.Deque[anyio.abc.Event] = collections.deque()
+
+    def _is_available(self, worker: typing.Tuple[str, int]) -> bool:
+
+        failed = self._failed.get(worker, None)
+        return failed is None or time.monotonic() - failed > self._failure_cooldown
+
+    @property
+    def max_concurrency(self) -> typing.Optional[int]:
+        return max(1, len([w for w in self._workers if self._is_available(w)]))
+
+    async def process(
+        self,
+        *modules: "WorkflowModule",
+    ):
+        async with anyio.create_task_group() as tg:
+            for m in modules:
+                if m.is_pipeline:
+                    await tg.spawn(m.process, self)
+                else:
+                    await tg.spawn(partial(m.process, process_func=self._process_remote))
+
+    async def _acquire_worker(self) -> typing.Tuple[str, int]:
+
+        while True:
+            waiting = False
+            for worker in self._workers:
+                if not self._is_available(worker):
+                    continue
+                if worker in self._busy:
+                    waiting = True
+                    continue
+                self._busy.add(worker)
+                return worker
+
+            if not waiting:
+                raise Exception(
+                    f"No remote workers available, all failed: {', '.join(f'{h}:{p}' for h, p in self._workers)}"
+                )
+
+            released = anyio.create_event()
+            self._waiting.append(released)
+            await released.wait()
+
+    def _release_worker(self, worker: typing.Tuple[str, int]) -> None:
+
+        self._busy.discard(worker)
+        # all waiting tasks check again, since the released worker might have failed in the meantime
+        while self._waiting:
+            set_event_nowait(self._waiting.popleft())
+
+    async def _process_remote(
+        self,
+        processing_module: "ProcessingModule",
+        inputs: "InputItems",
+        outputs: "OutputItems",
+    ) -> None:
+
+        module_type: str = processing_module._module_name  # type: ignore
+        message = {
+            "type": "task",
+            "task_id": str(uuid.uuid4()),
+            "module_type": module_type,
+            "module_config": processing_module.config,
+            "meta": processing_module.meta,
+            "inputs": dict(inputs.ALL),
+        }
+
+        failures = []
+        for _ in range(self._max_attempts):
+            worker = await self._acquire_worker()
+            try:
+                await self._run_on_worker(worker, message, outputs)
+            except (
+                OSError,
+                TimeoutError,
+                anyio.EndOfStream,
+                anyio.IncompleteRead,
+                anyio.BrokenResourceError,
+            ) as e:
+                self._failed[worker] = time.monotonic()
+                failures.append(f"{worker[0]}:{worker[1]} ({e.__class__.__name__})")
+                print(
+                    f"remote worker {worker[0]}:{worker[1]} failed, re-assigning task for '{module_type}'",
+                    file=sys.stderr,
+                )
+                continue
+            finally:
+                self._release_worker(worker)
+
+            return
+
+        raise Exception(
+            f"Processing of module type '{module_type}' failed, no worker finished the task: {', '.join(failures)}"
+        )
+
+    async def _run_on_worker(
+        self,
+        worker: typing.Tuple[str, int],
+        message: typing.Mapping[str, typing.Any],
+        outputs: "OutputItems",
+    ) -> None:
+        """Process a task on a worker, outputs are set as soon as the worker sends them."""
+
+        async with anyio.fail_after(self._heartbeat_timeout):
+            stream = await anyio.connect_tcp(*worker)
+
+        async with stream:
+            await stream.send(encode_message(message))
+            receive_stream = BufferedByteReceiveStream(stream)
+
+            while True:
+                async with anyio.fail_after(self._heartbeat_timeout):
+                    response = await receive_message(receive_stream)
+
+                response_type = response.get("type")
+                if response_type == "heartbeat":
+                    continue
+                elif response_type == "output":
+                    outputs.set_values(**{response["name"]: response["value"]})
+                elif response_type == "result":
+                    return
+                elif response_type == "error":
+                    raise Exception(
+                        f"Processing of module type '{message['module_type']}' failed on worker {worker[0]}:{worker[1]}: {response['error']}"
+                    )
+                else:
+                    raise Exception(f"Invalid response from worker: {response}")
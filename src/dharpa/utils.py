@@ -6,15 +6,18 @@ import json
 import logging
 import os
 import re
+import threading
 import typing
 import yaml
+from concurrent.futures import Future
+from functools import partial
 from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Set, Type, Union
 
 log = logging.getLogger("dharpa")
 
 if typing.TYPE_CHECKING:
-    pass
+    from anyio.abc import BlockingPortal, Event
 
 _PRELOADED = []
 
@@ -159,6 +162,115 @@ def get_data_from_file(path: Union[str, Path]):
     return data
 
 
+def set_event_nowait(event: "Event") -> None:
+    """Set an (anyio) event from synchronous code that runs in the thread of the event loop (e.g. a callback).
+
+    'Event.set' is a coroutine in anyio 2, but it never suspends, so it can be run to completion right away.
+    """
+
+    coro = event.set()
+    try:
+        coro.send(None)
+    except StopIteration:
+        pass
+
+
+def call_in_portal(
+    portal: "BlockingPortal", func: typing.Callable[[], typing.Awaitable]
+) -> None:
+    """Run an async function in the event loop of a portal, from another thread, without waiting for it."""
+
+    try:
+        portal.spawn_task(func)
+    except RuntimeError:
+        # the portal was closed in the meantime, so there's nothing left to do
+        pass
+
+
+def set_event_threadsafe(
+    event: "Event", portal: "BlockingPortal", loop_thread: int
+) -> None:
+    """Set an (anyio) event from any thread, the thread of the event loop sets it right away, others via the portal.
+
+    Args:
+        event: the event
+        portal: a portal into the event loop the event belongs to
+        loop_thread: the identifier of the thread the event loop runs in (see 'threading.get_ident')
+    """
+
+    if threading.get_ident() == loop_thread:
+        set_event_nowait(event)
+    else:
+        call_in_portal(portal, event.set)
+
+
+async def wait_for_future(future: Future) -> typing.Any:
+    """Wait for a future (e.g. of a thread or process pool) without blocking the event loop, or a worker thread.
+
+    The future hands its completion to the event loop through a portal. If waiting is cancelled, the future is
+    cancelled as well, which only has an effect if its call didn't start yet (otherwise its result is discarded).
+    """
+
+    import anyio
+
+    done = anyio.create_event()
+    async with anyio.create_blocking_portal() as portal:
+        set_done = partial(set_event_threadsafe, done, portal, threading.get_ident())
+        future.add_done_callback(lambda f: set_done())
+        try:
+            await done.wait()
+        except anyio.get_cancelled_exc_class():
+            future.cancel()
+            raise
+    return future.result()
+
+
+class ThreadSafeNotifier(object):
+    """Lets tasks wait until a condition is met, the condition is checked again whenever 'notify_all' is called.
+
+    Waiting tasks don't block a thread, and they can belong to any event loop (in any thread). 'notify_all' can be
+    called from any thread as well.
+    """
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._waiters: typing.Set[typing.Callable[[], None]] = set()
+
+    async def wait_for(self, predicate: typing.Callable[[], typing.Any]) -> typing.Any:
+        """Wait until the predicate returns a 'truthy' value, and return that value.
+
+        The predicate is called in the thread of the event loop of the waiting task.
+        """
+
+        import anyio
+
+        while True:
+            notified = anyio.create_event()
+            async with anyio.create_blocking_portal() as portal:
+                notify = partial(
+                    set_event_threadsafe, notified, portal, threading.get_ident()
+                )
+                # registered before the predicate is checked, so no notification can get lost in between
+                with self._lock:
+                    self._waiters.add(notify)
+                try:
+                    result = predicate()
+                    if result:
+                        return result
+                    await notified.wait()
+                finally:
+                    with self._lock:
+                        self._waiters.discard(notify)
+
+    def notify_all(self) -> None:
+
+        with self._lock:
+            waiters = list(self._waiters)
+        for notify in waiters:
+            notify()
+
+
 # def print_file_content(path: Union[str, Path]):
 #
 #     if isinstance(path, str):
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import typing
+from pathlib import Path
+
+from dharpa.data.core import DataType
+from dharpa.data.fingerprints import get_content_fingerprint, get_value_fingerprint
+from dharpa.data.tables import LazyTable
+from dharpa.defaults import DHARPA_TOOLBOX_CHECKPOINTS_FOLDER
+from dharpa.models import ModuleState
+
+if typing.TYPE_CHECKING:
+    from dharpa.workflows.modules import WorkflowModule
+
+CHECKPOINT_METADATA_FILE = "checkpoint.json"
+
+
+class _StaleCheckpoint(Exception):
+    pass
+
+
+def _is_restored_unchanged(value: typing.Any, restored: typing.Any) -> bool:
+    """Check whether a value that was converted for storage (e.g. to Arrow or json) is restored exactly as it was."""
+
+    fingerprint = get_value_fingerprint(value)
+    return fingerprint is not None and fingerprint == get_content_fingerprint(restored)
+
+
+class CheckpointStore(object):
+    """Stores the outputs of workflow modules on disk, so an interrupted workflow run can be resumed.
+
+    Checkpoints are keyed on the fingerprints of the module type, the module configuration and the values of all
+    module inputs (modules with values that can't be fingerprinted are not checkpointed). This means the outputs of a
+    module can be restored in a new run of the same workflow (with the same inputs), as soon as all the upstream
+    modules it depends on have been processed (or restored) themselves.
+
+    Table values are stored in the Arrow IPC format if 'pyarrow' is available (see the 'checkpoints' extra), and
+    pickled otherwise. Lazy tables are stored as reference to their file, and only restored as long as that file
+    doesn't change. All other values are stored as json (if possible). Values that would not be restored exactly as
+    they are (e.g. rows with missing columns in Arrow, or tuples in json) are pickled instead.
+
+    Args:
+        base_path: the folder to store checkpoints in
+    """
+
+    def __init__(self, base_path: typing.Union[str, Path, None] = None):
+
+        if base_path is None:
+            base_path = DHARPA_TOOLBOX_CHECKPOINTS_FOLDER
+        if isinstance(base_path, str):
+            base_path = Path(os.path.expanduser(base_path))
+
+        self._base_path: Path = base_path
+
+    @property
+    def base_path(self) -> Path:
+        return self._base_path
+
+    def get_checkpoint_key(self, module: "WorkflowModule") -> typing.Optional[str]:
+        """Return the key of the checkpoint for the current inputs of a module.
+
+        Returns 'None' if the configuration or one of the input values can't be fingerprinted, such modules can't be
+        checkpointed.
+        """
+
+        inputs = {}
+        for name, item in module.inputs.items():
+            fingerprint = item.fingerprint
+            if fingerprint is None:
+                return None
+            inputs[name] = fingerprint
+
+        return get_value_fingerprint(
+            {
+                "module_type": module.module_type,
+                "module_config": module._processing_config.module_config,
+                "inputs": inputs,
+            }
+        )
+
+    def _get_checkpoint_path(self, key: str) -> Path:
+        return self._base_path / key[0:2] / key
+
+    def has_checkpoint(self, module: "WorkflowModule") -> bool:
+
+        key = self.get_checkpoint_key(module)
+        if key is None:
+            return False
+        path = self._get_checkpoint_path(key) / CHECKPOINT_METADATA_FILE
+        return path.exists()
+
+    def save(self, module: "WorkflowModule") -> bool:
+        """Save the current outputs of a module.
+
+        Returns:
+            bool: whether a checkpoint was written (only modules with valid results, and a checkpoint key, are checkpointed)
+        """
+
+        if module.state != ModuleState.RESULTS_READY:
+            return False
+
+        key = self.get_checkpoint_key(module)
+        if key is None:
+            return False
+        target = self._get_checkpoint_path(key)
+        if (target / CHECKPOINT_METADATA_FILE).exists():
+            return True
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # write into a temporary folder first, so a crash never leaves a half-written checkpoint behind
+        temp_dir = Path(tempfile.mkdtemp(prefix=f".{key}_", dir=target.parent))
+        try:
+            outputs = {}
+            for name, item in module.outputs.items():
+                outputs[name] = self._write_value(
+                    temp_dir, name, item.value, item.schema.type
+                )
+
+            metadata = {
+                "module_type": module.module_type,
+                "address": module.address,
+                "outputs": outputs,
+            }
+            with open(temp_dir / CHECKPOINT_METADATA_FILE, "w") as f:
+                json.dump(metadata, f)
+
+            os.rename(temp_dir, target)
+        except OSError:
+            # most likely, another process wrote the same checkpoint in the meantime
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if not (target / CHECKPOINT_METADATA_FILE).exists():
+                raise
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        return True
+
+    def restore(self, module: "WorkflowModule") -> bool:
+        """Restore the outputs of a module from a checkpoint, if one exists for the current inputs.
+
+        Returns:
+            bool: whether the outputs were restored
+        """
+
+        key = self.get_checkpoint_key(module)
+        if key is None:
+            return False
+        path = self._get_checkpoint_path(key)
+        metadata_file = path / CHECKPOINT_METADATA_FILE
+        if not metadata_file.exists():
+            return False
+
+        with open(metadata_file) as f:
+            metadata = json.load(f)
+
+        values = {}
+        try:
+            for name, details in metadata["outputs"].items():
+                values[name] = self._read_value(path, details)
+        except _StaleCheckpoint as e:
+            print(f"ignoring checkpoint of {module.address}: {e}", file=sys.stderr)
+            return False
+
+        module._set_results(values)
+        module._update_state()
+
+        print(f"restored from checkpoint: {module.address}", file=sys.stderr)
+        return True
+
+    def _write_value(
+        self, path: Path, name: str, value: typing.Any, value_type: DataType
+    ) -> typing.Mapping[str, str]:
+
+        if isinstance(value, LazyTable):
+            # only the reference to the file is pickled, the rows are never loaded
+            file_name = f"{name}.pickle"
+            with open(path / file_name, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            return {
+                "format": "lazy_table",
+                "file": file_name,
+                "fingerprint": value.get_fingerprint(),  # type: ignore
+            }
+
+        if value_type == DataType.table:
+            try:
+                import pyarrow as pa
+
+                table = pa.Table.from_pylist(
+                    value if isinstance(value, list) else list(value)
+                )
+                if not _is_restored_unchanged(value, table.to_pylist()):
+                    raise ValueError("table changes in conversion to Arrow")
+                file_name = f"{name}.arrow"
+                with pa.OSFile(str(path / file_name), "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                return {"format": "arrow", "file": file_name}
+            except Exception:
+                # either pyarrow is not available, or the table can't be represented in Arrow
+                pass
+        else:
+            try:
+                data = json.dumps(value)
+                if not _is_restored_unchanged(value, json.loads(data)):
+                    raise ValueError("value changes in conversion to json")
+                file_name = f"{name}.json"
+                (path / file_name).write_text(data)
+                return {"format": "json", "file": file_name}
+            except (TypeError, ValueError):
+                pass
+
+        file_name = f"{name}.pickle"
+        with open(path / file_name, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return {"format": "pickle", "file": file_name}
+
+    def _read_value(self, path: Path, details: typing.Mapping[str, str]) -> typing.Any:
+
+        file_path = path / details["file"]
+        if details["format"] == "arrow":
+            import pyarrow as pa
+
+            with pa.memory_map(str(file_path), "r") as source:
+                return pa.ipc.open_file(source).read_all().to_pylist()
+        elif details["format"] == "json":
+            return json.loads(file_path.read_text())
+        elif details["format"] == "pickle":
+            with open(file_path, "rb") as f:
+                return pickle.load(f)
+        elif details["format"] == "lazy_table":
+            with open(file_path, "rb") as f:
+                table: LazyTable = pickle.load(f)
+            try:
+                fingerprint = table.get_fingerprint()
+            except OSError:
+                fingerprint = None
+            if fingerprint is None or fingerprint != details["fingerprint"]:
+                raise _StaleCheckpoint(f"file '{table.path}' changed or was removed")
+            return table
+        else:
+            raise ValueError(f"Invalid checkpoint value format: {details['format']}")
+
+    def clear(self) -> None:
+        """Delete all checkpoints in this store."""
+
+        shutil.rmtree(self._base_path, ignore_errors=True)
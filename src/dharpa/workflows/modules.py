@@ -1,19 +1,29 @@
 # -*- coding: utf-8 -*-
+import anyio
 import collections
 import sys
+import threading
+import time
 import typing
+from anyio import create_blocking_portal, create_task_group
+from anyio.abc import CancelScope, Event
 from functools import partial
 
-from dharpa.data.core import DataItem, DataItems, DataSchema
+from dharpa.data.core import VERSIONS, DataItem, DataItems, DataSchema
 from dharpa.models import (
     ModuleDetails,
     ModuleState,
     ProcessingConfig,
+    ResourceHints,
+    RetryPolicy,
     ValueItem,
     ValueSchema,
 )
 from dharpa.processing.executors import Processor
+from dharpa.processing.pool import get_processing_module_pool, process_pooled
 from dharpa.processing.processing_module import ProcessingModule
+from dharpa.utils import call_in_portal, set_event_nowait, set_event_threadsafe
+from dharpa.workflows.serialization import get_serializer
 from dharpa.workflows.utils import get_auto_module_alias
 
 
@@ -50,6 +60,19 @@ def explode_input_links(
     return result
 
 
+def _get_cancellation(exc: BaseException) -> typing.Optional[BaseException]:
+    """Return the first cancellation exception, if an exception (group) only consists of cancellation exceptions."""
+
+    if isinstance(exc, anyio.ExceptionGroup):
+        cancellations = [_get_cancellation(e) for e in exc.exceptions]
+        if not cancellations or None in cancellations:
+            return None
+        return cancellations[0]
+    if isinstance(exc, anyio.get_cancelled_exc_class()):
+        return exc
+    return None
+
+
 class InputItems(DataItems):
     def __init__(
         self,
@@ -90,6 +113,16 @@ class InputItems(DataItems):
     def _post_values_set(self, old_values: typing.Mapping[str, typing.Any]):
         pass
 
+    def items__snapshot(self) -> "InputItems":
+        """Return a read-only copy of the current input values, which is not affected by later changes to these inputs."""
+
+        snapshot = InputItems()
+        DataItems.__init__(
+            snapshot, **{k: v.snapshot() for k, v in self._data_items.items()}
+        )
+        snapshot.items__disable()
+        return snapshot
+
     def __repr__(self):
 
         return f"InputItems(value_names={list(self._data_items.keys())} valid={self.items__are_valid})"
@@ -131,6 +164,10 @@ class WorkflowModule(object):
         alias: str = None,
         workflow_id: str = None,
         input_links: typing.Mapping[str, typing.Any] = None,
+        timeout: typing.Optional[float] = None,
+        retry: typing.Union[RetryPolicy, typing.Mapping[str, typing.Any], None] = None,
+        rerun_on_input_change: bool = False,
+        publish_outputs_early: bool = False,
     ):
 
         if isinstance(processing_config, typing.Mapping):
@@ -146,7 +183,25 @@ class WorkflowModule(object):
         self._workflow_id: typing.Optional[str] = workflow_id
         self._alias: str = alias
         self._state: ModuleState = ModuleState.STALE
+        self._state_version: int = VERSIONS.bump()
         self._is_processing: bool = False
+        # set once the current processing run is finished, only exists after processing started
+        self._processing_finished: typing.Optional[Event] = None
+        self._cancel_requested: bool = False
+        # cancels the current processing attempt, only set while one is running
+        self._cancel_attempt: typing.Optional[typing.Callable[[], None]] = None
+        self._was_cancelled: bool = False
+        self._rerun_on_input_change: bool = rerun_on_input_change
+        self._publish_outputs_early: bool = publish_outputs_early
+        self._timeout: typing.Optional[float] = timeout
+        if retry is None:
+            retry = RetryPolicy()
+        elif isinstance(retry, typing.Mapping):
+            retry = RetryPolicy(**retry)
+        self._retry: RetryPolicy = retry
+        self._error: typing.Optional[str] = None
+        self._results_version: typing.Optional[int] = None
+        self._last_processing_time: typing.Optional[float] = None
         self._processing_config: ProcessingConfig = _processing_config
         self._execution_stage: typing.Optional[int] = None
 
@@ -188,6 +243,10 @@ class WorkflowModule(object):
     def is_pipeline(self) -> bool:
         return False
 
+    @property
+    def resources(self) -> ResourceHints:
+        return self._processing_obj.resources
+
     @property
     def execution_stage(self) -> typing.Optional[int]:
         return self._execution_stage
@@ -224,32 +283,151 @@ class WorkflowModule(object):
     def inputs(self, inputs: typing.Any):
         self._current_inputs.set_values(**inputs)
 
+    @property
+    def inputs_version(self) -> int:
+        """The version of the most recent change to one of the inputs of this module."""
+        return self._current_inputs.items__version
+
     def _input_changed(self, input_name: str, new_value: typing.Any):
 
+        # a processing run only uses a snapshot of the inputs, so it is obsolete now
+        if self._cancel_attempt is not None:
+            self._cancel_attempt()
+        # the error of the last run doesn't apply to the new inputs
+        self._error = None
         self._update_state()
 
     @property
     def state(self) -> ModuleState:
+        return self._refresh_state()
+
+    def _refresh_state(self) -> ModuleState:
+        """Pick up inputs that became valid since the state was last set (e.g. through upstream modules)."""
+
         if self._state == ModuleState.STALE:
             if self.inputs.items__are_valid:
-                self._state = ModuleState.INPUTS_READY
+                self._set_state(ModuleState.INPUTS_READY)
         return self._state
 
+    def _set_state(self, state: ModuleState) -> None:
+
+        if state != self._state:
+            self._state = state
+            self._state_version = VERSIONS.bump()
+
+    @property
+    def version(self) -> int:
+        """The version of the most recent change to either the state, or one of the inputs/outputs of this module."""
+
+        version = self._state_version
+        for items in (self._current_inputs, self._current_outputs):
+            for item in items.values():
+                if item.version > version:
+                    version = item.version
+        return version
+
     @property
     def is_processing(self) -> bool:
         return self._is_processing
 
+    async def wait_until_processed(self) -> None:
+        """Wait until the current processing run of this module (if any) is finished, or was cancelled."""
+
+        while self._is_processing:
+            await self._processing_finished.wait()  # type: ignore
+
+    @property
+    def rerun_on_input_change(self) -> bool:
+        """Whether this module is processed again, if its inputs change while it is processing.
+
+        Otherwise, the results of the obsolete run are discarded, and the module has to be processed again explicitly.
+        """
+        return self._rerun_on_input_change
+
+    @rerun_on_input_change.setter
+    def rerun_on_input_change(self, rerun_on_input_change: bool):
+        self._rerun_on_input_change = rerun_on_input_change
+
+    @property
+    def publish_outputs_early(self) -> bool:
+        """Whether every output is published as soon as it is set, instead of all outputs once processing finished.
+
+        This lets connected modules start while this one is still processing. If processing fails, or is cancelled,
+        outputs that were published already are reset.
+        """
+        return self._publish_outputs_early
+
+    @publish_outputs_early.setter
+    def publish_outputs_early(self, publish_outputs_early: bool):
+        self._publish_outputs_early = publish_outputs_early
+
+    @property
+    def timeout(self) -> typing.Optional[float]:
+        """The maximum time (in seconds) processing of this module is allowed to take ('None' for no limit)."""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout: typing.Optional[float]):
+        self._timeout = timeout
+
+    @property
+    def retry(self) -> RetryPolicy:
+        """How often, and after which delay, processing of this module is retried if it fails."""
+        return self._retry
+
+    @retry.setter
+    def retry(self, retry: RetryPolicy):
+        self._retry = retry
+
+    @property
+    def error(self) -> typing.Optional[str]:
+        """The error message of the last processing run, if it failed."""
+        return self._error
+
+    @property
+    def last_processing_time(self) -> typing.Optional[float]:
+        """How long the last processing run of this module took, in seconds."""
+        return self._last_processing_time
+
+    @property
+    def results_are_current(self) -> bool:
+        """Whether the outputs of this module are valid, and were computed from its current inputs.
+
+        Outputs that were released to free memory count as valid, but their values are gone, so they are not current.
+        """
+
+        return (
+            self._results_version is not None
+            and self._results_version == self.inputs_version
+            and self._current_outputs.items__are_valid
+            and not any(item.is_released for item in self._current_outputs.values())
+        )
+
+    def _set_results(
+        self,
+        values: typing.Mapping[str, typing.Any],
+        inputs_version: typing.Optional[int] = None,
+    ) -> None:
+        """Publish the results of processing the inputs with the provided version (the current one, if not provided)."""
+
+        self._current_outputs.set_values(**values)
+        self._results_version = (
+            self.inputs_version if inputs_version is None else inputs_version
+        )
+
     def _update_state(self) -> ModuleState:
 
         # current = self._state
         if not self.inputs.items__are_valid:
             new_state = ModuleState.STALE
+        elif self._error is not None:
+            new_state = ModuleState.FAILED
         elif not self.outputs.items__are_valid:
             new_state = ModuleState.INPUTS_READY
         else:
             new_state = ModuleState.RESULTS_READY
 
-        self._state = new_state
+        self._set_state(new_state)
 
         # if current != new_state:
         #     print(f"{self} - new state: {self._state}")
@@ -264,50 +442,304 @@ class WorkflowModule(object):
 
         self._update_state()
 
-    async def process(self, executor: Processor = None):
+    async def process(
+        self,
+        executor: Processor = None,
+        process_func: typing.Optional[
+            typing.Callable[
+                [ProcessingModule, InputItems, OutputItems], typing.Awaitable[None]
+            ]
+        ] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> bool:
+        """Process this module.
+
+        Processing uses a snapshot of the current inputs, so inputs can be changed at any time. Results are only
+        published to the outputs of this module once processing finished. If the module is cancelled (explicitly, or
+        because one of its inputs changed in the meantime), the results are discarded. In the latter case, the module
+        is processed again with the new inputs if 'rerun_on_input_change' is set.
+
+        Args:
+            executor: the executor to use
+            process_func: a function that does the actual processing, instead of the processing object of this module (e.g. in another process)
+            timeout: the maximum time (in seconds) processing is allowed to take, overrides the timeout of this module
+
+        Returns:
+            bool: whether the results were published, 'False' if processing was cancelled
+        """
+
+        if executor is not None and not self.is_pipeline and process_func is None:
+            if self.state == ModuleState.STALE:
+                missing = []
+                for k, v in self.inputs.items():
+                    if v.value is None:
+                        missing.append(k)
+                raise Exception(
+                    f"Can't start processing for module '{self.alias}', inputs not ready yet: {missing}"
+                )
+            # the executor calls this method again, without an executor
+            await executor.process(self)
+            return not self._was_cancelled
+
+        while self._is_processing:
+            # a new run makes the current one obsolete
+            self.cancel()
+            await self._processing_finished.wait()  # type: ignore
+
+        if timeout is None:
+            timeout = self._timeout
 
         print(f"processing started: {self.address}", file=sys.stderr)
 
-        self._state = ModuleState.RESULTS_INCOMING
-        self._current_inputs.items__disable()
-
-        # print(f"process started: {self} {executor}")
+        self._set_state(ModuleState.RESULTS_INCOMING)
+        self._is_processing = True
+        processing_finished = self._processing_finished = anyio.create_event()
+        self._cancel_requested = False
+        self._was_cancelled = False
+        self._error = None
+        started = time.perf_counter()
 
         try:
-
-            if self.is_pipeline:
-                # workflows need to have access to the executor directly
-                await self._process_workflow(executor=executor)  # type: ignore
-            else:
-                if executor is None:
-                    await self._processing_obj.process(
-                        self._current_inputs, self._current_outputs
-                    )
-                else:
-                    if self._state == ModuleState.STALE:
-                        missing = []
-                        for k, v in self.inputs.items():
-                            if v.value is None:
-                                missing.append(k)
-                        raise Exception(
-                            f"Can't start processing for module '{self.alias}', inputs not ready yet: {missing}"
+            while True:
+                inputs = self._current_inputs.items__snapshot()
+                attempt = 1
+                while True:
+                    try:
+                        published = await self._process_attempt(
+                            inputs,
+                            executor=executor,
+                            process_func=process_func,
+                            timeout=timeout,
                         )
-
-                    # raise NotImplementedError()
-                    await executor.process(self)
-
-            self._current_inputs.items__enable()
-            # print(f"process finished: {self}")
-
+                        break
+                    except Exception as e:
+                        if attempt >= self._retry.max_attempts:
+                            raise e
+                        delay = self._retry.get_delay(attempt)
+                        print(
+                            f"processing '{self.address}' failed (attempt {attempt} of {self._retry.max_attempts}), retrying in {delay} seconds: {e}",
+                            file=sys.stderr,
+                        )
+                        attempt = attempt + 1
+                        await anyio.sleep(delay)
+
+                if (
+                    not self._rerun_on_input_change
+                    or self._cancel_requested
+                    or self.inputs_version == inputs.items__version
+                    or not self._current_inputs.items__are_valid
+                ):
+                    break
+                print(
+                    f"inputs of '{self.address}' changed while processing, processing again",
+                    file=sys.stderr,
+                )
+
+            self._was_cancelled = not published
             self._update_state()
+            return published
         except Exception as e:
+            self._error = str(e)
+            self._update_state()
             print(
                 f"processing '{self.address}' finished with error: {e}", file=sys.stderr
             )
             raise e
         finally:
+            self._is_processing = False
+            self._last_processing_time = time.perf_counter() - started
+            async with anyio.open_cancel_scope(shield=True):
+                await self._teardown_processing_obj()
+            set_event_nowait(processing_finished)
             print(f"processing finished: {self.address}", file=sys.stderr)
 
+    async def _teardown_processing_obj(self) -> None:
+        """Tear down the processing object of this module once it is processed, unless it is kept by the module pool."""
+
+        processing_obj = self._processing_obj
+        if (
+            self.is_pipeline
+            or processing_obj._pool_key is not None
+            or not processing_obj.is_set_up
+        ):
+            return
+        await processing_obj.teardown()
+
+    async def _process_attempt(
+        self,
+        inputs: InputItems,
+        executor: typing.Optional[Processor],
+        process_func: typing.Optional[typing.Callable],
+        timeout: typing.Optional[float],
+    ) -> bool:
+        """Process the provided snapshot of the inputs once, returns whether the results were published."""
+
+        # results are collected here first, so they can be discarded if processing is cancelled
+        scratch_outputs = OutputItems(**self.output_schema)
+
+        published: typing.Set[str] = set()
+        set_in_threads: typing.Set[str] = set()
+        loop_thread = threading.get_ident()
+
+        try:
+            async with anyio.move_on_after(timeout) as scope:
+                try:
+                    async with create_blocking_portal() as portal, create_task_group() as tg:
+
+                        cancelled = anyio.create_event()
+                        await tg.spawn(self._watch_cancellation, scope, cancelled)
+
+                        # this can be called from any thread, cancellation is handed off to the event loop
+                        self._cancel_attempt = cancel_attempt = partial(
+                            set_event_threadsafe, cancelled, portal, loop_thread
+                        )
+                        if (
+                            self._cancel_requested
+                            or self.inputs_version != inputs.items__version
+                        ):
+                            cancel_attempt()
+
+                        if self._publish_outputs_early:
+
+                            async def publish_from_threads():
+                                self._publish_outputs_from_threads(
+                                    scratch_outputs,
+                                    set_in_threads,
+                                    inputs.items__version,
+                                    published,
+                                )
+
+                            def output_set(output_name: str, value: typing.Any):
+                                if threading.get_ident() == loop_thread:
+                                    self._publish_output(
+                                        output_name,
+                                        value,
+                                        inputs.items__version,
+                                        published,
+                                    )
+                                else:
+                                    # values are only ever published from the thread of the event loop
+                                    set_in_threads.add(output_name)
+                                    call_in_portal(portal, publish_from_threads)
+
+                            for output_name, item in scratch_outputs.items():
+                                item.add_callback(
+                                    partial(output_set, output_name),
+                                    pass_stored_value=True,
+                                )
+
+                        if self.is_pipeline:
+                            # workflows need to have access to the executor directly
+                            await self._process_workflow(executor=executor, inputs=inputs, outputs=scratch_outputs)  # type: ignore
+                        elif process_func is not None:
+                            await process_func(
+                                self._processing_obj, inputs, scratch_outputs
+                            )
+                        else:
+                            await process_pooled(
+                                self._processing_obj, inputs, scratch_outputs
+                            )
+
+                        await tg.cancel_scope.cancel()
+                except anyio.ExceptionGroup as eg:
+                    # if an outer scope is cancelled, nested task groups raise groups of cancellation exceptions, which
+                    # are not recognized as cancellation by the scopes they pass through
+                    cancellation = _get_cancellation(eg)
+                    if cancellation is None:
+                        raise
+                    raise cancellation
+        except BaseException:
+            self._retract_outputs(published)
+            raise
+        finally:
+            self._cancel_attempt = None
+
+        # the inputs might have changed after processing finished, but before the results are published
+        inputs_changed = self.inputs_version != inputs.items__version
+        cancelled = self._cancel_requested or inputs_changed
+        if scope.cancel_called and not cancelled:
+            self._retract_outputs(published)
+            raise TimeoutError(
+                f"Processing of module '{self.address}' timed out after {timeout} seconds."
+            )
+
+        if cancelled:
+            reason = "inputs changed" if inputs_changed else "cancelled"
+            print(
+                f"processing '{self.address}' cancelled ({reason}), discarding results",
+                file=sys.stderr,
+            )
+            self._retract_outputs(published)
+            return False
+
+        # spilled values are published as references, callbacks of the outputs get the loaded values
+        self._set_results(
+            {k: v._value for k, v in scratch_outputs.items()},
+            inputs_version=inputs.items__version,
+        )
+        return True
+
+    def _publish_output(
+        self,
+        output_name: str,
+        value: typing.Any,
+        inputs_version: int,
+        published: typing.Set[str],
+    ) -> None:
+        """Publish a single output while processing is still going on, unless the run is obsolete already."""
+
+        if self._cancel_requested or self.inputs_version != inputs_version:
+            return
+        self._current_outputs[output_name].set_value(value)
+        published.add(output_name)
+
+    def _publish_outputs_from_threads(
+        self,
+        scratch_outputs: OutputItems,
+        set_in_threads: typing.Set[str],
+        inputs_version: int,
+        published: typing.Set[str],
+    ) -> None:
+
+        while set_in_threads:
+            output_name = set_in_threads.pop()
+            self._publish_output(
+                output_name,
+                scratch_outputs[output_name]._value,
+                inputs_version,
+                published,
+            )
+
+    def _retract_outputs(self, published: typing.Set[str]) -> None:
+        """Reset outputs that were published early by a run that didn't finish, connected modules are notified."""
+
+        for output_name in published:
+            self._current_outputs[output_name].set_value(None)
+        published.clear()
+
+    async def _watch_cancellation(self, scope: CancelScope, cancelled: Event) -> None:
+
+        await cancelled.wait()
+        await scope.cancel()
+
+    def cancel(self) -> None:
+        """Request cancellation of the current processing run of this module, its results will be discarded.
+
+        This can be called from any thread, and returns immediately. Cancellation is cooperative: processing stops at
+        the next point it yields to the event loop, blocking code runs to completion (but its results are discarded).
+        """
+
+        if self._is_processing:
+            self._cancel_requested = True
+            cancel_attempt = self._cancel_attempt
+            if cancel_attempt is not None:
+                cancel_attempt()
+
+    async def warmup(self) -> None:
+        """Set up and warm up the processing object(s) of this module, so the first processing run is fast."""
+
+        await get_processing_module_pool().warmup(self._processing_obj)
+
     @property
     def outputs(self) -> OutputItems:
         return self._current_outputs
@@ -338,24 +770,61 @@ class WorkflowModule(object):
             inputs=inputs,
             outputs=outputs,
             doc=self.doc,
+            error=self.error,
         )
 
     def to_dict(
-        self, include_structure: bool = True, exclude_none: bool = False
+        self,
+        include_structure: bool = True,
+        exclude_none: bool = False,
+        max_table_rows: typing.Optional[int] = None,
+        table_reference: bool = False,
     ) -> typing.Dict[str, typing.Any]:
 
-        details = self.to_details(include_structure=include_structure)
-        return details.dict(by_alias=True, exclude_none=exclude_none)
+        serializer = get_serializer(
+            max_table_rows=max_table_rows, table_reference=table_reference
+        )
+        return serializer.module_to_dict(
+            self, include_structure=include_structure, exclude_none=exclude_none
+        )
 
     def to_json(
         self,
         include_structure: bool = True,
         exclude_none: bool = False,
+        max_table_rows: typing.Optional[int] = None,
+        table_reference: bool = False,
         **dump_kwargs: typing.Any,
     ) -> str:
 
-        details = self.to_details(include_structure=include_structure)
-        return details.json(by_alias=True, exclude_none=exclude_none, **dump_kwargs)
+        serializer = get_serializer(
+            max_table_rows=max_table_rows, table_reference=table_reference
+        )
+        return serializer.module_to_json(
+            self,
+            include_structure=include_structure,
+            exclude_none=exclude_none,
+            **dump_kwargs,
+        )
+
+    def get_changes(
+        self,
+        since_version: int = 0,
+        exclude_none: bool = False,
+        max_table_rows: typing.Optional[int] = None,
+        table_reference: bool = False,
+    ) -> typing.Dict[str, typing.Any]:
+        """Return the state of all (child-)modules and values that changed after 'since_version'.
+
+        The result contains the current 'version', which can be used for the next call.
+        """
+
+        serializer = get_serializer(
+            max_table_rows=max_table_rows, table_reference=table_reference
+        )
+        return serializer.changes_to_dict(
+            self, since_version=since_version, exclude_none=exclude_none
+        )
 
     def __repr__(self):
 
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Runs of workflows.
+
+A workflow object holds a single set of input and output values. A run holds its own set of values, but shares the
+structure (and the processing options) of the workflow it belongs to, so one workflow object can process any number
+of independent input sets at the same time, e.g. to serve concurrent requests.
+"""
+import anyio
+import sys
+import time
+import typing
+import uuid
+
+from dharpa.models import ModuleState, WorkflowRunStats
+from dharpa.processing.executors import Processor
+from dharpa.workflows.modules import InputItems, OutputItems, _get_cancellation
+
+if typing.TYPE_CHECKING:
+    from dharpa.workflows.workflow import DharpaWorkflow
+
+
+def get_run_error(
+    run_stats: typing.Optional[WorkflowRunStats], outputs: OutputItems
+) -> typing.Optional[str]:
+    """Return the error of a workflow run, if child modules failed and not all workflow outputs could be computed."""
+
+    if run_stats is None or not run_stats.errors or outputs.items__are_valid:
+        return None
+    failed = ", ".join(f"{k} ({v})" for k, v in run_stats.errors.items())
+    return f"Module(s) failed: {failed}"
+
+
+class WorkflowRun(object):
+    """A single run of a workflow, with its own input and output values.
+
+    Runs are created with 'DharpaWorkflow.create_run' (or processed right away with 'DharpaWorkflow.run'). Changes
+    to the values of a run don't affect the workflow object it was created from, or any other run of it.
+    """
+
+    def __init__(
+        self,
+        workflow: "DharpaWorkflow",
+        inputs: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+    ):
+
+        self._workflow: "DharpaWorkflow" = workflow
+        self._run_id: str = str(uuid.uuid4())
+
+        # schemas are shared, only the values belong to this run
+        self._inputs: InputItems = InputItems(**workflow.input_schema)
+        self._outputs: OutputItems = OutputItems(**workflow.output_schema)
+        if inputs:
+            self._inputs.set_values(**inputs)
+
+        self._is_processing: bool = False
+        self._error: typing.Optional[str] = None
+        self._run_stats: typing.Optional[WorkflowRunStats] = None
+        self._processing_time: typing.Optional[float] = None
+
+    @property
+    def run_id(self) -> str:
+        return self._run_id
+
+    @property
+    def workflow(self) -> "DharpaWorkflow":
+        return self._workflow
+
+    @property
+    def inputs(self) -> InputItems:
+        return self._inputs
+
+    @inputs.setter
+    def inputs(self, inputs: typing.Mapping[str, typing.Any]):
+        self._inputs.set_values(**inputs)
+
+    @property
+    def outputs(self) -> OutputItems:
+        return self._outputs
+
+    @property
+    def state(self) -> ModuleState:
+
+        if self._is_processing:
+            return ModuleState.RESULTS_INCOMING
+        if not self._inputs.items__are_valid:
+            return ModuleState.STALE
+        if self._error is not None:
+            return ModuleState.FAILED
+        if not self._outputs.items__are_valid:
+            return ModuleState.INPUTS_READY
+        return ModuleState.RESULTS_READY
+
+    @property
+    def error(self) -> typing.Optional[str]:
+        """The error of the last processing attempt of this run, if it failed."""
+        return self._error
+
+    @property
+    def run_stats(self) -> typing.Optional[WorkflowRunStats]:
+        """Statistics about the processing of this run ('None' if it wasn't processed yet)."""
+        return self._run_stats
+
+    @property
+    def processing_time(self) -> typing.Optional[float]:
+        """How long processing of this run took, in seconds."""
+        return self._processing_time
+
+    async def process(
+        self,
+        executor: Processor = None,
+        outputs: typing.Optional[typing.Iterable[str]] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> None:
+        """Process this run.
+
+        Processing uses a snapshot of the current inputs of this run, results are published to its outputs once
+        processing finished.
+
+        Args:
+            executor: the executor to use
+            outputs: if provided, only the modules that are needed to compute those workflow outputs are processed
+            timeout: the maximum time (in seconds) processing is allowed to take
+        """
+
+        if self._is_processing:
+            raise Exception(f"Run '{self._run_id}' is already processing.")
+
+        if not self._inputs.items__are_valid:
+            missing = [k for k, v in self._inputs.items() if v.value is None]
+            raise Exception(
+                f"Can't start processing run '{self._run_id}' of workflow '{self._workflow.alias}', inputs not ready yet: {missing}"
+            )
+
+        if outputs is not None:
+            outputs = list(outputs)
+            # fail early for invalid output names
+            self._workflow.structure.get_required_modules(outputs=outputs)
+
+        inputs = self._inputs.items__snapshot()
+        results = OutputItems(**self._workflow.output_schema)
+
+        self._is_processing = True
+        self._error = None
+        started = time.perf_counter()
+        try:
+            async with anyio.move_on_after(timeout) as scope:
+                try:
+                    self._run_stats = await self._workflow._run_workflow(
+                        executor, inputs, results, requested_outputs=outputs
+                    )
+                except anyio.ExceptionGroup as eg:
+                    cancellation = _get_cancellation(eg)
+                    if cancellation is None:
+                        raise
+                    raise cancellation
+
+            if scope.cancel_called:
+                raise TimeoutError(
+                    f"Processing of run '{self._run_id}' of workflow '{self._workflow.alias}' timed out after {timeout} seconds."
+                )
+
+            self._outputs.set_values(**{k: v._value for k, v in results.items()})
+            self._error = get_run_error(self._run_stats, results)
+        except Exception as e:
+            self._error = str(e)
+            print(
+                f"processing run '{self._run_id}' of workflow '{self._workflow.alias}' finished with error: {e}",
+                file=sys.stderr,
+            )
+            raise e
+        finally:
+            self._is_processing = False
+            self._processing_time = time.perf_counter() - started
+
+    def __repr__(self):
+
+        return f"WorkflowRun(workflow='{self._workflow.alias}' run_id={self._run_id} state={self.state.name})"
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import typing
+from pathlib import Path
+
+from dharpa.defaults import DHARPA_TOOLBOX_RUNTIME_STATS_FILE
+
+if typing.TYPE_CHECKING:
+    from dharpa.workflows.modules import WorkflowModule
+    from dharpa.workflows.structure import WorkflowStructure
+
+DEFAULT_RUNTIME_ESTIMATE = 1.0
+"""The estimated runtime (in seconds) of modules, if no statistics are available at all."""
+
+
+def _get_config_key(module: "WorkflowModule") -> str:
+
+    config = json.dumps(
+        module._processing_config.module_config, sort_keys=True, default=str
+    )
+    return f"{module.module_type}:{hashlib.sha256(config.encode()).hexdigest()[0:16]}"
+
+
+class RuntimeStatsStore(object):
+    """Keeps track of how long modules take to process, and persists those statistics in a local json file.
+
+    Runtimes are recorded per module type, and per module type and configuration (since the same module type can take
+    very different amounts of time depending on how it's configured). Estimates are (exponentially weighted) moving
+    averages, so they follow changes in runtime behaviour over time.
+
+    Args:
+        path: the file to store the statistics in (use 'None' for the default location)
+        smoothing: the minimum weight of a new measurement in the moving average
+    """
+
+    def __init__(
+        self, path: typing.Union[str, Path, None] = None, smoothing: float = 0.2
+    ):
+
+        if path is None:
+            path = DHARPA_TOOLBOX_RUNTIME_STATS_FILE
+        if isinstance(path, str):
+            path = Path(os.path.expanduser(path))
+
+        self._path: Path = path
+        self._smoothing: float = smoothing
+        self._stats: typing.Optional[typing.Dict[str, typing.Dict[str, float]]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def stats(self) -> typing.Dict[str, typing.Dict[str, float]]:
+
+        if self._stats is None:
+            self._stats = {}
+            if self._path.exists():
+                try:
+                    self._stats = json.loads(self._path.read_text())
+                except ValueError:
+                    # a corrupt stats file is not worth failing a workflow run for
+                    pass
+        return self._stats
+
+    def record(self, module: "WorkflowModule", duration: float) -> None:
+        """Record the duration (in seconds) of a single processing run of a module."""
+
+        with self._lock:
+            stats = self.stats
+            for key in (module.module_type, _get_config_key(module)):
+                entry = stats.setdefault(key, {"count": 0, "mean": 0.0})
+                entry["count"] = entry["count"] + 1
+                weight = max(1.0 / entry["count"], self._smoothing)
+                entry["mean"] = entry["mean"] + weight * (duration - entry["mean"])
+
+    def estimate(
+        self, module: "WorkflowModule", default: typing.Optional[float] = None
+    ) -> typing.Optional[float]:
+        """Return the estimated runtime of a module (in seconds), or the provided default if it never ran before."""
+
+        config_key = _get_config_key(module)
+        with self._lock:
+            stats = self.stats
+            for key in (config_key, module.module_type):
+                if key in stats.keys():
+                    return stats[key]["mean"]
+        return default
+
+    def default_estimate(self) -> float:
+        """Return the estimate to use for module types without any statistics (the mean over all known types)."""
+
+        with self._lock:
+            means = [v["mean"] for k, v in self.stats.items() if ":" not in k]
+        if not means:
+            return DEFAULT_RUNTIME_ESTIMATE
+        return sum(means) / len(means)
+
+    def save(self) -> None:
+
+        with self._lock:
+            data = json.dumps(self.stats, indent=2)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            prefix=f".{self._path.name}_", dir=self._path.parent
+        )
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(temp_path, self._path)
+
+
+def get_critical_path_priorities(
+    structure: "WorkflowStructure", runtime_stats: RuntimeStatsStore
+) -> typing.Dict[str, float]:
+    """Calculate the scheduling priority for every module of a workflow.
+
+    The priority of a module is the estimated runtime of the longest path from (and including) the module to the end
+    of the workflow, following the execution graph. Modules on the critical path of a workflow have the highest
+    priority.
+    """
+
+    default = runtime_stats.default_estimate()
+    graph = structure.execution_graph
+
+    priorities: typing.Dict[str, float] = {}
+    for stage in reversed(structure.execution_stages):
+        for m_id in stage:
+            module = structure.get_module(m_id)
+            cost = runtime_stats.estimate(module, default=default)
+            remaining = [priorities[s] for s in graph.successors(m_id)]
+            priorities[m_id] = cost + (max(remaining) if remaining else 0.0)  # type: ignore
+
+    return priorities
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+import collections.abc
+import json
+import typing
+import weakref
+from pydantic.json import pydantic_encoder
+
+from dharpa.data.core import DataItems, DataType, get_current_version
+from dharpa.data.tables import LazyTable
+
+if typing.TYPE_CHECKING:
+    from dharpa.workflows.modules import WorkflowModule
+    from dharpa.workflows.structure import WorkflowStructure
+
+
+class WorkflowSerializer(object):
+    """Serializes the state of workflow modules directly from the live objects.
+
+    The result has the same shape as ``module.to_details().dict(by_alias=True)``, but no intermediate
+    pydantic models are created. Parts that only depend on the structure of a module/workflow (schemas, doc,
+    connections) are cached, and re-used as long as the structure object doesn't change.
+
+    Table values are serialized as list of rows, like any other value. Lazy tables are only read as far as needed,
+    so 'max_table_rows' keeps the cost of serializing them bounded. With 'table_reference', lazy tables are serialized
+    as reference to their file instead (see 'LazyTable.get_reference'), which is a dict, not a list of rows.
+
+    Args:
+        max_table_rows: if set, table values with more rows are truncated to this number of rows ('0' elides table values completely)
+        table_reference: whether to serialize lazy tables as reference to their file, instead of their rows
+    """
+
+    def __init__(
+        self, max_table_rows: typing.Optional[int] = None, table_reference: bool = False
+    ):
+
+        self._max_table_rows: typing.Optional[int] = max_table_rows
+        self._table_reference: bool = table_reference
+        self._module_cache: typing.MutableMapping[
+            "WorkflowModule", typing.Dict[str, typing.Any]
+        ] = weakref.WeakKeyDictionary()
+
+    @property
+    def max_table_rows(self) -> typing.Optional[int]:
+        return self._max_table_rows
+
+    @property
+    def table_reference(self) -> bool:
+        return self._table_reference
+
+    def _get_static_details(self, module: "WorkflowModule") -> typing.Dict[str, typing.Any]:
+
+        static = self._module_cache.get(module, None)
+        if static is None:
+            static = {
+                "alias": module.alias,
+                "address": module.address,
+                "type": module.module_type,
+                "is_pipeline": module.is_pipeline,
+                "doc": module.doc,
+                "inputs": {
+                    k: {"type": v.schema.type.value, "default": v.schema.default}
+                    for k, v in module.inputs.items()
+                },
+                "outputs": {
+                    k: {"type": v.schema.type.value, "default": v.schema.default}
+                    for k, v in module.outputs.items()
+                },
+            }
+            self._module_cache[module] = static
+        return static
+
+    def _serialize_value(self, value: typing.Any, value_type: str) -> typing.Any:
+
+        if value_type != DataType.table.value or not isinstance(
+            value, collections.abc.Sequence
+        ):
+            return value
+
+        max_rows = self._max_table_rows
+        if isinstance(value, LazyTable):
+            if self._table_reference:
+                return value.get_reference()
+            if max_rows is None:
+                return list(value)
+            # slicing only reads the rows that are returned
+            return value[0:max_rows]
+
+        if max_rows is not None and len(value) > max_rows:
+            return list(value[0:max_rows])
+        return value
+
+    def _serialize_items(
+        self,
+        items: DataItems,
+        schemas: typing.Mapping[str, typing.Mapping[str, typing.Any]],
+        exclude_none: bool,
+        since_version: typing.Optional[int] = None,
+    ) -> typing.Dict[str, typing.Any]:
+
+        result = {}
+        for name, item in items.items():
+            if since_version is not None and item.version <= since_version:
+                continue
+            schema = schemas[name]
+            value = self._serialize_value(item.value, schema["type"])
+            if exclude_none:
+                schema = {k: v for k, v in schema.items() if v is not None}
+                if value is None:
+                    result[name] = {"schema": schema}
+                    continue
+            else:
+                schema = dict(schema)
+            result[name] = {"schema": schema, "value": value}
+        return result
+
+    def module_to_dict(
+        self,
+        module: "WorkflowModule",
+        include_structure: bool = True,
+        exclude_none: bool = False,
+    ) -> typing.Dict[str, typing.Any]:
+        """Serialize a single module (and, if it is a pipeline, optionally its structure) into a dict."""
+
+        static = self._get_static_details(module)
+
+        result: typing.Dict[str, typing.Any] = {
+            "alias": static["alias"],
+            "address": static["address"],
+            "type": static["type"],
+            "is_pipeline": static["is_pipeline"],
+            "state": module.state.value,
+            "inputs": self._serialize_items(
+                module.inputs, static["inputs"], exclude_none=exclude_none
+            ),
+            "outputs": self._serialize_items(
+                module.outputs, static["outputs"], exclude_none=exclude_none
+            ),
+            "execution_stage": module.execution_stage,
+            "doc": static["doc"],
+            "error": module.error,
+            "pipeline_structure": None,
+        }
+
+        if module.is_pipeline and include_structure:
+            result["pipeline_structure"] = self.structure_to_dict(
+                module.structure, exclude_none=exclude_none  # type: ignore
+            )
+
+        if exclude_none:
+            result = {k: v for k, v in result.items() if v is not None}
+
+        return result
+
+    def structure_to_dict(
+        self, structure: "WorkflowStructure", exclude_none: bool = False
+    ) -> typing.Dict[str, typing.Any]:
+        """Serialize a workflow structure into a dict, re-using its cached connection details."""
+
+        connections = structure.connections
+
+        modules = []
+        for m_id, module_connections in connections["modules"].items():
+            module = structure.get_module(m_id)
+            modules.append(
+                {
+                    "module": self.module_to_dict(
+                        module, include_structure=True, exclude_none=exclude_none
+                    ),
+                    "input_connections": dict(module_connections["input_connections"]),
+                    "output_connections": {
+                        k: list(v)
+                        for k, v in module_connections["output_connections"].items()
+                    },
+                }
+            )
+
+        return {
+            "workflow_id": connections["workflow_id"],
+            "modules": modules,
+            "workflow_input_connections": {
+                k: list(v)
+                for k, v in connections["workflow_input_connections"].items()
+            },
+            "workflow_output_connections": dict(
+                connections["workflow_output_connections"]
+            ),
+        }
+
+    def changes_to_dict(
+        self,
+        module: "WorkflowModule",
+        since_version: int = 0,
+        exclude_none: bool = False,
+    ) -> typing.Dict[str, typing.Any]:
+        """Serialize everything that changed in a module (and its children) after the provided version.
+
+        Modules are keyed by the path of aliases from the provided module down. For every changed module, only
+        the inputs/outputs that changed are included. The returned 'version' can be used as 'since_version' for
+        the next call.
+        """
+
+        # nested structures are created, and states updated lazily, which hands out new versions, so that has to
+        # happen before the current version is taken (otherwise those modules would be reported as changed again)
+        self._update_states(module)
+        version = get_current_version()
+        modules: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        self._collect_changes(
+            module,
+            path=module.alias,
+            since_version=since_version,
+            exclude_none=exclude_none,
+            result=modules,
+        )
+        return {"version": version, "modules": modules}
+
+    def _update_states(self, module: "WorkflowModule") -> None:
+
+        module._refresh_state()
+        if module.is_pipeline:
+            for child in module.structure.modules:  # type: ignore
+                self._update_states(child)
+
+    def _collect_changes(
+        self,
+        module: "WorkflowModule",
+        path: str,
+        since_version: int,
+        exclude_none: bool,
+        result: typing.Dict[str, typing.Dict[str, typing.Any]],
+    ) -> None:
+
+        state = module.state
+        if module.version > since_version:
+            static = self._get_static_details(module)
+            result[path] = {
+                "alias": static["alias"],
+                "address": static["address"],
+                "state": state.value,
+                "execution_stage": module.execution_stage,
+                "error": module.error,
+                "inputs": self._serialize_items(
+                    module.inputs,
+                    static["inputs"],
+                    exclude_none=exclude_none,
+                    since_version=since_version,
+                ),
+                "outputs": self._serialize_items(
+                    module.outputs,
+                    static["outputs"],
+                    exclude_none=exclude_none,
+                    since_version=since_version,
+                ),
+            }
+
+        if module.is_pipeline:
+            for child in module.structure.modules:  # type: ignore
+                self._collect_changes(
+                    child,
+                    path=f"{path}.{child.alias}",
+                    since_version=since_version,
+                    exclude_none=exclude_none,
+                    result=result,
+                )
+
+    def module_to_json(
+        self,
+        module: "WorkflowModule",
+        include_structure: bool = True,
+        exclude_none: bool = False,
+        **dump_kwargs: typing.Any,
+    ) -> str:
+
+        data = self.module_to_dict(
+            module, include_structure=include_structure, exclude_none=exclude_none
+        )
+        return json.dumps(data, default=pydantic_encoder, **dump_kwargs)
+
+
+_SERIALIZERS: typing.Dict[typing.Tuple[typing.Optional[int], bool], WorkflowSerializer] = {}
+
+
+def get_serializer(
+    max_table_rows: typing.Optional[int] = None, table_reference: bool = False
+) -> WorkflowSerializer:
+    """Return a serializer for the provided options, serializers are shared per options so their caches can be re-used."""
+
+    key = (max_table_rows, table_reference)
+    serializer = _SERIALIZERS.get(key, None)
+    if serializer is None:
+        serializer = _SERIALIZERS.setdefault(
+            key,
+            WorkflowSerializer(
+                max_table_rows=max_table_rows, table_reference=table_reference
+            ),
+        )
+    return serializer
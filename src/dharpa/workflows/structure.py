@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
+import json
 import networkx as nx
 import typing
-from functools import lru_cache
 
 from dharpa.data.core import DataSchema
 from dharpa.models import ChildModuleDetails, WorkflowStructureDetails
@@ -164,6 +164,9 @@ class WorkflowStructure(object):
     ):
 
         self._workflow_id: str = workflow_id
+        self._module_configs: typing.Tuple[
+            typing.Union[typing.Mapping, WorkflowModule], ...
+        ] = modules
         self._workflow_modules: typing.List[WorkflowModule] = create_workflow_modules(
             *modules, workflow_id=workflow_id, force_mappings=True
         )
@@ -185,6 +188,14 @@ class WorkflowStructure(object):
         self._module_details: typing.Dict[str, typing.Any] = None  # type: ignore
         """Holds details about the (current) processing contained in this workflow."""
 
+        self._connections: typing.Optional[typing.Dict[str, typing.Any]] = None
+        self._duplicate_modules: typing.Optional[typing.Dict[str, str]] = None
+
+        self._nodes_of_type: typing.Dict[str, typing.List[typing.Any]] = {}
+
+        self._template: typing.Optional[WorkflowStructure] = None
+        """The structure this one was created from (for a single run), its data flow graph is re-used."""
+
     @property
     def modules(self) -> typing.Iterable[WorkflowModule]:
         return self._workflow_modules
@@ -237,7 +248,19 @@ class WorkflowStructure(object):
     @property
     def data_flow_graph(self) -> nx.DiGraph:
         if self._data_flow_graph is None:
-            self._process_modules()
+            if self._template is not None:
+                # same graph, but with the module objects of this structure
+                mapping = {
+                    self._template.get_module(m_id): details["workflow_module"]
+                    for m_id, details in self.module_details.items()
+                }
+                self._data_flow_graph = nx.relabel_nodes(
+                    self._template.data_flow_graph, mapping, copy=True
+                )
+                # not needed anymore, a run structure must not keep the one it was created from alive
+                self._template = None
+            else:
+                self._process_modules()
         return self._data_flow_graph
 
     @property
@@ -246,16 +269,21 @@ class WorkflowStructure(object):
             self._process_modules()
         return self._execution_stages
 
-    @lru_cache()
     def _get_node_of_type(self, node_type: str):
-        if self._execution_stages is None:
-            self._process_modules()
 
-        return [
-            node
-            for node, attr in self._data_flow_graph.nodes(data=True)
-            if attr["type"] == node_type
-        ]
+        # cached per instance: a cache on the method would keep every structure (and its values) alive
+        nodes = self._nodes_of_type.get(node_type, None)
+        if nodes is None:
+            if self._execution_stages is None:
+                self._process_modules()
+
+            nodes = [
+                node
+                for node, attr in self.data_flow_graph.nodes(data=True)
+                if attr["type"] == node_type
+            ]
+            self._nodes_of_type[node_type] = nodes
+        return nodes
 
     @property
     def workflow_inputs(self) -> typing.Dict[str, WorkflowInputLink]:
@@ -443,17 +471,248 @@ class WorkflowStructure(object):
         self._execution_graph = execution_graph
         self._data_flow_graph = data_flow_graph
         self._execution_stages = execution_stages
+        self._connections = None
+        self._duplicate_modules = None
 
-        self._get_node_of_type.cache_clear()
+        self._nodes_of_type = {}
 
-    def to_details(self) -> WorkflowStructureDetails:
+    def create_run_structure(self) -> "WorkflowStructure":
+        """Create a structure with new module objects, to hold the values of a single run of this workflow.
 
-        modules = []
+        Connections, graphs and execution stages don't depend on any values, so they are shared with this structure
+        instead of being computed again. The same goes for the structures of nested workflows.
+        """
+
+        if any(isinstance(m, WorkflowModule) for m in self._module_configs):
+            raise Exception(
+                f"Can't create run structure for workflow '{self._workflow_id}': created from module objects, not configurations."
+            )
+
+        run_structure = WorkflowStructure(
+            *self._module_configs,
+            workflow_id=self._workflow_id,
+            input_aliases=self._input_aliases,
+            output_aliases=self._output_aliases,
+            add_all_workflow_outputs=self._add_all_workflow_outputs,
+        )
+
+        module_details: typing.Dict[str, typing.Any] = {}
+        for module in run_structure.modules:
+            details = self.get_module_details(module.alias)
+            template_module: WorkflowModule = details["workflow_module"]
+            module.execution_stage = details["processing_stage"]
+            if module.is_pipeline:
+                module._processing_obj._template_structure = template_module._processing_obj.template_structure  # type: ignore
+            module_details[module.alias] = dict(details, workflow_module=module)
+
+        run_structure._module_details = module_details
+        run_structure._execution_graph = self._execution_graph
+        run_structure._execution_stages = self._execution_stages
+        run_structure._connections = self.connections  # type: ignore
+        run_structure._duplicate_modules = self._duplicate_modules
+        run_structure._template = self
+        return run_structure
+
+    def get_required_modules(
+        self, outputs: typing.Optional[typing.Iterable[str]] = None
+    ) -> typing.Set[str]:
+        """Return the aliases of all modules that are needed to compute the provided workflow outputs.
+
+        Args:
+            outputs: the names of the workflow outputs (all workflow outputs, if not provided)
+        """
+
+        workflow_outputs = self.workflow_outputs
+        if outputs is None:
+            outputs = workflow_outputs.keys()
+
+        invalid = [o for o in outputs if o not in workflow_outputs.keys()]
+        if invalid:
+            raise ValueError(
+                f"No workflow output(s) with name(s) {', '.join(invalid)} available, valid names: {', '.join(workflow_outputs.keys())}"
+            )
+
+        required: typing.Set[str] = set()
+        for output_name in outputs:
+            for node in nx.ancestors(
+                self.data_flow_graph, workflow_outputs[output_name]
+            ):
+                if isinstance(node, WorkflowModule):
+                    required.add(node.alias)
+
+        return required
+
+    @property
+    def duplicate_modules(self) -> typing.Mapping[str, str]:
+        """Modules that compute the same thing as another module of this workflow.
+
+        Two modules are duplicates if they have the same type, the same configuration, and all of their inputs are
+        connected to the same sources (after resolving upstream duplicates). The result maps the alias of every
+        duplicate module to the alias of the module that is processed in its place.
+        """
+
+        if self._duplicate_modules is None:
+            self._duplicate_modules = self._calculate_duplicate_modules()
+        return self._duplicate_modules
+
+    def _calculate_duplicate_modules(self) -> typing.Dict[str, str]:
+
+        duplicates: typing.Dict[str, str] = {}
+        signatures: typing.Dict[typing.Tuple, str] = {}
+
+        for stage in self.execution_stages:
+            for m_id in stage:
+                module = self.get_module(m_id)
+
+                sources = []
+                for input_name, link in self.get_module_inputs(m_id).items():  # type: ignore
+                    connected_item = link.connected_item
+                    if connected_item.link_type == WorkflowInputLink.link_type:
+                        source = ("__parent__", connected_item.value_name)
+                    else:
+                        source_id = duplicates.get(
+                            connected_item.module_id, connected_item.module_id
+                        )
+                        source = (source_id, connected_item.value_name)
+                    sources.append((input_name, source))
+
+                signature = (
+                    module.module_type,
+                    json.dumps(
+                        module._processing_config.module_config,
+                        sort_keys=True,
+                        default=str,
+                    ),
+                    tuple(sorted(sources)),
+                )
+                if signature in signatures.keys():
+                    duplicates[m_id] = signatures[signature]
+                else:
+                    signatures[signature] = m_id
+
+        return duplicates
+
+    def flatten(self) -> typing.Dict[str, typing.Any]:
+        """Create the configuration for a workflow that has all nested workflows of this one inlined.
+
+        Child modules of nested workflows get aliases that are prefixed with the alias of the workflow they are
+        contained in (e.g. 'nand.and'). The resulting workflow has the same inputs and outputs as this one.
+
+        Returns:
+            dict: a dictionary with the keys 'modules', 'input_aliases' and 'output_aliases'
+        """
+
+        modules, workflow_inputs, workflow_outputs = self._flatten(prefix="")
+
+        input_aliases = {}
+        for input_name, consumers in workflow_inputs.items():
+            for module_alias, value_name in consumers:
+                input_aliases[f"{module_alias}__{value_name}"] = input_name
+
+        output_aliases = {}
+        for output_name, (module_alias, value_name) in workflow_outputs.items():
+            output_aliases[f"{module_alias}__{value_name}"] = output_name
+
+        return {
+            "modules": modules,
+            "input_aliases": input_aliases,
+            "output_aliases": output_aliases,
+        }
+
+    def _flatten(
+        self, prefix: str
+    ) -> typing.Tuple[
+        typing.List[typing.Dict[str, typing.Any]],
+        typing.Dict[str, typing.List[typing.Tuple[str, str]]],
+        typing.Dict[str, typing.Tuple[str, str]],
+    ]:
+
+        modules: typing.List[typing.Dict[str, typing.Any]] = []
+        # maps the outputs of the modules in this workflow to the (inlined) module outputs they come from
+        resolved_outputs: typing.Dict[typing.Tuple[str, str], typing.Tuple[str, str]] = {}
+        # maps the inputs of nested workflows to the (inlined) module inputs they are connected to
+        nested_inputs: typing.Dict[
+            str, typing.Dict[str, typing.List[typing.Tuple[str, str]]]
+        ] = {}
+
+        for module in self.modules:
+            flat_alias = f"{prefix}{module.alias}"
+            if module.is_pipeline:
+                sub_modules, sub_inputs, sub_outputs = module.structure._flatten(  # type: ignore
+                    prefix=f"{flat_alias}."
+                )
+                modules.extend(sub_modules)
+                nested_inputs[module.alias] = sub_inputs
+                for output_name, source in sub_outputs.items():
+                    resolved_outputs[(module.alias, output_name)] = source
+            else:
+                modules.append(
+                    {
+                        "module_alias": flat_alias,
+                        "module_type": module.module_type,
+                        "module_config": module._processing_config.module_config,
+                        "input_links": {},
+                        "timeout": module.timeout,
+                        "retry": module.retry.dict(),
+                    }
+                )
+                for output_name in module.output_schema.keys():
+                    resolved_outputs[(module.alias, output_name)] = (
+                        flat_alias,
+                        output_name,
+                    )
+
+        modules_by_alias = {m["module_alias"]: m for m in modules}
+        workflow_inputs: typing.Dict[str, typing.List[typing.Tuple[str, str]]] = {}
+
+        for module in self.modules:
+            for input_name, link in self.get_module_inputs(module.alias).items():  # type: ignore
+                if module.is_pipeline:
+                    consumers = nested_inputs[module.alias].get(input_name, [])
+                else:
+                    consumers = [(f"{prefix}{module.alias}", input_name)]
+
+                connected_item = link.connected_item
+                if connected_item.link_type == WorkflowInputLink.link_type:
+                    workflow_inputs.setdefault(connected_item.value_name, []).extend(
+                        consumers
+                    )
+                else:
+                    source_alias, source_name = resolved_outputs[
+                        (connected_item.module_id, connected_item.value_name)
+                    ]
+                    for module_alias, value_name in consumers:
+                        modules_by_alias[module_alias]["input_links"][
+                            value_name
+                        ] = f"{source_alias}.{source_name}"
+
+        workflow_outputs: typing.Dict[str, typing.Tuple[str, str]] = {}
+        for output_name, output_link in self.workflow_outputs.items():
+            connected_output = output_link.connected_output
+            workflow_outputs[output_name] = resolved_outputs[
+                (connected_output.module_id, connected_output.value_name)
+            ]
+
+        return modules, workflow_inputs, workflow_outputs
+
+    @property
+    def connections(self) -> typing.Mapping[str, typing.Any]:
+        """Connection details for all modules of this workflow.
+
+        Those only depend on the structure, so they are computed once and re-used until the structure changes.
+        """
+
+        if self._connections is None:
+            self._connections = self._calculate_connections()
+        return self._connections
+
+    def _calculate_connections(self) -> typing.Dict[str, typing.Any]:
+
+        modules: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
         workflow_inputs: typing.Dict[str, typing.List[str]] = {}
         workflow_outputs: typing.Dict[str, str] = {}
 
         for m_id, details in self.module_details.items():
-            m_det = details["workflow_module"].to_details()
 
             input_connections = {}
             for k, v in details["inputs"].items():
@@ -477,19 +736,38 @@ class WorkflowStructure(object):
                     )
                     workflow_outputs[v.workflow_output.name] = v.name
 
+            modules[m_id] = {
+                "input_connections": input_connections,
+                "output_connections": output_connections,
+            }
+
+        return {
+            "workflow_id": self._workflow_id,
+            "modules": modules,
+            "workflow_input_connections": workflow_inputs,
+            "workflow_output_connections": workflow_outputs,
+        }
+
+    def to_details(self) -> WorkflowStructureDetails:
+
+        connections = self.connections
+
+        modules = []
+        for m_id, module_connections in connections["modules"].items():
+            m_det = self.get_module(m_id).to_details()
             modules.append(
                 ChildModuleDetails(
                     module=m_det,
-                    input_connections=input_connections,
-                    output_connections=output_connections,
+                    input_connections=module_connections["input_connections"],
+                    output_connections=module_connections["output_connections"],
                 )
             )
 
         return WorkflowStructureDetails(
-            workflow_id=self._workflow_id,
+            workflow_id=connections["workflow_id"],
             modules=modules,
-            workflow_input_connections=workflow_inputs,
-            workflow_output_connections=workflow_outputs,
+            workflow_input_connections=connections["workflow_input_connections"],
+            workflow_output_connections=connections["workflow_output_connections"],
         )
 
     def to_dict(self) -> typing.Dict[str, typing.Any]:
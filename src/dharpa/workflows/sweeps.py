@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""Parameter sweeps: processing a workflow for every combination of a set of input values.
+
+Instead of processing the workflow once per combination, a single (bigger) workflow is assembled, that contains one
+instance of every module per distinct combination of the swept inputs it depends on. Modules upstream of all swept
+inputs (e.g. loading a corpus) are only processed once, and the execution tree only fans out where the swept values
+diverge.
+"""
+import itertools
+import typing
+
+from dharpa.defaults import MODULE_TYPE_KEY
+from dharpa.models import WorkflowRunStats
+from dharpa.processing.executors import Processor
+from dharpa.workflows.runs import WorkflowRun, get_run_error
+from dharpa.workflows.structure import WorkflowInputLink
+from dharpa.workflows.workflow import AssembledWorkflowBatch, DharpaWorkflow
+
+
+def _get_variant_name(name: str, index: int) -> str:
+    return f"{name}[{index}]"
+
+
+def _get_module_alias(config: typing.Mapping[str, typing.Any]) -> str:
+
+    # modules without alias are named after their type (see 'create_workflow_modules')
+    alias = config.get("module_alias", None)
+    if alias is None:
+        alias = config[MODULE_TYPE_KEY]
+    return alias
+
+
+class ParameterSweep(object):
+    """A sweep over the values of one or several inputs of a workflow.
+
+    Args:
+        workflow: the workflow to process
+        parameters: the values to use, for every swept workflow input
+        inputs: the values of all other inputs (the current inputs of the workflow, if not provided)
+    """
+
+    def __init__(
+        self,
+        workflow: DharpaWorkflow,
+        parameters: typing.Mapping[str, typing.Iterable[typing.Any]],
+        inputs: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+    ):
+
+        self._workflow: DharpaWorkflow = workflow
+
+        workflow_inputs = workflow.structure.workflow_inputs
+        invalid = [p for p in parameters.keys() if p not in workflow_inputs.keys()]
+        if invalid:
+            raise ValueError(
+                f"Can't sweep input(s) {', '.join(invalid)}: not an input of workflow '{workflow.alias}', valid names: {', '.join(workflow_inputs.keys())}"
+            )
+
+        self._parameters: typing.Dict[str, typing.List[typing.Any]] = {}
+        for name, values in parameters.items():
+            values = list(values)
+            if not values:
+                raise ValueError(f"No values provided for swept input '{name}'.")
+            self._parameters[name] = values
+
+        if inputs is None:
+            inputs = {k: v._value for k, v in workflow.inputs.items()}
+        self._inputs: typing.Dict[str, typing.Any] = {
+            k: v for k, v in inputs.items() if k not in self._parameters.keys()
+        }
+
+        self._config: typing.Optional[typing.Dict[str, typing.Any]] = None
+        self._output_names: typing.List[typing.Dict[str, str]] = []
+        self._module_variants: typing.Dict[str, int] = {}
+
+    @property
+    def parameters(self) -> typing.Mapping[str, typing.List[typing.Any]]:
+        return self._parameters
+
+    @property
+    def combinations(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        """All combinations of swept values, in the order results are returned."""
+
+        return [
+            {name: self._parameters[name][i] for name, i in indexes.items()}
+            for indexes in self._get_index_combinations()
+        ]
+
+    @property
+    def module_variants(self) -> typing.Mapping[str, int]:
+        """The number of times every module is processed in this sweep."""
+
+        if self._config is None:
+            self._assemble()
+        return self._module_variants
+
+    @property
+    def workflow_config(self) -> typing.Mapping[str, typing.Any]:
+        """The configuration of the assembled workflow ('modules', 'input_aliases' and 'output_aliases')."""
+
+        if self._config is None:
+            self._assemble()
+        return self._config  # type: ignore
+
+    def _get_index_combinations(self) -> typing.List[typing.Dict[str, int]]:
+
+        names = sorted(self._parameters.keys())
+        return [
+            dict(zip(names, indexes))
+            for indexes in itertools.product(
+                *(range(len(self._parameters[n])) for n in names)
+            )
+        ]
+
+    def _assemble(self) -> None:
+
+        structure = self._workflow.structure
+        module_configs = self._workflow._processing_obj.config.modules
+
+        configs_by_alias: typing.Dict[str, typing.Mapping[str, typing.Any]] = {
+            _get_module_alias(config): config for config in module_configs
+        }
+
+        # the swept inputs every module depends on, directly or through upstream modules
+        dependencies: typing.Dict[str, typing.Set[str]] = {}
+        for stage in structure.execution_stages:
+            for m_id in stage:
+                deps: typing.Set[str] = set()
+                for link in structure.get_module_inputs(m_id).values():  # type: ignore
+                    connected_item = link.connected_item
+                    if connected_item.link_type == WorkflowInputLink.link_type:
+                        if connected_item.value_name in self._parameters.keys():
+                            deps.add(connected_item.value_name)
+                    else:
+                        deps.update(dependencies[connected_item.module_id])
+                dependencies[m_id] = deps
+
+        modules: typing.List[typing.Dict[str, typing.Any]] = []
+        input_aliases: typing.Dict[str, str] = {}
+        output_aliases: typing.Dict[str, str] = {}
+
+        # for every module, the alias of its instance for every combination of the swept inputs it depends on
+        variants: typing.Dict[str, typing.Dict[typing.Tuple, str]] = {}
+        combinations = self._get_index_combinations()
+        for stage in structure.execution_stages:
+            for m_id in stage:
+                variants[m_id] = {}
+                for combination in combinations:
+                    key = tuple(
+                        (p, combination[p]) for p in sorted(dependencies[m_id])
+                    )
+                    if key in variants[m_id].keys():
+                        continue
+                    if key:
+                        alias = _get_variant_name(m_id, len(variants[m_id]))
+                    else:
+                        alias = m_id
+                    variants[m_id][key] = alias
+
+                    input_links = {}
+                    for input_name, link in structure.get_module_inputs(m_id).items():  # type: ignore
+                        connected_item = link.connected_item
+                        if connected_item.link_type == WorkflowInputLink.link_type:
+                            workflow_input = connected_item.value_name
+                            if workflow_input in self._parameters.keys():
+                                workflow_input = _get_variant_name(
+                                    workflow_input, dict(key)[workflow_input]
+                                )
+                            input_aliases[f"{alias}__{input_name}"] = workflow_input
+                        else:
+                            upstream = connected_item.module_id
+                            upstream_key = tuple(
+                                (p, i) for p, i in key if p in dependencies[upstream]
+                            )
+                            upstream_alias = variants[upstream][upstream_key]
+                            input_links[
+                                input_name
+                            ] = f"{upstream_alias}.{connected_item.value_name}"
+
+                    config = dict(configs_by_alias[m_id])
+                    config["module_alias"] = alias
+                    config["input_links"] = input_links
+                    modules.append(config)
+
+        # results are shared between all combinations that only differ in swept inputs the output doesn't depend on
+        self._output_names = []
+        for combination in combinations:
+            names = {}
+            for output_name, link in structure.workflow_outputs.items():
+                output = link.connected_output
+                key = tuple(
+                    (p, combination[p]) for p in sorted(dependencies[output.module_id])
+                )
+                alias = variants[output.module_id][key]
+                if alias == output.module_id:
+                    name = output_name
+                else:
+                    name = f"{alias}.{output_name}"
+                output_aliases[f"{alias}__{output.value_name}"] = name
+                names[output_name] = name
+            self._output_names.append(names)
+
+        self._module_variants = {m_id: len(v) for m_id, v in variants.items()}
+        self._config = {
+            "modules": modules,
+            "input_aliases": input_aliases,
+            "output_aliases": output_aliases,
+        }
+
+    async def process(self, executor: Processor = None) -> typing.List[WorkflowRun]:
+        """Process all combinations, and return one (processed) run of the workflow per combination.
+
+        All runs share the statistics of the sweep as a whole.
+
+        Args:
+            executor: the executor to use
+        """
+
+        config = self.workflow_config
+        workflow = AssembledWorkflowBatch(
+            *config["modules"],
+            workflow_id=self._workflow.alias,
+            input_aliases=config["input_aliases"],
+            output_aliases=config["output_aliases"],
+            options=self._workflow._get_run_options(),
+        )
+
+        values = dict(self._inputs)
+        for name, swept_values in self._parameters.items():
+            for i, value in enumerate(swept_values):
+                values[_get_variant_name(name, i)] = value
+        workflow.inputs.set_values(**values)
+
+        await workflow.process_workflow(executor=executor)
+        run_stats: WorkflowRunStats = workflow.run_stats
+
+        result = []
+        for combination, names in zip(self.combinations, self._output_names):
+            workflow_run = WorkflowRun(
+                self._workflow, inputs=dict(self._inputs, **combination)
+            )
+            workflow_run._outputs.set_values(
+                **{k: workflow.outputs[name]._value for k, name in names.items()}
+            )
+            workflow_run._run_stats = run_stats
+            workflow_run._error = get_run_error(run_stats, workflow_run.outputs)
+            result.append(workflow_run)
+        return result
@@ -150,6 +150,8 @@ def create_workflow_modules(
             _c = dict(c)
             m_id = _c.pop("module_alias", None)
             input_links = _c.pop("input_links", None)
+            timeout = _c.pop("timeout", None)
+            retry = _c.pop("retry", None)
             processing_config = ProcessingConfig.from_dict(**_c)
 
             if m_id is None:
@@ -164,6 +166,8 @@ def create_workflow_modules(
                     workflow_id=workflow_id,
                     processing_config=processing_config,
                     input_links=input_links,
+                    timeout=timeout,
+                    retry=retry,
                 )
             else:
                 m = WorkflowModule(
@@ -171,6 +175,8 @@ def create_workflow_modules(
                     workflow_id=workflow_id,
                     processing_config=processing_config,
                     input_links=input_links,
+                    timeout=timeout,
+                    retry=retry,
                 )
             # m = WorkflowModule.from_dict(**c)
         else:
@@ -1,29 +1,50 @@
 # -*- coding: utf-8 -*-
+import anyio
 import json
 import networkx as nx
 import os
+import sys
+import threading
+import time
 import typing
 import yaml
+from anyio import create_blocking_portal, create_task_group
+from anyio.abc import Event
 from pathlib import Path
 
 from dharpa.data.core import DataItem, DataSchema
+from dharpa.data.memory import MemoryBudget
 from dharpa.defaults import MODULE_TYPE_KEY
 from dharpa.models import (
     ModuleDetails,
     ModuleState,
     ProcessingConfig,
     ProcessingModuleConfig,
-    ValueItem,
+    ResourceHints,
+    RetryPolicy,
+    RunOptions,
     ValueNode,
-    ValueSchema,
     WorkflowModuleModel,
     WorkflowProcessingModuleConfig,
+    WorkflowRunStats,
     WorkflowStructureDetails,
+    WorkloadType,
 )
 from dharpa.processing.executors import Processor
 from dharpa.processing.processing_module import ProcessingModule
+from dharpa.utils import set_event_nowait, set_event_threadsafe
+from dharpa.workflows.checkpoints import CheckpointStore
 from dharpa.workflows.modules import InputItems, OutputItems, WorkflowModule
-from dharpa.workflows.structure import WorkflowStructure
+from dharpa.workflows.runs import WorkflowRun, get_run_error
+from dharpa.workflows.scheduling import RuntimeStatsStore, get_critical_path_priorities
+from dharpa.workflows.structure import ModuleOutputLink, WorkflowStructure
+
+DEFAULT_DEBOUNCE_WINDOW = 0.2
+"""The default time (in seconds) inputs have to stay unchanged before a workflow is processed automatically."""
+
+MIN_AUTO_PROCESS_INTERVAL = 0.01
+"""The minimum time (in seconds) between an input change and automatic processing, regardless of the debounce window."""
+
 
 # class AssembledWorkflowInteractive(object):
 #     def __init__(
@@ -161,13 +182,28 @@ class AssembledWorkflowBatch(object):
         init_inputs: typing.Optional[InputItems] = None,
         input_aliases: typing.Mapping[str, str] = None,
         output_aliases: typing.Mapping[str, str] = None,
+        options: typing.Optional[RunOptions] = None,
     ):
 
+        if options is None:
+            options = RunOptions()
+
         self._module_configs: typing.Iterable[typing.Mapping] = module_configs
         self._workflow_id: str = workflow_id
         self._input_aliases: typing.Optional[typing.Mapping[str, str]] = input_aliases
         self._output_aliases: typing.Optional[typing.Mapping[str, str]] = output_aliases
-
+        self._options: RunOptions = options
+        self._checkpoint_store: typing.Optional[CheckpointStore] = options.checkpoint_store
+        self._memory_budget: typing.Optional[MemoryBudget] = None
+        if options.memory_budget is not None:
+            self._memory_budget = MemoryBudget(max_bytes=options.memory_budget)
+        self._required_modules: typing.Optional[typing.Set[str]] = None
+        self._runtime_stats: typing.Optional[RuntimeStatsStore] = options.runtime_stats
+        self._run_stats: WorkflowRunStats = WorkflowRunStats(workflow_id=workflow_id)
+        self._computing: typing.Dict[str, Event] = {}
+        """Modules that are processed for an on-demand computation of outputs at the moment, with an event that is set once they are done."""
+
+        self._template_structure: typing.Optional[WorkflowStructure] = options.structure
         self._structure: WorkflowStructure = None  # type: ignore
         self._inputs: InputItems = None  # type: ignore
         self._outputs: OutputItems = None  # type: ignore
@@ -180,12 +216,16 @@ class AssembledWorkflowBatch(object):
 
     def _init_obj(self, init_inputs: typing.Optional[InputItems] = None):
 
-        self._structure = WorkflowStructure(
-            *self._module_configs,
-            input_aliases=self._input_aliases,
-            output_aliases=self._output_aliases,
-            workflow_id=self._workflow_id,
-        )
+        if self._template_structure is not None:
+            # the structure was analyzed already, this run only needs its own module objects
+            self._structure = self._template_structure.create_run_structure()
+        else:
+            self._structure = WorkflowStructure(
+                *self._module_configs,
+                input_aliases=self._input_aliases,
+                output_aliases=self._output_aliases,
+                workflow_id=self._workflow_id,
+            )
 
         structure_inputs: InputItems = InputItems(
             **self._structure.workflow_input_schema
@@ -194,10 +234,18 @@ class AssembledWorkflowBatch(object):
             **self._structure.workflow_output_schema
         )
 
+        # nested workflows have their own structure
+        nested_options = self._options.copy(update={"structure": None})
         for module_id, module_details in self._structure.module_details.items():
 
             module_inputs = module_details["inputs"]
             module_obj: WorkflowModule = module_details["workflow_module"]
+            module_obj.publish_outputs_early = self._options.publish_outputs_early
+
+            if module_obj.is_pipeline:
+                # nested workflows are processed with the same options (e.g. checkpoint store, memory budget)
+                module_obj.run_options = nested_options  # type: ignore
+                module_obj._is_nested = True  # type: ignore
 
             for input_name, link in module_inputs.items():
                 connected_item = link.connected_item
@@ -208,18 +256,17 @@ class AssembledWorkflowBatch(object):
                     workflow_input: DataItem = structure_inputs[
                         connected_item.value_name
                     ]
-                    workflow_input.add_callback(input_item.set_value)
-                    if init_inputs:
-                        outer_workflow_input: DataItem = init_inputs[
-                            connected_item.value_name
-                        ]
-                        workflow_input.value = outer_workflow_input.value
+                    workflow_input.add_callback(
+                        input_item.set_value, pass_stored_value=True
+                    )
                 else:
                     module_id = connected_item.module_id
                     value_name = connected_item.value_name
                     other = self._structure.get_module(module_id)
                     output_item = other.outputs[value_name]
-                    output_item.add_callback(input_item.set_value)
+                    output_item.add_callback(
+                        input_item.set_value, pass_stored_value=True
+                    )
 
             module_outputs = module_details["outputs"]
             for output_name, link in module_outputs.items():
@@ -227,7 +274,13 @@ class AssembledWorkflowBatch(object):
 
                 if link.workflow_output:
                     wo_item = structure_outputs[link.workflow_output.value_name]
-                    output_item.add_callback(wo_item.set_value)
+                    output_item.add_callback(wo_item.set_value, pass_stored_value=True)
+
+        if init_inputs:
+            # values are only passed on if they change, so this happens after all modules are connected
+            for name, workflow_input in structure_inputs.items():
+                if name in init_inputs.keys():
+                    workflow_input.value = init_inputs[name].value
 
         self._inputs = structure_inputs
         self._outputs = structure_outputs
@@ -240,21 +293,275 @@ class AssembledWorkflowBatch(object):
     def outputs(self) -> OutputItems:
         return self._outputs
 
-    async def process_workflow(self, executor: Processor = None):
+    @property
+    def run_stats(self) -> WorkflowRunStats:
+        """Statistics about the last run of this workflow."""
+        return self._run_stats
+
+    def _restore_checkpoint(self, module: WorkflowModule) -> bool:
+
+        if self._checkpoint_store is None:
+            return False
+        restored = self._checkpoint_store.restore(module)
+        if restored:
+            self._run_stats.modules_restored += 1
+            duplicates = self._copy_to_duplicates(module)
+            self._track_memory(module)
+            for duplicate in duplicates:
+                self._track_memory(duplicate)
+        return restored
+
+    def _module_processed(self, module: WorkflowModule) -> None:
+
+        if module.state == ModuleState.FAILED:
+            self._run_stats.modules_failed += 1
+            self._run_stats.errors[module.alias] = module.error  # type: ignore
+            return
+
+        self._run_stats.modules_processed += 1
+        if module.state != ModuleState.RESULTS_READY:
+            return
+
+        if (
+            self._runtime_stats is not None
+            and module.last_processing_time is not None
+        ):
+            self._runtime_stats.record(module, module.last_processing_time)
+
+        # duplicates need to get their values before the memory budget can release them
+        duplicates = self._copy_to_duplicates(module)
+        if self._checkpoint_store is not None:
+            self._checkpoint_store.save(module)
+        self._track_memory(module)
+        for duplicate in duplicates:
+            self._track_memory(duplicate)
+
+    def _copy_to_duplicates(self, module: WorkflowModule) -> typing.List[WorkflowModule]:
+        """Set the outputs of a module on all modules that were deduplicated in its favour."""
+
+        if not self._options.deduplicate_modules:
+            return []
+
+        result = []
+        for duplicate_id in self._run_stats.duplicate_groups.get(module.alias, []):
+            duplicate = self._structure.get_module(duplicate_id)
+            for name, item in module.outputs.items():
+                _copy_value(item, duplicate.outputs[name])
+            duplicate._results_version = duplicate.inputs_version
+            duplicate._update_state()
+            self._run_stats.modules_deduplicated += 1
+            result.append(duplicate)
+        return result
+
+    def _track_memory(self, module: WorkflowModule) -> None:
+        """Register the outputs of a processed module with the memory budget, and release inputs that aren't needed anymore."""
+
+        if self._memory_budget is None:
+            return
+
+        module_details = self._structure.get_module_details(module.alias)
+        for output_name, link in module_details["outputs"].items():
+            items = [module.outputs[output_name]]
+            consumers = 0
+            for connected_input in link.connected_inputs:
+                consumer = self._structure.get_module(connected_input.module_id)
+                items.append(consumer.inputs[connected_input.value_name])
+                if (
+                    self._required_modules is None
+                    or consumer.alias in self._required_modules
+                ):
+                    consumers = consumers + 1
+            if link.workflow_output:
+                items.append(self._outputs[link.workflow_output.value_name])
+
+            self._memory_budget.add_value(
+                link.name,
+                items,
+                consumers=consumers,
+                keep=link.workflow_output is not None,
+            )
+
+        for link in module_details["inputs"].values():
+            if link.connected_item.link_type == ModuleOutputLink.link_type:
+                self._memory_budget.consumer_finished(link.connected_item.name)
+
+        self._memory_budget.enforce()
+
+    async def process_workflow(
+        self,
+        executor: Processor = None,
+        outputs: typing.Optional[typing.Iterable[str]] = None,
+    ):
+        """Process all modules of this workflow whose inputs are ready.
+
+        Args:
+            executor: the executor to use (modules are processed one after the other, if not provided)
+            outputs: if provided, only the modules that are needed to compute those workflow outputs are processed
+        """
+
+        if self._options.flatten:
+            await self._process_flattened(executor=executor, outputs=outputs)
+            return
+
+        started = time.perf_counter()
+        self._run_stats = WorkflowRunStats(
+            workflow_id=self._workflow_id, modules_total=len(self._structure.modules)
+        )
+
+        self._required_modules = None
+        if outputs is not None or self._options.prune_unused_modules:
+            self._required_modules = self._structure.get_required_modules(
+                outputs=outputs
+            )
+
+        duplicates: typing.Mapping[str, str] = {}
+        if self._options.deduplicate_modules:
+            duplicates = self._structure.duplicate_modules
+            for duplicate_id, module_id in duplicates.items():
+                if (
+                    self._required_modules is None
+                    or duplicate_id in self._required_modules
+                ):
+                    self._run_stats.duplicate_groups.setdefault(module_id, []).append(
+                        duplicate_id
+                    )
+            if self._required_modules is not None:
+                # a pruned module might have to be processed in place of a required duplicate
+                self._required_modules.update(self._run_stats.duplicate_groups.keys())
+
+        if self._required_modules is not None:
+            self._run_stats.modules_pruned = len(self._structure.modules) - len(
+                self._required_modules
+            )
+
+        if self._options.publish_outputs_early:
+            await self._process_when_ready(executor, skip=duplicates.keys())
+        elif executor is not None and self._runtime_stats is not None:
+            await self._process_prioritized(executor, skip=duplicates.keys())
+        else:
+            await self._process_stages(executor, skip=duplicates.keys())
+
+        self._run_stats.duration = time.perf_counter() - started
+        # nested workflows record into the store of the outermost workflow, which saves it once it's done
+        if self._runtime_stats is not None and self._options.save_runtime_stats:
+            self._runtime_stats.save()
+
+    async def compute_outputs(
+        self, outputs: typing.Iterable[str], executor: Processor = None
+    ) -> None:
+        """Compute the provided workflow outputs on demand, re-using all results that are still current.
+
+        The data flow graph is walked backwards from the requested outputs, so only modules those outputs depend on
+        are considered. Modules whose results were computed from their current inputs (e.g. in an earlier call) are
+        not processed again. Modules that don't depend on each other are processed concurrently.
+
+        Args:
+            outputs: the names of the workflow outputs
+            executor: the executor to use (modules are processed on the event loop, if not provided)
+        """
+
+        started = time.perf_counter()
+        self._run_stats = WorkflowRunStats(
+            workflow_id=self._workflow_id, modules_total=len(self._structure.modules)
+        )
+        self._required_modules = self._structure.get_required_modules(outputs=outputs)
+        self._run_stats.modules_pruned = len(self._structure.modules) - len(
+            self._required_modules
+        )
+
+        pending: typing.Set[str] = set(self._required_modules)
+        running: typing.Set[str] = set()
+        graph = self._structure.execution_graph
+
+        async with create_task_group() as tg:
+
+            async def run(module: WorkflowModule):
+                try:
+                    await self._process_module(module, executor)
+                finally:
+                    running.discard(module.alias)
+                    set_event_nowait(self._computing.pop(module.alias))
+                self._module_processed(module)
+                await launch()
+
+            async def wait_for(module: WorkflowModule):
+                # the module is processed for another request at the moment, its results might be re-used
+                computed = self._computing.get(module.alias, None)
+                if computed is not None:
+                    await computed.wait()
+                await module.wait_until_processed()
+                running.discard(module.alias)
+                pending.add(module.alias)
+                await launch()
+
+            async def launch():
+
+                skipped = True
+                while skipped:
+                    skipped = False
+                    for m_id in list(pending):
+                        if m_id not in pending:
+                            # launched concurrently
+                            continue
+                        if any(
+                            p in pending or p in running
+                            for p in graph.predecessors(m_id)
+                        ):
+                            continue
+                        pending.discard(m_id)
+                        module = self._structure.get_module(m_id)
+
+                        if m_id in self._computing or module.is_processing:
+                            running.add(m_id)
+                            await tg.spawn(wait_for, module)
+                        elif module.results_are_current:
+                            self._run_stats.modules_reused += 1
+                            skipped = True
+                        elif module.state == ModuleState.STALE:
+                            # an input is missing, or an upstream module failed
+                            skipped = True
+                        elif self._restore_checkpoint(module):
+                            skipped = True
+                        else:
+                            running.add(m_id)
+                            self._computing[m_id] = anyio.create_event()
+                            await tg.spawn(run, module)
+
+            await launch()
+
+        self._run_stats.duration = time.perf_counter() - started
+
+    async def _process_stages(
+        self, executor: typing.Optional[Processor], skip: typing.Iterable[str]
+    ):
+        """Process modules stage by stage, every stage has to be finished before the next one is started."""
 
         for stage in self._structure.execution_stages:
 
             staged = []
             for m_id in stage:
+                if (
+                    self._required_modules is not None
+                    and m_id not in self._required_modules
+                ):
+                    continue
+                if m_id in skip:
+                    # gets its outputs from the module it is a duplicate of
+                    continue
                 module = self._structure.get_module(m_id)
 
                 if module.state == ModuleState.RESULTS_READY:
                     continue
-                elif module.state == ModuleState.RESULTS_INCOMING:
-                    raise Exception("Processing currently")
-                elif module.state == ModuleState.INPUTS_READY:
+                elif module.state in (
+                    ModuleState.INPUTS_READY,
+                    ModuleState.RESULTS_INCOMING,
+                ):
+                    # a module that is still processing (in another run) is cancelled and processed again
+                    if self._restore_checkpoint(module):
+                        continue
                     if executor is None:
-                        await module.process()
+                        await self._process_module(module)
+                        self._module_processed(module)
                     else:
                         # pb = ProcessingBundle(processing_module=module._processing_obj, inputs=module.inputs, outputs=module.outputs)
                         staged.append(module)
@@ -264,7 +571,252 @@ class AssembledWorkflowBatch(object):
                     continue
 
             if executor:
-                await executor.process(*staged)
+                if self._options.continue_on_error:
+                    async with create_task_group() as tg:
+                        for module in staged:
+                            await tg.spawn(self._process_module, module, executor)
+                else:
+                    await executor.process(*staged)
+                for module in staged:
+                    self._module_processed(module)
+
+    async def _process_module(
+        self, module: WorkflowModule, executor: typing.Optional[Processor] = None
+    ) -> None:
+        """Process a single module, if errors are isolated, a failed module doesn't abort the whole run."""
+
+        try:
+            if executor is None:
+                await module.process()
+            else:
+                await executor.process(module)
+        except Exception as e:
+            if not self._options.continue_on_error:
+                raise e
+            if module.error is None:
+                # the module failed before it was processed at all (e.g. in the executor)
+                module._error = str(e)
+                module._update_state()
+
+    async def _process_prioritized(self, executor: Processor, skip: typing.Iterable[str]):
+        """Process modules as soon as their inputs are ready, modules on the critical path first.
+
+        Priorities are based on the recorded runtimes of modules. No more modules than the executor can process at
+        the same time are submitted, so a module that becomes ready later can still overtake less important ones.
+        """
+
+        priorities = get_critical_path_priorities(
+            self._structure, self._runtime_stats  # type: ignore
+        )
+        pending: typing.Set[str] = set()
+        for m_id in priorities.keys():
+            if self._required_modules is not None and m_id not in self._required_modules:
+                continue
+            if m_id in skip:
+                continue
+            pending.add(m_id)
+
+        running: typing.Set[str] = set()
+        capacity = executor.max_concurrency
+        graph = self._structure.execution_graph
+
+        async with create_task_group() as tg:
+
+            async def run(module: WorkflowModule):
+                try:
+                    await self._process_module(module, executor)
+                finally:
+                    running.discard(module.alias)
+                self._module_processed(module)
+                await launch()
+
+            async def launch():
+
+                while True:
+                    ready = []
+                    for m_id in list(pending):
+                        if any(p in running for p in graph.predecessors(m_id)):
+                            # upstream modules might still be publishing their outputs
+                            continue
+                        module = self._structure.get_module(m_id)
+                        if module.state == ModuleState.RESULTS_READY:
+                            pending.discard(m_id)
+                        elif module.state in (
+                            ModuleState.INPUTS_READY,
+                            ModuleState.RESULTS_INCOMING,
+                        ):
+                            # modules that are still processing in another run get cancelled and re-processed
+                            ready.append(module)
+
+                    restored = False
+                    for module in sorted(
+                        ready, key=lambda m: priorities[m.alias], reverse=True
+                    ):
+                        if capacity is not None and len(running) >= capacity:
+                            return
+                        pending.discard(module.alias)
+                        if self._restore_checkpoint(module):
+                            restored = True
+                            continue
+                        running.add(module.alias)
+                        await tg.spawn(run, module)
+
+                    if not restored:
+                        # otherwise, modules downstream of restored ones might be ready now
+                        return
+
+            await launch()
+
+    async def _process_when_ready(
+        self, executor: typing.Optional[Processor], skip: typing.Iterable[str]
+    ):
+        """Process every module as soon as its inputs are ready, without waiting for upstream modules to finish.
+
+        Used if outputs are published early: modules are started whenever a module finishes, or publishes one of its
+        outputs. Without executor, modules are processed concurrently on the event loop.
+        """
+
+        pending: typing.Set[str] = set()
+        for module in self._structure.modules:
+            if (
+                self._required_modules is not None
+                and module.alias not in self._required_modules
+            ):
+                continue
+            if module.alias in skip:
+                continue
+            pending.add(module.alias)
+
+        running: typing.Set[str] = set()
+        loop_thread = threading.get_ident()
+
+        async with create_blocking_portal() as portal, create_task_group() as tg:
+
+            # set whenever a module publishes an output, or finishes
+            changed: typing.List[Event] = [anyio.create_event()]
+
+            def output_published(value: typing.Any):
+                set_event_threadsafe(changed[0], portal, loop_thread)
+
+            for module in self._structure.modules:
+                for item in module.outputs.values():
+                    item.add_callback(output_published, pass_stored_value=True)
+
+            async def run(module: WorkflowModule):
+                try:
+                    await self._process_module(module, executor)
+                finally:
+                    running.discard(module.alias)
+                    set_event_nowait(changed[0])
+                if module.state in (ModuleState.RESULTS_READY, ModuleState.FAILED):
+                    self._module_processed(module)
+                else:
+                    # cancelled, because an early output it used was reset
+                    pending.add(module.alias)
+
+            async def launch():
+
+                restored = True
+                while restored:
+                    restored = False
+                    for m_id in list(pending):
+                        if m_id not in pending:
+                            # launched concurrently
+                            continue
+                        module = self._structure.get_module(m_id)
+                        if module.state == ModuleState.RESULTS_READY:
+                            pending.discard(m_id)
+                        elif module.state == ModuleState.INPUTS_READY:
+                            pending.discard(m_id)
+                            if self._restore_checkpoint(module):
+                                # modules downstream of restored ones might be ready now
+                                restored = True
+                                continue
+                            running.add(m_id)
+                            await tg.spawn(run, module)
+
+            try:
+                await launch()
+                while running:
+                    await changed[0].wait()
+                    changed[0] = anyio.create_event()
+                    await launch()
+            finally:
+                for module in self._structure.modules:
+                    for item in module.outputs.values():
+                        item.remove_callback(output_published)
+
+    async def _process_flattened(
+        self,
+        executor: Processor = None,
+        outputs: typing.Optional[typing.Iterable[str]] = None,
+    ):
+        """Process this workflow with all nested workflows inlined, so all modules are scheduled as a whole.
+
+        Afterwards, all values are written back into the (nested) structure of this workflow, so its details look the
+        same as if it was processed without inlining.
+        """
+
+        flattened = self._structure.flatten()
+        flat_batch = AssembledWorkflowBatch(
+            *flattened["modules"],
+            workflow_id=self._workflow_id,
+            init_inputs=self._inputs,
+            input_aliases=flattened["input_aliases"],
+            output_aliases=flattened["output_aliases"],
+            options=self._options.copy(update={"flatten": False, "structure": None}),
+        )
+
+        await flat_batch.process_workflow(executor=executor, outputs=outputs)
+        self._run_stats = flat_batch.run_stats
+
+        self._write_back(self._structure, flat_batch.structure, prefix="")
+
+    def _write_back(
+        self, structure: WorkflowStructure, flat_structure: WorkflowStructure, prefix: str
+    ) -> None:
+
+        for module in structure.modules:
+            path = f"{prefix}{module.alias}"
+            if module.is_pipeline:
+                inner: WorkflowStructure = module.structure  # type: ignore
+                self._write_back(inner, flat_structure, prefix=f"{path}.")
+                for name, input_link in inner.workflow_inputs.items():
+                    connected_input = input_link.connected_input
+                    inner_module = inner.get_module(connected_input.module_id)
+                    _copy_value(
+                        inner_module.inputs[connected_input.value_name],
+                        module.inputs[name],
+                    )
+                for name, output_link in inner.workflow_outputs.items():
+                    connected_output = output_link.connected_output
+                    inner_module = inner.get_module(connected_output.module_id)
+                    _copy_value(
+                        inner_module.outputs[connected_output.value_name],
+                        module.outputs[name],
+                    )
+                if all(m.results_are_current for m in inner.modules):
+                    module._results_version = module.inputs_version
+            else:
+                flat_module = flat_structure.get_module(path)
+                for name, item in flat_module.inputs.items():
+                    _copy_value(item, module.inputs[name])
+                for name, item in flat_module.outputs.items():
+                    _copy_value(item, module.outputs[name])
+                module._error = flat_module.error
+                if flat_module.results_are_current:
+                    module._results_version = module.inputs_version
+
+            module._update_state()
+
+
+def _copy_value(source: DataItem, target: DataItem) -> None:
+
+    if source.is_released:
+        target.release()
+    elif source.valid:
+        # use the stored value directly, so spilled values aren't read back into memory
+        target.set_value(source._value)
 
 
 class WorkflowProcessingModule(ProcessingModule):
@@ -274,6 +826,11 @@ class WorkflowProcessingModule(ProcessingModule):
         ProcessingModuleConfig
     ] = WorkflowProcessingModuleConfig
 
+    # workflows only orchestrate their child modules, which claim their own resources
+    _resource_hints = ResourceHints(cpu_slots=0, workload=WorkloadType.ASYNC)
+    # schemas depend on the structure of a workflow, which also depends on the registered workflows and modules
+    _cache_schemas = False
+
     def __init__(
         self,
         meta: typing.Optional[typing.Mapping[str, typing.Any]] = None,
@@ -285,25 +842,50 @@ class WorkflowProcessingModule(ProcessingModule):
             raise Exception("Workflow id not set")
         self._config: WorkflowProcessingModuleConfig
 
+        self._template_structure: typing.Optional[WorkflowStructure] = None
         self._workflow_structure: typing.Optional[WorkflowStructure] = None
         self._workflow_id: typing.Optional[str] = workflow_id
+        self._last_run_stats: typing.Optional[WorkflowRunStats] = None
+        self._last_batch: typing.Optional[AssembledWorkflowBatch] = None
+        self._run_options: RunOptions = RunOptions()
         super().__init__(meta=meta, **config)
 
     def set_workflow_id(self, workflow_id: str):
+        self._template_structure = None
         self._workflow_structure = None
+        self._last_batch = None
         self._workflow_id = workflow_id
 
     @property
-    def structure(self) -> WorkflowStructure:
-        if self._workflow_structure is None:
+    def run_options(self) -> RunOptions:
+        """The options this workflow is processed with (if it isn't processed with explicit options)."""
+        return self._run_options
+
+    @run_options.setter
+    def run_options(self, run_options: RunOptions):
+        self._run_options = run_options
+
+    @property
+    def template_structure(self) -> WorkflowStructure:
+        """The analysed structure of this workflow, the structures of all runs are created from it."""
+
+        if self._template_structure is None:
             if self._workflow_id is None:
                 raise Exception("Workflow id not set")
-            self._workflow_structure = WorkflowStructure(
+            self._template_structure = WorkflowStructure(
                 *self._config.modules,  # type: ignore
                 input_aliases=self._config.input_aliases,
                 output_aliases=self._config.output_aliases,
                 workflow_id=self._workflow_id,
             )
+        return self._template_structure
+
+    @property
+    def structure(self) -> WorkflowStructure:
+        """The structure of this workflow, with the module objects of the last run (if there was one)."""
+
+        if self._workflow_structure is None:
+            self._workflow_structure = self.template_structure
         return self._workflow_structure
 
     def _create_input_schema(self) -> typing.Mapping[str, DataSchema]:
@@ -312,9 +894,36 @@ class WorkflowProcessingModule(ProcessingModule):
     def _create_output_schema(self) -> typing.Mapping[str, DataSchema]:
         return self.structure.workflow_output_schema
 
-    async def _process(
-        self, inputs: InputItems, outputs: OutputItems, workflow_id: str = None
-    ) -> None:
+    async def _process(self, inputs: InputItems, outputs: OutputItems) -> None:
+
+        await self._run_workflow(inputs, outputs)
+
+    async def _run_workflow(
+        self,
+        inputs: InputItems,
+        outputs: OutputItems,
+        workflow_id: str = None,
+        executor: Processor = None,
+        options: typing.Optional[RunOptions] = None,
+        requested_outputs: typing.Optional[typing.Iterable[str]] = None,
+    ) -> AssembledWorkflowBatch:
+        """Process a single run of this workflow, without changing the state of this object.
+
+        Every run gets its own module objects, the structure of this workflow is shared between all of them.
+
+        Args:
+            inputs: the input values of the run
+            outputs: the items to set the output values of the run on
+            workflow_id: the id of the workflow (defaults to the one of this object)
+            executor: the executor to use
+            options: the options to process the run with (defaults to the 'run_options' of this object)
+            requested_outputs: if provided, only the modules that are needed to compute those outputs are processed
+        """
+
+        if workflow_id is None:
+            workflow_id = self._workflow_id
+        if options is None:
+            options = self._run_options
 
         workflow = AssembledWorkflowBatch(
             *self._config.modules,
@@ -322,11 +931,22 @@ class WorkflowProcessingModule(ProcessingModule):
             init_inputs=inputs,
             input_aliases=self._config.input_aliases,
             output_aliases=self._config.output_aliases,
+            options=options.copy(update={"structure": self.template_structure}),
+        )
+        if options.publish_outputs_early:
+            # outputs of child modules are passed on as soon as they are available
+            for k, v in workflow.outputs.items():
+                v.add_callback(outputs[k].set_value, pass_stored_value=True)
+
+        await workflow.process_workflow(
+            executor=executor, outputs=requested_outputs
         )
-        await workflow.process_workflow()
 
         for k, v in workflow.outputs.items():
-            outputs[k].value = v.value
+            # use the stored value directly, so spilled values aren't read back into memory
+            outputs[k].value = v._value
+
+        return workflow
 
     async def _process_workflow(
         self,
@@ -334,22 +954,55 @@ class WorkflowProcessingModule(ProcessingModule):
         outputs: OutputItems,
         workflow_id: str = None,
         executor: Processor = None,
+        options: typing.Optional[RunOptions] = None,
+        requested_outputs: typing.Optional[typing.Iterable[str]] = None,
     ) -> None:
 
-        workflow = AssembledWorkflowBatch(
-            *self._config.modules,
-            workflow_id=workflow_id,  # type: ignore
-            init_inputs=inputs,
-            input_aliases=self._config.input_aliases,
-            output_aliases=self._config.output_aliases,
+        workflow = await self._run_workflow(
+            inputs,
+            outputs,
+            workflow_id=workflow_id,
+            executor=executor,
+            options=options,
+            requested_outputs=requested_outputs,
         )
 
-        await workflow.process_workflow(executor=executor)
+        self._workflow_structure = workflow.structure
+        self._last_run_stats = workflow.run_stats
+        self._last_batch = workflow
 
-        for k, v in workflow.outputs.items():
-            outputs[k].value = v.value
+    async def _compute_outputs(
+        self,
+        inputs: InputItems,
+        requested_outputs: typing.Iterable[str],
+        workflow_id: str = None,
+        executor: Processor = None,
+        options: typing.Optional[RunOptions] = None,
+    ) -> OutputItems:
+        """Compute workflow outputs on demand, re-using the results of the last run (or computation) where possible."""
 
-        self._workflow_structure = workflow.structure
+        if workflow_id is None:
+            workflow_id = self._workflow_id
+        if options is None:
+            options = self._run_options
+
+        workflow = self._last_batch
+        if workflow is None:
+            workflow = AssembledWorkflowBatch(
+                *self._config.modules,
+                workflow_id=workflow_id,  # type: ignore
+                input_aliases=self._config.input_aliases,
+                output_aliases=self._config.output_aliases,
+                options=options.copy(update={"structure": self.template_structure}),
+            )
+            self._workflow_structure = workflow.structure
+            self._last_batch = workflow
+
+        # unchanged values are not passed on, so the results of modules that only depend on those stay current
+        workflow.inputs.set_values(**{k: v._value for k, v in inputs.items()})
+        await workflow.compute_outputs(requested_outputs, executor=executor)
+        self._last_run_stats = workflow.run_stats
+        return workflow.outputs
 
     # def _get_doc(self) -> str:
     #
@@ -411,6 +1064,11 @@ class DharpaWorkflow(WorkflowModule):
         input_links: typing.Mapping[str, typing.Any] = None,
         workflow_id: str = None,
         doc: str = None,
+        run_options: typing.Optional[RunOptions] = None,
+        timeout: typing.Optional[float] = None,
+        retry: typing.Union[RetryPolicy, typing.Mapping[str, typing.Any], None] = None,
+        rerun_on_input_change: bool = False,
+        publish_outputs_early: bool = False,
     ):
 
         if workflow_id is None:
@@ -425,6 +1083,11 @@ class DharpaWorkflow(WorkflowModule):
                 raise ValueError(f"Invalid module_name for workflow: {p_type}")
 
         self._workflow_doc: typing.Optional[str] = doc
+        self._requested_outputs: typing.Optional[typing.List[str]] = None
+        # set if this workflow is a child module of another workflow
+        self._is_nested: bool = False
+        # only set while the workflow is processed automatically
+        self._inputs_changed: typing.Optional[anyio.abc.Event] = None
 
         self._processing_obj: WorkflowProcessingModule
         super().__init__(
@@ -432,6 +1095,10 @@ class DharpaWorkflow(WorkflowModule):
             alias=alias,
             input_links=input_links,
             workflow_id=workflow_id,
+            timeout=timeout,
+            retry=retry,
+            rerun_on_input_change=rerun_on_input_change,
+            publish_outputs_early=publish_outputs_early,
         )
 
         self._processing_obj.set_workflow_id(self.alias)
@@ -440,15 +1107,351 @@ class DharpaWorkflow(WorkflowModule):
             raise TypeError(
                 f"Invalid class for processing object in workflow: {self._processing_obj.__class__}"
             )
+        if run_options is not None:
+            self._processing_obj.run_options = run_options
 
-    async def _process_workflow(self, executor: Processor = None):
+    @property
+    def run_options(self) -> RunOptions:
+        """The options this workflow is processed with, the properties below change single options.
 
-        await self._processing_obj._process_workflow(
+        'publish_outputs_early' is the only exception, it is taken from the attribute of this module.
+        """
+        return self._processing_obj.run_options
+
+    @run_options.setter
+    def run_options(self, run_options: RunOptions):
+        self._processing_obj.run_options = run_options
+
+    def _update_run_options(self, **options: typing.Any) -> None:
+        self.run_options = self.run_options.copy(update=options)
+
+    @property
+    def checkpoint_store(self) -> typing.Optional[CheckpointStore]:
+        """The store to save module outputs to, and to resume processing from (disabled if 'None')."""
+        return self.run_options.checkpoint_store
+
+    @checkpoint_store.setter
+    def checkpoint_store(self, checkpoint_store: typing.Optional[CheckpointStore]):
+        self._update_run_options(checkpoint_store=checkpoint_store)
+
+    @property
+    def memory_budget(self) -> typing.Optional[int]:
+        """The memory budget (in bytes) for intermediate values of a run of this workflow (unlimited if 'None').
+
+        If set, intermediate values are released as soon as all modules that use them are processed. Values that
+        need to be kept (e.g. workflow outputs) are spilled into (pickle) files when the budget is exceeded.
+        """
+        return self.run_options.memory_budget
+
+    @memory_budget.setter
+    def memory_budget(self, memory_budget: typing.Optional[int]):
+        self._update_run_options(memory_budget=memory_budget)
+
+    @property
+    def flatten(self) -> bool:
+        """Whether nested workflows are inlined when processing, so all child modules are scheduled as a whole."""
+        return self.run_options.flatten
+
+    @flatten.setter
+    def flatten(self, flatten: bool):
+        self._update_run_options(flatten=flatten)
+
+    @property
+    def prune_unused_modules(self) -> bool:
+        """Whether modules that don't contribute to any workflow output are skipped when processing."""
+        return self.run_options.prune_unused_modules
+
+    @prune_unused_modules.setter
+    def prune_unused_modules(self, prune_unused_modules: bool):
+        self._update_run_options(prune_unused_modules=prune_unused_modules)
+
+    @property
+    def deduplicate_modules(self) -> bool:
+        """Whether identical modules (same type, config and input sources) are only processed once per run."""
+        return self.run_options.deduplicate_modules
+
+    @deduplicate_modules.setter
+    def deduplicate_modules(self, deduplicate_modules: bool):
+        self._update_run_options(deduplicate_modules=deduplicate_modules)
+
+    @property
+    def runtime_stats(self) -> typing.Optional[RuntimeStatsStore]:
+        """The store to record module runtimes in (disabled if 'None').
+
+        If set, and an executor is used, modules are scheduled by their estimated remaining critical path, instead of
+        stage by stage.
+        """
+        return self.run_options.runtime_stats
+
+    @runtime_stats.setter
+    def runtime_stats(self, runtime_stats: typing.Optional[RuntimeStatsStore]):
+        self._update_run_options(runtime_stats=runtime_stats)
+
+    @property
+    def continue_on_error(self) -> bool:
+        """Whether independent modules keep processing when a module fails.
+
+        Failed modules (and the modules that depend on them) are left without results, and the errors are recorded
+        in the run statistics. If any workflow output is missing because of that, the workflow itself is marked as
+        failed.
+        """
+        return self.run_options.continue_on_error
+
+    @continue_on_error.setter
+    def continue_on_error(self, continue_on_error: bool):
+        self._update_run_options(continue_on_error=continue_on_error)
+
+    @property
+    def last_run_stats(self) -> typing.Optional[WorkflowRunStats]:
+        """Statistics about the last run of this workflow ('None' if it wasn't processed yet)."""
+        return self._processing_obj._last_run_stats
+
+    async def process(
+        self,
+        executor: Processor = None,
+        outputs: typing.Optional[typing.Iterable[str]] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> bool:
+        """Process this workflow.
+
+        If the timeout is exceeded, or the workflow is cancelled, all child modules that are still processing are
+        cancelled as well.
+
+        Args:
+            executor: the executor to use
+            outputs: if provided, only the modules that are needed to compute those workflow outputs are processed
+            timeout: the maximum time (in seconds) processing of the whole workflow is allowed to take
+
+        Returns:
+            bool: whether the results were published, 'False' if processing was cancelled
+        """
+
+        if outputs is not None:
+            outputs = list(outputs)
+            # fail early for invalid output names
+            self.structure.get_required_modules(outputs=outputs)
+
+        self._requested_outputs = outputs  # type: ignore
+        try:
+            return await super().process(executor=executor, timeout=timeout)
+        finally:
+            self._requested_outputs = None
+
+    async def auto_process(
+        self,
+        executor: Processor = None,
+        debounce: float = DEFAULT_DEBOUNCE_WINDOW,
+        outputs: typing.Optional[typing.Iterable[str]] = None,
+    ):
+        """Process this workflow whenever its inputs change, until the calling task is cancelled.
+
+        Rapid input changes (e.g. from a slider in a UI) are coalesced: processing only starts once the inputs didn't
+        change for the duration of the debounce window, and only the latest input values are processed. A run that
+        is made obsolete by newer inputs is cancelled.
+
+        Args:
+            executor: the executor to use
+            debounce: the time (in seconds) the inputs have to stay unchanged before processing starts
+            outputs: if provided, only the modules that are needed to compute those workflow outputs are processed
+        """
+
+        # even without a debounce window, changes are never processed more often than this
+        settle_interval = max(debounce, MIN_AUTO_PROCESS_INTERVAL)
+        processed_version: typing.Optional[int] = None
+
+        try:
+            while True:
+                # created before the inputs are checked, so no change can get lost in between
+                inputs_changed = anyio.create_event()
+                self._inputs_changed = inputs_changed
+
+                version = self.inputs_version
+                if version == processed_version or not self.inputs.items__are_valid:
+                    await inputs_changed.wait()
+                    continue
+
+                # wait until the inputs settled
+                await anyio.sleep(settle_interval)
+                if self.inputs_version != version:
+                    continue
+
+                try:
+                    await self.process(executor=executor, outputs=outputs)
+                except Exception as e:
+                    # the same inputs would fail again, so they are only processed again once they change
+                    print(
+                        f"auto-processing '{self.address}' failed: {e}", file=sys.stderr
+                    )
+                    processed_version = version
+                    continue
+
+                if self.inputs_version == version:
+                    processed_version = version
+                # otherwise the run was cancelled, and the new inputs will be processed next
+        finally:
+            self._inputs_changed = None
+
+    def _input_changed(self, input_name: str, new_value: typing.Any):
+
+        super()._input_changed(input_name, new_value)
+        if self._inputs_changed is not None:
+            set_event_nowait(self._inputs_changed)
+
+    async def warmup(self) -> None:
+        """Set up and warm up all pooled (child-)modules of this workflow, before the first request arrives.
+
+        Child modules that are not pooled get new processing objects in every run, which are set up when they are
+        processed, and torn down right after. Modules that are expensive to set up should be pooled (see the 'pooled'
+        module configuration option), so they are only set up once.
+        """
+
+        async with create_task_group() as tg:
+            for module in self.structure.modules:
+                if module.is_pipeline or module._processing_obj._pool_key is not None:
+                    await tg.spawn(module.warmup)
+
+    async def get_output(
+        self, output_name: str, executor: Processor = None
+    ) -> typing.Any:
+        """Compute a single output of this workflow from the current inputs, and return its value.
+
+        Only the modules this output depends on are processed, and only if their results are not current already
+        (e.g. from an earlier run of this workflow, or an earlier call of this method). Modules that don't depend on
+        each other are processed concurrently. Other outputs of this workflow are not changed.
+
+        Args:
+            output_name: the name of the workflow output
+            executor: the executor to use
+        """
+
+        # fail early for invalid output names
+        self.structure.get_required_modules(outputs=[output_name])
+
+        outputs = await self._processing_obj._compute_outputs(
             self._current_inputs,
-            self._current_outputs,
+            [output_name],
+            workflow_id=self.alias,
             executor=executor,
+            options=self._get_run_options(),
+        )
+
+        item = outputs[output_name]
+        if not item.valid:
+            run_stats = self.last_run_stats
+            reason = get_run_error(run_stats, outputs)
+            if reason is None:
+                missing = [k for k, v in self.inputs.items() if not v.valid]
+                if missing:
+                    reason = f"inputs not ready: {', '.join(missing)}"
+                else:
+                    reason = "no value was computed for it"
+            raise Exception(
+                f"Can't compute output '{output_name}' of workflow '{self.alias}', {reason}"
+            )
+
+        self._current_outputs[output_name].set_value(item._value)
+        self._update_state()
+        return item.value
+
+    async def sweep(
+        self,
+        parameters: typing.Mapping[str, typing.Iterable[typing.Any]],
+        executor: Processor = None,
+    ) -> typing.List[WorkflowRun]:
+        """Process this workflow for every combination of the provided input values.
+
+        Modules that don't depend on any of the swept inputs are only processed once, all other modules once per
+        distinct combination of the swept inputs they depend on. Inputs that are not swept use the current inputs of
+        this workflow.
+
+        Args:
+            parameters: the values to use, for every swept input
+            executor: the executor to use
+
+        Returns:
+            one processed run per combination of input values (see 'ParameterSweep.combinations' for their order)
+        """
+
+        from dharpa.workflows.sweeps import ParameterSweep
+
+        return await ParameterSweep(self, parameters).process(executor=executor)
+
+    def create_run(
+        self, inputs: typing.Optional[typing.Mapping[str, typing.Any]] = None
+    ) -> WorkflowRun:
+        """Create a new run of this workflow, with its own input and output values.
+
+        Runs share the structure (and the options) of this workflow object, so any number of them can be processed
+        concurrently, without affecting each other, or the values of this object. Inputs that are not provided
+        start with their default values.
+        """
+
+        return WorkflowRun(self, inputs=inputs)
+
+    async def run(
+        self,
+        inputs: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+        executor: Processor = None,
+        outputs: typing.Optional[typing.Iterable[str]] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> WorkflowRun:
+        """Process a new run of this workflow with the provided inputs, and return it.
+
+        Args:
+            inputs: the input values of the run
+            executor: the executor to use
+            outputs: if provided, only the modules that are needed to compute those workflow outputs are processed
+            timeout: the maximum time (in seconds) processing of the run is allowed to take
+        """
+
+        workflow_run = self.create_run(inputs=inputs)
+        await workflow_run.process(executor=executor, outputs=outputs, timeout=timeout)
+        return workflow_run
+
+    def _get_run_options(self) -> RunOptions:
+
+        return self.run_options.copy(
+            update={
+                "save_runtime_stats": not self._is_nested,
+                "publish_outputs_early": self._publish_outputs_early,
+            }
+        )
+
+    async def _run_workflow(
+        self,
+        executor: typing.Optional[Processor],
+        inputs: InputItems,
+        outputs: OutputItems,
+        requested_outputs: typing.Optional[typing.Iterable[str]] = None,
+    ) -> WorkflowRunStats:
+        """Process a run of this workflow with the provided values, without changing the state of this object."""
+
+        workflow = await self._processing_obj._run_workflow(
+            inputs,
+            outputs,
             workflow_id=self.alias,
+            executor=executor,
+            options=self._get_run_options(),
+            requested_outputs=requested_outputs,
         )
+        return workflow.run_stats
+
+    async def _process_workflow(
+        self, executor: Processor, inputs: InputItems, outputs: OutputItems
+    ):
+
+        await self._processing_obj._process_workflow(
+            inputs,
+            outputs,
+            workflow_id=self.alias,
+            executor=executor,
+            options=self._get_run_options(),
+            requested_outputs=self._requested_outputs,
+        )
+
+        error = get_run_error(self.last_run_stats, outputs)
+        if error is not None:
+            self._error = error
 
     @property
     def is_pipeline(self) -> bool:
@@ -460,21 +1463,6 @@ class DharpaWorkflow(WorkflowModule):
 
     def to_details(self, include_structure: bool = True) -> ModuleDetails:
 
-        inputs = {}
-        for k, v in self.inputs.items():
-            i = ValueItem(
-                schema=ValueSchema(type=v.schema.type, default=v.schema.default),
-                value=v.value,
-            )
-            inputs[k] = i
-        outputs = {}
-        for k, v in self.outputs.items():
-            o = ValueItem(
-                schema=ValueSchema(type=v.schema.type, default=v.schema.default),
-                value=v.value,
-            )
-            outputs[k] = o
-
         details = super().to_details()
         if include_structure:
             structure_details = self.structure.to_details()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for processing workflows concurrently, e.g. with modules that run in worker threads."""
+
+import anyio
+import pytest
+import threading
+
+import dharpa
+from dharpa.data.core import DataItem
+from dharpa.models import ModuleState
+from dharpa.processing.executors import ResourceAwareProcessor, ThreadPoolProcessor
+from dharpa.workflows.workflow import DharpaWorkflow
+
+WIDTH = 16
+
+
+@pytest.fixture(scope="module")
+def wide_workflow():
+
+    config = {
+        "modules": [
+            {"module_type": "xor", "module_alias": f"x{i}"} for i in range(WIDTH)
+        ],
+        "input_aliases": {},
+    }
+    for i in range(WIDTH):
+        config["input_aliases"][f"x{i}__a"] = "a"
+        config["input_aliases"][f"x{i}__b"] = "b"
+
+    dharpa.DHARPA_MODULES.get_workflow_configs()["wide_xor"] = {
+        "data": config,
+        "path": "wide_xor.json",
+    }
+    yield "wide_xor"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("wide_xor")
+
+
+@pytest.mark.parametrize(
+    "executor",
+    [
+        ThreadPoolProcessor(max_workers=8),
+        ResourceAwareProcessor(use_processes=False, max_io_workers=8),
+    ],
+)
+def test_values_are_published_on_event_loop(wide_workflow, executor, monkeypatch):
+
+    publishing_threads = set()
+    post_value_set = DataItem._post_value_set
+
+    def record_thread(self, old_value):
+        # items without callbacks are the private outputs of a single processing run
+        if self._callbacks:
+            publishing_threads.add(threading.get_ident())
+        post_value_set(self, old_value)
+
+    monkeypatch.setattr(DataItem, "_post_value_set", record_thread)
+
+    async def run():
+        wf = dharpa.create_workflow(wide_workflow)
+        for _ in range(2):
+            for a in (True, False):
+                for b in (True, False):
+                    wf.inputs = {"a": a, "b": b}
+                    await wf.process(executor)
+
+                    assert wf.state == ModuleState.RESULTS_READY
+                    assert wf.outputs.ALL == {f"x{i}__y": a != b for i in range(WIDTH)}
+
+    anyio.run(run)
+
+    # all modules run in worker threads, but their results are only ever passed on from the thread of the event loop
+    assert publishing_threads == {threading.get_ident()}
+
+
+def test_concurrent_workflows_share_executor(wide_workflow):
+
+    executor = ThreadPoolProcessor(max_workers=8)
+    inputs = [(True, False), (False, False), (True, True), (False, True)] * 2
+
+    async def run_one(a: bool, b: bool, results: dict, index: int):
+        wf = dharpa.create_workflow(wide_workflow)
+        wf.inputs = {"a": a, "b": b}
+        await wf.process(executor)
+        results[index] = (a != b, wf.outputs.ALL)
+
+    async def run():
+        results: dict = {}
+        async with anyio.create_task_group() as tg:
+            for index, (a, b) in enumerate(inputs):
+                await tg.spawn(run_one, a, b, results, index)
+        return results
+
+    results = anyio.run(run)
+
+    assert len(results) == len(inputs)
+    for expected, outputs in results.values():
+        assert outputs == {f"x{i}__y": expected for i in range(WIDTH)}
+
+
+def test_concurrent_runs_share_workflow(wide_workflow):
+
+    executor = ThreadPoolProcessor(max_workers=8)
+    inputs = [(True, False), (False, False), (True, True), (False, True)] * 2
+    wf = dharpa.create_workflow(wide_workflow)
+
+    async def run_one(a: bool, b: bool, results: dict, index: int):
+        workflow_run = await wf.run({"a": a, "b": b}, executor=executor)
+        results[index] = (a != b, workflow_run)
+
+    async def run():
+        results: dict = {}
+        async with anyio.create_task_group() as tg:
+            for index, (a, b) in enumerate(inputs):
+                await tg.spawn(run_one, a, b, results, index)
+        return results
+
+    results = anyio.run(run)
+
+    assert len(results) == len(inputs)
+    for expected, workflow_run in results.values():
+        assert workflow_run.state == ModuleState.RESULTS_READY
+        assert workflow_run.outputs.ALL == {f"x{i}__y": expected for i in range(WIDTH)}
+
+    # runs don't touch the values of the workflow object itself
+    assert wf.state == ModuleState.STALE
+    assert wf.outputs.ALL == {f"x{i}__y": None for i in range(WIDTH)}
+
+
+@pytest.fixture(scope="module")
+def early_workflow():
+
+    config = {
+        "modules": [
+            {
+                "module_type": "dummy",
+                "module_alias": "producer",
+                "module_config": {
+                    "input_schema": {"a": {"type": "boolean"}},
+                    "output_schema": {"x": {"type": "boolean"}, "y": {"type": "boolean"}},
+                    "outputs": {"x": True, "y": False},
+                    "output_delays": {"x": 0.1, "y": 0.8},
+                },
+            },
+            {
+                "module_type": "dummy",
+                "module_alias": "consumer",
+                "input_links": {"b": "producer.x"},
+                "module_config": {
+                    "input_schema": {"b": {"type": "boolean"}},
+                    "output_schema": {"z": {"type": "boolean"}},
+                    "outputs": {"z": True},
+                    "delay": 0.1,
+                },
+            },
+        ],
+        "input_aliases": {"producer__a": "a"},
+        "output_aliases": {"producer__y": "y", "consumer__z": "z"},
+    }
+    dharpa.DHARPA_MODULES.get_workflow_configs()["early_outputs"] = {
+        "data": config,
+        "path": "early_outputs.json",
+    }
+    yield "early_outputs"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("early_outputs")
+
+
+def test_outputs_are_published_early(early_workflow):
+
+    wf = dharpa.create_workflow(early_workflow)
+    wf.publish_outputs_early = True
+    wf.inputs = {"a": True}
+
+    published = []
+    for name, item in wf.outputs.items():
+        item.add_callback(lambda value, name=name: published.append(name))
+
+    anyio.run(wf.process, ThreadPoolProcessor(max_workers=2))
+
+    # the consumer finished while the producer was still processing
+    assert published == ["z", "y"]
+    assert wf.state == ModuleState.RESULTS_READY
+    assert wf.outputs.ALL == {"y": False, "z": True}
+
+
+def test_outputs_are_computed_on_demand(wide_workflow):
+
+    executor = ThreadPoolProcessor(max_workers=8)
+    wf = dharpa.create_workflow(wide_workflow)
+    wf.inputs = {"a": True, "b": False}
+
+    async def pull(output_name: str):
+        return await wf.get_output(output_name, executor=executor)
+
+    assert anyio.run(pull, "x3__y") is True
+    assert wf.last_run_stats.modules_processed == 1
+    assert wf.last_run_stats.modules_pruned == WIDTH - 1
+    assert wf.outputs["x4__y"].value is None
+
+    # results that are still current are re-used
+    assert anyio.run(pull, "x3__y") is True
+    assert wf.last_run_stats.modules_processed == 0
+    assert wf.last_run_stats.modules_reused == 1
+
+    wf.inputs = {"b": True}
+    assert anyio.run(pull, "x3__y") is False
+    assert wf.last_run_stats.modules_processed == 1
+
+
+def test_concurrent_requests_share_computations(wide_workflow, monkeypatch):
+
+    executor = ThreadPoolProcessor(max_workers=8)
+    wf = dharpa.create_workflow(wide_workflow)
+    wf.inputs = {"a": True, "b": False}
+
+    calls = []
+    process = DharpaWorkflow.process
+
+    async def counting_process(self, *args, **kwargs):
+        calls.append(self.alias)
+        return await process(self, *args, **kwargs)
+
+    monkeypatch.setattr(DharpaWorkflow, "process", counting_process)
+    results = []
+
+    async def pull():
+        results.append(await wf.get_output("x3__y", executor=executor))
+
+    async def pull_concurrently():
+        async with anyio.create_task_group() as tg:
+            for _ in range(4):
+                await tg.spawn(pull)
+
+    anyio.run(pull_concurrently)
+
+    # requests that came in while the module was processing waited for its results
+    assert results == [True] * 4
+    assert calls.count("x3") == 1
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for data items, and the values they hold."""
+
+import anyio
+import pickle
+import pytest
+from concurrent.futures.thread import ThreadPoolExecutor
+
+from dharpa.data.core import DataItem, DataSchema, DataType
+from dharpa.data.fingerprints import (
+    FINGERPRINT_CHUNK_SIZE,
+    get_content_fingerprint,
+    get_value_fingerprint,
+)
+from dharpa.data.frozen import FrozenDict, FrozenList, freeze, is_frozen, thaw
+from dharpa.data.tables import CsvTable, open_lazy_table
+from dharpa.models import ModuleState
+from dharpa.workflows.checkpoints import CheckpointStore
+from dharpa.workflows.modules import WorkflowModule
+from dharpa.workflows.serialization import WorkflowSerializer
+
+ROWS = 2000
+
+
+def _write_corpus(path, rows: int = ROWS, text: str = "text"):
+
+    with open(path, "w") as f:
+        f.write("id,text\n")
+        for i in range(rows):
+            f.write(f'{i},"{text} {i}"\n')
+
+
+def _load_corpus(path) -> WorkflowModule:
+
+    module = WorkflowModule({"module_type": "load_corpus"})
+    module.inputs = {"path_to_data": str(path)}
+    anyio.run(module.process)
+    return module
+
+
+def test_lazy_table_concurrent_reads(tmp_path):
+
+    path = tmp_path / "corpus.csv"
+    _write_corpus(path)
+    table = open_lazy_table(path)
+
+    indexes = list(reversed(range(ROWS)))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda i: table[i]["id"], indexes))
+
+    assert ids == [str(i) for i in indexes]
+    assert len(table) == ROWS
+
+
+def test_serialized_lazy_tables(tmp_path):
+
+    path = tmp_path / "corpus.csv"
+    _write_corpus(path)
+    module = _load_corpus(path)
+
+    table = module.outputs.corpus
+    assert isinstance(table, CsvTable)
+
+    def serialize(**options):
+        serializer = WorkflowSerializer(**options)
+        return serializer.module_to_dict(module)["outputs"]["corpus"]["value"]
+
+    # lazy tables are only serialized as reference if that is requested explicitly
+    assert serialize(table_reference=True) == {
+        "table_type": "CsvTable",
+        "path": str(path),
+        "fingerprint": table.get_fingerprint(),
+        "rows": ROWS,
+    }
+    assert serialize(max_table_rows=2) == [
+        {"id": "0", "text": "text 0"},
+        {"id": "1", "text": "text 1"},
+    ]
+    assert serialize() == list(table)
+
+
+def test_lazy_tables_are_checkpointed_as_reference(tmp_path):
+
+    path = tmp_path / "corpus.csv"
+    _write_corpus(path)
+    store = CheckpointStore(tmp_path / "checkpoints")
+
+    assert store.save(_load_corpus(path))
+    checkpoint_files = list((tmp_path / "checkpoints").glob("*/*/*"))
+    assert all(f.stat().st_size < 1024 for f in checkpoint_files)
+
+    module = WorkflowModule({"module_type": "load_corpus"})
+    module.inputs = {"path_to_data": str(path)}
+    assert store.restore(module)
+    assert module.outputs.corpus[5] == {"id": "5", "text": "text 5"}
+
+    # the checkpoint is only valid as long as the file doesn't change
+    _write_corpus(path, text="changed")
+    module = WorkflowModule({"module_type": "load_corpus"})
+    module.inputs = {"path_to_data": str(path)}
+    assert not store.restore(module)
+
+
+def _create_rows(rows: int) -> list:
+    return [{"id": i, "tags": [str(i)], "meta": {"n": i}} for i in range(rows)]
+
+
+def test_frozen_values_are_read_only():
+
+    value = freeze({"rows": _create_rows(3), "tags": {"a"}})
+    assert is_frozen(value)
+    assert isinstance(value["rows"][0], FrozenDict)
+    assert isinstance(value["rows"][0]["tags"], FrozenList)
+    assert value["tags"] == frozenset(["a"])
+
+    with pytest.raises(TypeError):
+        value["other"] = 1
+    with pytest.raises(TypeError):
+        value["rows"].append({})
+    with pytest.raises(TypeError):
+        value["rows"][0]["meta"].update(n=1)
+
+    # frozen values are never copied
+    assert freeze(value) is value
+
+
+def test_frozen_copies_are_mutable():
+
+    value = freeze(_create_rows(3))
+
+    rows = value.mutable_copy()
+    rows.append({"id": 3})
+    assert type(rows) is list
+    assert len(value) == 3
+    # nested values are shared, until they are copied themselves
+    assert rows[0] is value[0]
+    row = rows[0].mutable_copy()
+    row["id"] = -1
+    assert value[0]["id"] == 0
+
+    thawed = thaw(value)
+    assert thawed == _create_rows(3)
+    assert type(thawed[0]) is dict and type(thawed[0]["tags"]) is list
+    thawed[0]["tags"].append("x")
+    assert value[0]["tags"] == ["0"]
+
+
+def test_frozen_values_are_independent_of_their_source():
+
+    rows = _create_rows(2)
+    value = freeze(rows)
+
+    rows[0]["id"] = -1
+    rows[0]["tags"].append("x")
+    rows.append({"id": 2})
+    assert value == _create_rows(2)
+
+
+def test_frozen_values_pickle_roundtrip():
+
+    value = freeze({"rows": _create_rows(3)})
+    restored = pickle.loads(pickle.dumps(value))
+
+    assert restored == value
+    assert isinstance(restored, FrozenDict)
+    assert isinstance(restored["rows"][2], FrozenDict)
+    assert restored.get_fingerprint() == value.get_fingerprint()
+
+
+@pytest.mark.parametrize("rows", [3, FINGERPRINT_CHUNK_SIZE + 1])
+def test_frozen_and_plain_rows_have_the_same_fingerprint(rows):
+
+    plain = _create_rows(rows)
+    frozen = freeze(_create_rows(rows))
+    assert get_content_fingerprint(frozen) == get_content_fingerprint(plain)
+
+    # rows that were frozen on access are still hashed the same way
+    frozen[-1]
+    assert get_content_fingerprint(frozen) == get_content_fingerprint(plain)
+    assert all(isinstance(row, FrozenDict) for row in frozen)
+    assert get_content_fingerprint(frozen) == get_content_fingerprint(plain)
+
+
+def test_tables_are_frozen_when_set():
+
+    item = DataItem(DataSchema(type=DataType.table))
+    rows = _create_rows(FINGERPRINT_CHUNK_SIZE + 1)
+    item.value = rows
+
+    value = item.value
+    assert isinstance(value, FrozenList)
+    assert all(type(row) is FrozenDict for row in list.__iter__(value))
+    # rows that were frozen already are shared
+    assert freeze(value.mutable_copy())[1] is value[1]
+    rows[1]["id"] = -1
+    assert value[1]["id"] == 1
+
+    # setting equal rows doesn't count as change
+    assert not item.set_value(_create_rows(FINGERPRINT_CHUNK_SIZE + 1))
+
+
+class _Point(object):
+    def __init__(self, x: int):
+        self.x = x
+
+    def __eq__(self, other):
+        return isinstance(other, _Point) and other.x == self.x
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        1,
+        "text",
+        {"a": [1, 2.5, None]},
+        (True, b"data"),
+        {"x", "y"},
+        _create_rows(FINGERPRINT_CHUNK_SIZE + 1),
+    ],
+)
+def test_equal_values_have_the_same_fingerprint(value):
+
+    fingerprint = get_value_fingerprint(value)
+    assert fingerprint is not None
+    assert get_value_fingerprint(pickle.loads(pickle.dumps(value))) == fingerprint
+
+
+def test_different_values_have_different_fingerprints():
+
+    values = [1, 1.0, True, "1", b"1", [1], (1,), {"a": 1}, {"a": "1"}]
+    fingerprints = {get_value_fingerprint(v) for v in values}
+    assert len(fingerprints) == len(values)
+
+    rows = _create_rows(FINGERPRINT_CHUNK_SIZE + 1)
+    changed = _create_rows(FINGERPRINT_CHUNK_SIZE + 1)
+    changed[-1]["tags"].append("y")
+    assert get_value_fingerprint(rows) != get_value_fingerprint(changed)
+
+
+def test_unknown_objects_are_always_changed():
+
+    assert get_value_fingerprint(_Point(1)) is None
+    assert get_value_fingerprint({"point": _Point(1)}) is None
+
+    item = DataItem(DataSchema(type=DataType.dict))
+    received = []
+    item.add_callback(received.append)
+
+    assert item.set_value({"point": _Point(1)})
+    assert item.set_value({"point": _Point(1)})
+    assert len(received) == 2
+
+
+def test_unchanged_values_are_not_passed_on():
+
+    item = DataItem(DataSchema(type=DataType.table))
+    received = []
+    item.add_callback(received.append)
+
+    assert item.set_value(_create_rows(3))
+    version = item.version
+    assert not item.set_value(_create_rows(3))
+    assert item.version == version
+    assert item.set_value(_create_rows(4))
+    assert len(received) == 2
+
+
+CHECKPOINT_CONFIG = {
+    "input_schema": {"a": {"type": "integer"}},
+    "output_schema": {
+        "table": {"type": "table"},
+        "meta": {"type": "dict"},
+        "pair": {"type": "dict"},
+    },
+    "outputs": {
+        "table": [{"id": 1, "tags": ["x"]}, {"id": 2, "tags": []}],
+        "meta": {"name": "test", "count": 2},
+        "pair": {"pair": (1, 2)},
+    },
+}
+
+
+def _create_checkpoint_module(a: int, **config) -> WorkflowModule:
+
+    module = WorkflowModule(
+        {"module_type": "dummy", "module_config": dict(CHECKPOINT_CONFIG, **config)}
+    )
+    module.inputs = {"a": a}
+    return module
+
+
+def test_checkpoints_are_restored_for_the_same_inputs(tmp_path):
+
+    store = CheckpointStore(tmp_path)
+    module = _create_checkpoint_module(1)
+    assert not store.save(module)
+    anyio.run(module.process)
+    assert store.save(module)
+    assert store.has_checkpoint(module)
+
+    restored = _create_checkpoint_module(1)
+    assert store.restore(restored)
+    assert restored.state == ModuleState.RESULTS_READY
+    for name in CHECKPOINT_CONFIG["outputs"].keys():
+        assert getattr(restored.outputs, name) == getattr(module.outputs, name)
+    # values that json can't represent exactly are pickled
+    assert restored.outputs.pair["pair"] == (1, 2)
+
+    assert not store.restore(_create_checkpoint_module(2))
+    assert not store.restore(_create_checkpoint_module(1, delay=0.001))
+
+
+def test_modules_that_cant_be_fingerprinted_are_not_checkpointed(tmp_path):
+
+    store = CheckpointStore(tmp_path)
+    outputs = dict(CHECKPOINT_CONFIG["outputs"], meta={"point": _Point(1)})
+    module = _create_checkpoint_module(1, outputs=outputs)
+    anyio.run(module.process)
+
+    assert store.get_checkpoint_key(module) is None
+    assert not store.save(module)
+    assert not store.has_checkpoint(module)
+    assert not store.restore(module)
+
+
+def test_checkpoints_are_invalidated(tmp_path):
+
+    store = CheckpointStore(tmp_path / "checkpoints")
+    module = _create_checkpoint_module(1)
+    anyio.run(module.process)
+    assert store.save(module)
+
+    module.inputs = {"a": 2}
+    assert not store.has_checkpoint(module)
+    assert not store.restore(module)
+
+    store.clear()
+    assert not store.restore(_create_checkpoint_module(1))
+
+
+def test_checkpoints_keep_tables_that_change_in_arrow(tmp_path):
+
+    pytest.importorskip("pyarrow")
+
+    store = CheckpointStore(tmp_path)
+    # arrow would add the missing column to the first row
+    table = [{"id": 1}, {"id": 2, "text": "x"}]
+    module = _create_checkpoint_module(1, outputs={"table": table})
+    anyio.run(module.process)
+    assert store.save(module)
+
+    restored = _create_checkpoint_module(1, outputs={"table": table})
+    assert store.restore(restored)
+    assert restored.outputs.table == table
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the executors that run processing modules in threads and processes."""
+
+import anyio
+import os
+import pytest
+import threading
+import typing
+
+import dharpa
+from dharpa.data.core import DataSchema, DataType
+from dharpa.models import ProcessingModuleConfig
+from dharpa.processing.core.dummy import DummyProcessingModule
+from dharpa.processing.executors import (
+    ResourceAwareProcessor,
+    ThreadPoolProcessor,
+    run_processing_module,
+)
+from dharpa.processing.pool import (
+    ProcessingModulePool,
+    get_processing_module_pool,
+    set_processing_module_pool,
+)
+from dharpa.processing.processing_module import ProcessingModule
+from dharpa.workflows.modules import InputItems, OutputItems, WorkflowModule
+
+
+class RecordingModuleConfig(ProcessingModuleConfig):
+
+    path: str
+    fail: bool = False
+
+
+class RecordingProcessingModule(ProcessingModule):
+    """Records the id of the process it runs in, and optionally fails with a 'TypeError'."""
+
+    _module_name = "test_recording"
+    _processing_step_config_cls = RecordingModuleConfig
+
+    def _create_input_schema(self) -> typing.Mapping[str, DataSchema]:
+        return {"a": DataSchema(DataType.dict)}
+
+    def _create_output_schema(self) -> typing.Mapping[str, DataSchema]:
+        return {"y": DataSchema(DataType.integer)}
+
+    async def _process(self, inputs: InputItems, outputs: OutputItems) -> None:
+
+        with open(self.config.path, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        if self.config.fail:
+            raise TypeError("failed in module code")
+        outputs.y = os.getpid()
+
+
+@pytest.fixture
+def recording_module():
+
+    module_classes = dharpa.DHARPA_MODULES.get_module_classes()
+    module_classes[RecordingProcessingModule._module_name] = RecordingProcessingModule  # type: ignore
+    yield RecordingProcessingModule._module_name
+    module_classes.pop(RecordingProcessingModule._module_name)  # type: ignore
+
+
+def _create_module(module_type: str, path: str, fail: bool = False) -> WorkflowModule:
+
+    return WorkflowModule(
+        {
+            "module_type": module_type,
+            "module_config": {
+                "path": path,
+                "fail": fail,
+                "resources": {"cpu_slots": 1, "workload": "cpu"},
+            },
+        }
+    )
+
+
+def _read_pids(path) -> typing.List[int]:
+
+    with open(path) as f:
+        return [int(line) for line in f.read().splitlines()]
+
+
+def test_cpu_modules_run_in_subprocess(recording_module, tmp_path):
+
+    path = tmp_path / "pids"
+    module = _create_module(recording_module, str(path))
+    module.inputs = {"a": {"x": 1}}
+
+    anyio.run(module.process, ResourceAwareProcessor(cpu_slots=1))
+
+    assert _read_pids(path) == [module.outputs.y]
+    assert module.outputs.y != os.getpid()
+
+
+def test_subprocess_errors_are_not_retried_in_thread(recording_module, tmp_path):
+
+    path = tmp_path / "pids"
+    module = _create_module(recording_module, str(path), fail=True)
+    module.inputs = {"a": {"x": 1}}
+
+    with pytest.raises(TypeError, match="failed in module code"):
+        anyio.run(module.process, ResourceAwareProcessor(cpu_slots=1))
+
+    pids = _read_pids(path)
+    assert len(pids) == 1
+    assert pids[0] != os.getpid()
+
+
+def test_unpicklable_inputs_fall_back_to_thread(recording_module, tmp_path):
+
+    path = tmp_path / "pids"
+    module = _create_module(recording_module, str(path))
+    module.inputs = {"a": {"lock": threading.Lock()}}
+
+    anyio.run(module.process, ResourceAwareProcessor(cpu_slots=1))
+
+    assert _read_pids(path) == [os.getpid()]
+
+
+@pytest.fixture
+def module_pool():
+
+    previous = get_processing_module_pool()
+    pool = ProcessingModulePool()
+    set_processing_module_pool(pool)
+    yield pool
+    anyio.run(pool.clear)
+    set_processing_module_pool(previous)
+
+
+@pytest.fixture(scope="module")
+def pooled_workflow():
+
+    config = {
+        "modules": [
+            {
+                "module_type": "dummy",
+                "module_alias": "model",
+                "module_config": {
+                    "input_schema": {"a": {"type": "boolean"}},
+                    "output_schema": {"y": {"type": "boolean"}},
+                    "outputs": {"y": True},
+                    "setup_delay": 0.1,
+                    "pooled": True,
+                },
+            }
+        ],
+        "input_aliases": {"model__a": "a"},
+        "output_aliases": {"model__y": "y"},
+    }
+    dharpa.DHARPA_MODULES.get_workflow_configs()["pooled_model"] = {
+        "data": config,
+        "path": "pooled_model.json",
+    }
+    yield "pooled_model"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("pooled_model")
+
+
+def test_pooled_modules_are_reused_across_runs(
+    pooled_workflow, module_pool, monkeypatch
+):
+
+    setups = []
+    setup = DummyProcessingModule._setup
+
+    async def record_setup(self):
+        setups.append(self)
+        await setup(self)
+
+    monkeypatch.setattr(DummyProcessingModule, "_setup", record_setup)
+
+    executor = ThreadPoolProcessor(max_workers=2)
+    wf = dharpa.create_workflow(pooled_workflow)
+
+    instances = []
+    for a in (True, False, True):
+        wf.inputs = {"a": a}
+        anyio.run(wf.process, executor)
+        assert wf.outputs.ALL == {"y": True}
+        instances.append(wf.structure.get_module("model")._processing_obj)
+
+        workflow_run = anyio.run(wf.run, {"a": a}, executor)
+        assert workflow_run.outputs.ALL == {"y": True}
+
+    assert len(setups) == 1
+    assert all(instance is setups[0] for instance in instances)
+    assert setups[0].is_set_up
+
+
+def test_pooled_modules_are_created_from_the_original_config(module_pool):
+
+    config = dict(DUMMY_CONFIG, outputs={"y": (True, False)})
+    instance = module_pool.get("dummy", config)
+    assert instance.config["outputs"]["y"] == (True, False)
+
+
+def test_pooled_instances_are_handed_over_across_event_loops(module_pool):
+
+    instance = module_pool.get("dummy", DUMMY_CONFIG)
+    acquired = anyio.run(module_pool.acquire, instance)
+    threads = threading.active_count()
+
+    results = []
+
+    def acquire_in_other_loop():
+        results.append(anyio.run(module_pool.acquire, instance))
+
+    thread = threading.Thread(target=acquire_in_other_loop)
+    thread.start()
+    thread.join(0.2)
+    # the other event loop waits for the instance, without using a worker thread
+    assert thread.is_alive()
+    assert threading.active_count() == threads + 1
+
+    module_pool.release(acquired)
+    thread.join(5)
+    assert results == [acquired]
+    module_pool.release(acquired)
+
+
+@pytest.fixture
+def lifecycle_calls(monkeypatch):
+
+    calls = []
+    for hook in ("_setup", "_teardown"):
+        original = getattr(DummyProcessingModule, hook)
+
+        async def record(self, hook=hook, original=original):
+            calls.append((hook, self))
+            await original(self)
+
+        monkeypatch.setattr(DummyProcessingModule, hook, record)
+    return calls
+
+
+DUMMY_CONFIG = {
+    "input_schema": {"a": {"type": "boolean"}},
+    "output_schema": {"y": {"type": "boolean"}},
+    "outputs": {"y": True},
+}
+
+
+def test_modules_are_torn_down_after_processing(lifecycle_calls):
+
+    module = WorkflowModule({"module_type": "dummy", "module_config": DUMMY_CONFIG})
+    module.inputs = {"a": True}
+    anyio.run(module.process)
+
+    assert lifecycle_calls == [
+        ("_setup", module._processing_obj),
+        ("_teardown", module._processing_obj),
+    ]
+
+    del lifecycle_calls[:]
+    assert run_processing_module("dummy", DUMMY_CONFIG, {}, {"a": True}) == {
+        "y": True
+    }
+    assert [hook for hook, _ in lifecycle_calls] == ["_setup", "_teardown"]
+
+
+def test_workflow_warmup_sets_up_pooled_modules(
+    pooled_workflow, module_pool, lifecycle_calls
+):
+
+    wf = dharpa.create_workflow(pooled_workflow)
+    anyio.run(wf.warmup)
+    assert [hook for hook, _ in lifecycle_calls] == ["_setup"]
+
+    wf.inputs = {"a": True}
+    anyio.run(wf.process)
+    anyio.run(wf.run, {"a": False})
+    assert wf.outputs.ALL == {"y": True}
+    # pooled modules stay set up until they are removed from the pool
+    assert [hook for hook, _ in lifecycle_calls] == ["_setup"]
+
+    anyio.run(module_pool.clear)
+    assert [hook for hook, _ in lifecycle_calls] == ["_setup", "_teardown"]
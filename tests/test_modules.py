@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for processing modules, and their configuration."""
+
+import anyio
+import pytest
+import threading
+import time
+import typing
+
+import dharpa
+from dharpa.data.core import DataSchema, DataType
+from dharpa.models import ModuleState, ProcessingModuleConfig, RetryPolicy
+from dharpa.processing import processing_module
+from dharpa.processing.core.dummy import DummyProcessingModule
+from dharpa.processing.executors import ThreadPoolProcessor
+from dharpa.processing.processing_module import ProcessingModule
+from dharpa.workflows.modules import InputItems, OutputItems, WorkflowModule
+
+TABLE_CONFIG = {
+    "input_schema": {"a": {"type": "boolean"}},
+    "output_schema": {"table": {"type": "table"}},
+    "outputs": {"table": [{"id": 1, "tags": ["x"]}]},
+}
+
+
+def test_config_values_are_kept_as_they_are():
+
+    module = WorkflowModule({"module_type": "dummy", "module_config": TABLE_CONFIG})
+    config = module._processing_obj.config
+
+    assert type(config.outputs["table"]) is list
+    assert type(config.outputs["table"][0]) is dict
+    with pytest.raises(TypeError):
+        config["delay"] = 1
+
+    module.inputs = {"a": True}
+    anyio.run(module.process)
+    table = module.outputs.table
+    assert isinstance(table, list)
+    assert table == [{"id": 1, "tags": ["x"]}]
+
+
+def test_configs_with_equal_content_are_equal():
+
+    first = DummyProcessingModule(**TABLE_CONFIG)
+    second = DummyProcessingModule(**TABLE_CONFIG)
+
+    assert first.config is not second.config
+    assert first.config == second.config
+    assert hash(first.config) == hash(second.config)
+    assert first == second and hash(first) == hash(second)
+
+
+def test_schemas_are_shared_between_instances(monkeypatch):
+
+    monkeypatch.setattr(processing_module, "SCHEMA_CACHE_SIZE", 2)
+
+    first = DummyProcessingModule(**TABLE_CONFIG)
+    second = DummyProcessingModule(**TABLE_CONFIG)
+    assert first.input_schemas is second.input_schemas
+
+    for delay in range(3):
+        DummyProcessingModule(delay=delay, **TABLE_CONFIG).output_schemas
+    assert len(processing_module._SCHEMA_CACHE) <= 2
+
+
+def test_workflow_schemas_are_not_shared():
+
+    first = dharpa.create_workflow("xor")._processing_obj
+    second = dharpa.create_workflow("xor")._processing_obj
+
+    assert first.input_schemas == second.input_schemas
+    assert first.input_schemas is not second.input_schemas
+
+
+class SleepingModuleConfig(ProcessingModuleConfig):
+
+    duration: float = 10
+
+
+class SleepingProcessingModule(ProcessingModule):
+    """Waits (without blocking the event loop) before it returns its input."""
+
+    _module_name = "test_sleeping"
+    _processing_step_config_cls = SleepingModuleConfig
+
+    def _create_input_schema(self) -> typing.Mapping[str, DataSchema]:
+        return {"a": DataSchema(DataType.integer)}
+
+    def _create_output_schema(self) -> typing.Mapping[str, DataSchema]:
+        return {"y": DataSchema(DataType.integer)}
+
+    async def _process(self, inputs: InputItems, outputs: OutputItems) -> None:
+
+        await anyio.sleep(self.config.duration)
+        outputs.y = inputs.a
+
+
+@pytest.fixture
+def sleeping_module():
+
+    module_classes = dharpa.DHARPA_MODULES.get_module_classes()
+    module_classes[SleepingProcessingModule._module_name] = SleepingProcessingModule  # type: ignore
+    yield SleepingProcessingModule._module_name
+    module_classes.pop(SleepingProcessingModule._module_name)  # type: ignore
+
+
+def test_cancel_from_other_thread(sleeping_module):
+
+    module = WorkflowModule({"module_type": sleeping_module})
+    module.inputs = {"a": 1}
+
+    timer = threading.Timer(0.1, module.cancel)
+    timer.start()
+    started = time.monotonic()
+    assert anyio.run(module.process) is False
+
+    assert time.monotonic() - started < 5
+    assert module.outputs.y is None
+    assert not module.is_processing
+
+
+def test_input_changes_cancel_processing(sleeping_module):
+
+    module = WorkflowModule({"module_type": sleeping_module})
+    module.inputs = {"a": 1}
+    results = []
+
+    async def process():
+        results.append(await module.process())
+
+    async def change_inputs():
+
+        async with anyio.create_task_group() as tg:
+            await tg.spawn(process)
+            await anyio.sleep(0.1)
+            module.inputs = {"a": 2}
+
+    anyio.run(change_inputs)
+
+    assert results == [False]
+    assert module.outputs.y is None
+
+
+def test_new_runs_replace_current_ones(sleeping_module):
+
+    module = WorkflowModule(
+        {"module_type": sleeping_module, "module_config": {"duration": 0.2}}
+    )
+    module.inputs = {"a": 1}
+    results = []
+
+    async def process():
+        results.append(await module.process())
+
+    async def process_twice():
+
+        async with anyio.create_task_group() as tg:
+            await tg.spawn(process)
+            await anyio.sleep(0.05)
+            await tg.spawn(process)
+
+    started = time.monotonic()
+    anyio.run(process_twice)
+
+    # the first run is cancelled right away, the second one waits for it before it starts
+    assert results == [False, True]
+    assert time.monotonic() - started < 0.4
+    assert module.outputs.y == 1
+    assert not module.is_processing
+
+
+def test_processing_times_out(sleeping_module):
+
+    module = WorkflowModule({"module_type": sleeping_module})
+    module.inputs = {"a": 1}
+
+    with pytest.raises(TimeoutError):
+        anyio.run(module.process, None, None, 0.1)
+    assert module.outputs.y is None
+
+    module = WorkflowModule(
+        {"module_type": sleeping_module, "module_config": {"duration": 0}}
+    )
+    module.inputs = {"a": 1}
+    assert anyio.run(module.process, None, None, 5) is True
+    assert module.outputs.y == 1
+
+
+class FailingModuleConfig(ProcessingModuleConfig):
+
+    failures: int = 1
+
+
+class FailingProcessingModule(ProcessingModule):
+    """Fails the first 'failures' times it is processed, afterwards it returns its input."""
+
+    _module_name = "test_failing"
+    _processing_step_config_cls = FailingModuleConfig
+
+    def __init__(self, **kwargs):
+
+        super().__init__(**kwargs)
+        self.attempts = 0
+
+    def _create_input_schema(self) -> typing.Mapping[str, DataSchema]:
+        return {"a": DataSchema(DataType.boolean)}
+
+    def _create_output_schema(self) -> typing.Mapping[str, DataSchema]:
+        return {"y": DataSchema(DataType.boolean)}
+
+    async def _process(self, inputs: InputItems, outputs: OutputItems) -> None:
+
+        self.attempts = self.attempts + 1
+        if self.attempts <= self.config.failures:
+            raise Exception(f"attempt {self.attempts} failed")
+        outputs.y = inputs.a
+
+
+@pytest.fixture
+def failing_module():
+
+    module_classes = dharpa.DHARPA_MODULES.get_module_classes()
+    module_classes[FailingProcessingModule._module_name] = FailingProcessingModule  # type: ignore
+    yield FailingProcessingModule._module_name
+    module_classes.pop(FailingProcessingModule._module_name)  # type: ignore
+
+
+def test_failed_processing_is_retried(failing_module):
+
+    module = WorkflowModule(
+        {"module_type": failing_module, "module_config": {"failures": 2}},
+        retry={"max_attempts": 3, "backoff": 0},
+    )
+    module.inputs = {"a": True}
+    assert anyio.run(module.process) is True
+    assert module._processing_obj.attempts == 3
+    assert module.outputs.y is True
+    assert module.error is None
+
+    module = WorkflowModule(
+        {"module_type": failing_module, "module_config": {"failures": 2}},
+        retry={"max_attempts": 2, "backoff": 0},
+    )
+    module.inputs = {"a": True}
+    with pytest.raises(Exception):
+        anyio.run(module.process)
+    assert module._processing_obj.attempts == 2
+    assert module.state == ModuleState.FAILED
+    assert module.error == "attempt 2 failed"
+    assert module.outputs.y is None
+
+
+def test_retry_delays_grow():
+
+    retry = RetryPolicy(max_attempts=5, backoff=1, backoff_factor=2, max_backoff=3)
+    assert [retry.get_delay(attempt) for attempt in range(1, 5)] == [1, 2, 3, 3]
+
+
+@pytest.fixture
+def failing_workflow(failing_module):
+
+    config = {
+        "modules": [
+            {"module_type": failing_module, "module_alias": "failing"},
+            {"module_type": "not", "input_links": {"a": "failing.y"}},
+            {"module_type": "and"},
+        ],
+        "input_aliases": {"failing__a": "a", "and__a": "a", "and__b": "b"},
+        "output_aliases": {"not__y": "x", "and__y": "y"},
+    }
+    dharpa.DHARPA_MODULES.get_workflow_configs()["failing"] = {
+        "data": config,
+        "path": "failing.json",
+    }
+    yield "failing"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("failing")
+
+
+@pytest.mark.parametrize("executor", [None, ThreadPoolProcessor(max_workers=2)])
+def test_workflows_continue_on_error(failing_workflow, executor):
+
+    wf = dharpa.create_workflow(failing_workflow)
+    wf.inputs = {"a": True, "b": True}
+    with pytest.raises(Exception):
+        anyio.run(wf.process, executor)
+
+    wf = dharpa.create_workflow(failing_workflow)
+    wf.continue_on_error = True
+    wf.inputs = {"a": True, "b": True}
+    anyio.run(wf.process, executor)
+
+    # modules that don't depend on the failed one are still processed
+    assert wf.outputs.ALL == {"x": None, "y": True}
+    assert wf.last_run_stats.modules_failed == 1
+    assert wf.last_run_stats.errors == {"failing": "attempt 1 failed"}
+    assert wf.state == ModuleState.FAILED
+
+
+def test_input_snapshots_keep_their_values():
+
+    module = WorkflowModule({"module_type": "and"})
+    module.inputs = {"a": True, "b": False}
+    snapshot = module.inputs.items__snapshot()
+    version = module.inputs_version
+
+    module.inputs = {"a": False}
+    assert snapshot.a is True and snapshot.b is False
+    assert snapshot.items__version == version < module.inputs_version
+    with pytest.raises(Exception):
+        snapshot.a = False
+
+
+def test_processing_is_repeated_for_changed_inputs(sleeping_module):
+
+    module = WorkflowModule(
+        {"module_type": sleeping_module, "module_config": {"duration": 0.2}},
+        rerun_on_input_change=True,
+    )
+    module.inputs = {"a": 1}
+    results = []
+
+    async def process():
+        results.append(await module.process())
+
+    async def change_inputs():
+
+        async with anyio.create_task_group() as tg:
+            await tg.spawn(process)
+            await anyio.sleep(0.1)
+            module.inputs = {"a": 2}
+
+    anyio.run(change_inputs)
+
+    # the results of the first run are discarded, only the ones for the latest inputs are published
+    assert results == [True]
+    assert module.outputs.y == 2
+    assert module.results_are_current
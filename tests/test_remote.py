@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for processing modules on (local) remote workers."""
+
+import anyio
+import pytest
+import socket
+import threading
+
+import dharpa
+from dharpa.processing.remote import RemoteProcessor, WorkerServer
+from dharpa.workflows.modules import WorkflowModule
+
+
+@pytest.fixture
+def workers():
+
+    servers = []
+    for _ in range(3):
+        server = WorkerServer(host="127.0.0.1", port=0, heartbeat_interval=0.1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+    yield servers
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_remote_workflow(workers):
+
+    processor = RemoteProcessor([w.address for w in workers])
+
+    wf = dharpa.create_workflow("xor")
+    wf.inputs = {"a": True, "b": False}
+    anyio.run(wf.process, processor)
+
+    assert wf.outputs.ALL == {"y": True}
+
+
+def test_reassign_from_failed_workers(workers):
+
+    # accepts connections, but never answers
+    stalled = socket.create_server(("127.0.0.1", 0))
+    # nothing listens on this port anymore
+    closed = socket.create_server(("127.0.0.1", 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+
+    processor = RemoteProcessor(
+        [
+            f"127.0.0.1:{stalled.getsockname()[1]}",
+            f"127.0.0.1:{closed_port}",
+            workers[0].address,
+        ],
+        heartbeat_timeout=0.5,
+    )
+
+    wf = dharpa.create_workflow("xor")
+    wf.inputs = {"a": True, "b": True}
+    anyio.run(wf.process, processor)
+    stalled.close()
+
+    assert wf.outputs.ALL == {"y": False}
+
+
+def test_remote_processing_error(workers):
+
+    processor = RemoteProcessor([w.address for w in workers])
+
+    module = WorkflowModule(
+        {
+            "module_type": "dummy",
+            "module_config": {
+                "input_schema": {"a": {"type": "boolean"}},
+                "output_schema": {"y": {"type": "boolean"}},
+                "delay": -1,
+            },
+        }
+    )
+    module.inputs = {"a": True}
+
+    with pytest.raises(Exception, match="non-negative"):
+        anyio.run(module.process, processor)
+
+
+def test_single_worker_processes_modules_one_by_one(workers):
+
+    processor = RemoteProcessor([workers[0].address])
+
+    # 'or' and 'nand' are ready at the same time, one of them has to wait for the worker
+    wf = dharpa.create_workflow("xor")
+    wf.inputs = {"a": False, "b": True}
+    anyio.run(wf.process, processor)
+
+    assert wf.outputs.ALL == {"y": True}
+    assert not processor._busy and not processor._waiting
+
+
+def test_remote_outputs_are_streamed(workers):
+
+    processor = RemoteProcessor([w.address for w in workers])
+
+    module = WorkflowModule(
+        {
+            "module_type": "dummy",
+            "module_config": {
+                "input_schema": {"a": {"type": "boolean"}},
+                "output_schema": {"x": {"type": "integer"}, "y": {"type": "integer"}},
+                "outputs": {"x": 1, "y": 2},
+                "output_delays": {"x": 0, "y": 1},
+            },
+        },
+        publish_outputs_early=True,
+    )
+    module.inputs = {"a": True}
+    early = []
+
+    async def process():
+
+        async with anyio.create_task_group() as tg:
+            await tg.spawn(module.process, processor)
+            await anyio.sleep(0.5)
+            early.append(module.outputs.ALL)
+
+    anyio.run(process)
+
+    assert early == [{"x": 1, "y": None}]
+    assert module.outputs.ALL == {"x": 1, "y": 2}
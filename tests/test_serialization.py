@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for serializing the state of workflows, and polling for changes."""
+
+import anyio
+import json
+import pytest
+
+import dharpa
+from dharpa.workflows.modules import WorkflowModule
+from dharpa.workflows.serialization import WorkflowSerializer, get_serializer
+
+
+@pytest.mark.parametrize("exclude_none", [False, True])
+def test_serialized_state_matches_details(exclude_none):
+
+    wf = dharpa.create_workflow("xor")
+    assert wf.to_dict(exclude_none=exclude_none) == wf.to_details().dict(
+        by_alias=True, exclude_none=exclude_none
+    )
+
+    wf.inputs = {"a": True, "b": False}
+    anyio.run(wf.process)
+    data = wf.to_dict(exclude_none=exclude_none)
+    assert data == wf.to_details().dict(by_alias=True, exclude_none=exclude_none)
+    assert json.loads(wf.to_json(exclude_none=exclude_none)) == data
+    assert data["outputs"]["y"]["value"] is True
+
+
+def test_serialized_state_without_structure():
+
+    wf = dharpa.create_workflow("xor")
+    data = wf.to_dict(include_structure=False)
+    assert data["pipeline_structure"] is None
+    assert data == wf.to_details(include_structure=False).dict(by_alias=True)
+
+
+def test_serialized_tables_are_truncated():
+
+    rows = [{"id": i} for i in range(5)]
+    module = WorkflowModule(
+        {
+            "module_type": "dummy",
+            "module_config": {
+                "input_schema": {"a": {"type": "boolean"}},
+                "output_schema": {"table": {"type": "table"}},
+                "outputs": {"table": rows},
+            },
+        }
+    )
+    module.inputs = {"a": True}
+    anyio.run(module.process)
+
+    def table_value(serializer: WorkflowSerializer):
+        return serializer.module_to_dict(module)["outputs"]["table"]["value"]
+
+    assert table_value(WorkflowSerializer()) == rows
+    assert table_value(WorkflowSerializer(max_table_rows=2)) == rows[0:2]
+    assert table_value(WorkflowSerializer(max_table_rows=0)) == []
+
+
+def test_serializers_are_shared_per_options():
+
+    assert get_serializer() is get_serializer()
+    assert get_serializer(max_table_rows=2) is get_serializer(max_table_rows=2)
+    assert get_serializer(max_table_rows=2) is not get_serializer()
+    assert get_serializer(table_reference=True) is not get_serializer()
+
+
+def test_changes_since_version():
+
+    wf = dharpa.create_workflow("xor")
+    changes = wf.get_changes()
+    assert set(changes["modules"].keys()) == {
+        "xor",
+        "xor.or",
+        "xor.nand",
+        "xor.nand.and",
+        "xor.nand.not",
+        "xor.and",
+    }
+    # polling again without changes (after nested structures were created) returns nothing
+    version = changes["version"]
+    assert wf.get_changes(version) == {"version": version, "modules": {}}
+
+    wf.inputs = {"a": True}
+    changes = wf.get_changes(version)
+    assert list(changes["modules"].keys()) == ["xor"]
+    # only the values that changed are included
+    assert list(changes["modules"]["xor"]["inputs"].keys()) == ["a"]
+    assert changes["modules"]["xor"]["outputs"] == {}
+
+    version = changes["version"]
+    wf.inputs = {"b": False}
+    anyio.run(wf.process)
+    changes = wf.get_changes(version)
+    assert changes["modules"]["xor"]["state"] == "results_ready"
+    assert changes["modules"]["xor"]["outputs"]["y"]["value"] is True
+    assert changes["modules"]["xor.nand.not"]["outputs"]["y"]["value"] is True
+    assert wf.get_changes(changes["version"])["modules"] == {}
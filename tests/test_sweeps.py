@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for parameter sweeps over the inputs of a workflow."""
+
+import anyio
+import pytest
+
+import dharpa
+from dharpa.models import ModuleState
+from dharpa.processing.executors import ThreadPoolProcessor
+from dharpa.workflows.structure import WorkflowStructure
+from dharpa.workflows.sweeps import ParameterSweep
+
+
+def test_parameter_sweep_shares_upstream_modules():
+
+    wf = dharpa.create_workflow("topic_modelling")
+    wf.inputs = {
+        "path_to_data": "corpus.csv",
+        "parse_date": False,
+        "parse_isin": False,
+        "max_year": 2000,
+        "lowercase": True,
+        "filter_tokens": False,
+    }
+
+    workflow_sweep = ParameterSweep(
+        wf, {"min_year": [1970, 1980], "tokenize": ["word", "char", "sentence"]}
+    )
+    assert workflow_sweep.module_variants == {
+        "data_upload": 1,
+        "select_subset": 2,
+        "pre_process": 6,
+    }
+
+    runs = anyio.run(workflow_sweep.process, ThreadPoolProcessor(max_workers=8))
+
+    assert len(runs) == 6
+    assert runs[0].run_stats.modules_processed == 9
+    for combination, workflow_run in zip(workflow_sweep.combinations, runs):
+        assert workflow_run.state == ModuleState.RESULTS_READY
+        assert workflow_run.inputs["min_year"].value == combination["min_year"]
+        assert workflow_run.inputs["tokenize"].value == combination["tokenize"]
+
+
+@pytest.fixture
+def not_and_workflow():
+
+    config = {
+        "modules": [
+            # listed downstream first, and with one module that is named after its type
+            {
+                "module_type": "and",
+                "module_alias": "conjunction",
+                "input_links": {"a": "not.y"},
+            },
+            {"module_type": "not"},
+        ],
+        "input_aliases": {"not__a": "a", "conjunction__b": "b"},
+        "output_aliases": {"conjunction__y": "y"},
+    }
+    dharpa.DHARPA_MODULES.get_workflow_configs()["sweep_not_and"] = {
+        "data": config,
+        "path": "sweep_not_and.json",
+    }
+    yield "sweep_not_and"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("sweep_not_and")
+
+
+@pytest.mark.parametrize("reverse_modules", [False, True])
+def test_parameter_sweep_matches_configs_by_alias(
+    not_and_workflow, reverse_modules, monkeypatch
+):
+
+    if reverse_modules:
+        # the configs of a sweep must not depend on the order of the modules in the structure
+        modules = WorkflowStructure.modules.fget  # type: ignore
+        monkeypatch.setattr(
+            WorkflowStructure,
+            "modules",
+            property(lambda self: list(reversed(list(modules(self))))),
+        )
+
+    wf = dharpa.create_workflow(not_and_workflow)
+    wf.inputs = {"b": True}
+
+    workflow_sweep = ParameterSweep(wf, {"a": [True, False]})
+    assert workflow_sweep.module_variants == {"not": 2, "conjunction": 2}
+    module_types = {
+        m["module_alias"]: m["module_type"]
+        for m in workflow_sweep.workflow_config["modules"]
+    }
+    assert module_types == {
+        "not[0]": "not",
+        "not[1]": "not",
+        "conjunction[0]": "and",
+        "conjunction[1]": "and",
+    }
+
+    runs = anyio.run(workflow_sweep.process)
+    assert [workflow_run.outputs.ALL for workflow_run in runs] == [
+        {"y": False},
+        {"y": True},
+    ]
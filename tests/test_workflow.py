@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for processing workflows, and the options that change how they are processed."""
+
+import anyio
+import gc
+import pytest
+
+import dharpa
+from dharpa.models import RunOptions
+from dharpa.workflows.modules import InputItems, OutputItems
+from dharpa.workflows.scheduling import RuntimeStatsStore
+from dharpa.workflows.structure import WorkflowStructure
+
+
+def _count_structures() -> int:
+
+    gc.collect()
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, WorkflowStructure))
+
+
+def test_repeated_runs_keep_memory_bounded():
+
+    wf = dharpa.create_workflow("xor")
+
+    counts = []
+    for i in range(5):
+        wf.inputs = {"a": bool(i % 2), "b": True}
+        anyio.run(wf.process)
+        workflow_run = anyio.run(wf.run, {"a": True, "b": False})
+        assert wf.outputs.ALL == {"y": not bool(i % 2)}
+        assert workflow_run.outputs.ALL == {"y": True}
+        counts.append(_count_structures())
+
+    # the analysed structures, and the ones of the last run
+    assert counts[0] == counts[-1]
+
+
+@pytest.fixture(scope="module")
+def not_and_workflow():
+
+    config = {
+        "modules": [
+            {"module_type": "not"},
+            {"module_type": "and", "input_links": {"a": "not.y"}},
+        ],
+        "input_aliases": {"not__a": "a", "and__b": "b"},
+        "output_aliases": {"and__y": "y"},
+    }
+    dharpa.DHARPA_MODULES.get_workflow_configs()["not_and"] = {
+        "data": config,
+        "path": "not_and.json",
+    }
+    yield "not_and"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("not_and")
+
+
+def test_memory_budget_releases_intermediate_values(not_and_workflow):
+
+    wf = dharpa.create_workflow(not_and_workflow)
+    wf.memory_budget = 10 ** 9
+    wf.inputs = {"a": False, "b": True}
+    anyio.run(wf.process)
+
+    assert wf.outputs.ALL == {"y": True}
+    not_module = wf.structure.get_module("not")
+    assert not_module.outputs["y"].is_released
+    assert not_module.outputs["y"].valid
+    assert not wf.structure.get_module("and").outputs["y"].is_released
+
+
+def test_spilled_values_are_loaded_for_callbacks(not_and_workflow):
+
+    wf = dharpa.create_workflow(not_and_workflow)
+    # every value exceeds the budget, so the workflow output is spilled
+    wf.memory_budget = 1
+    wf.inputs = {"a": False, "b": True}
+
+    received = []
+    wf.outputs["y"].add_callback(received.append)
+    anyio.run(wf.process)
+
+    assert wf.outputs["y"].is_spilled
+    assert received == [True]
+    assert wf.outputs.ALL == {"y": True}
+
+
+@pytest.mark.parametrize("memory_budget", [None, 10 ** 9])
+def test_computed_outputs_after_processing(not_and_workflow, memory_budget):
+
+    wf = dharpa.create_workflow(not_and_workflow)
+    wf.memory_budget = memory_budget
+    wf.inputs = {"a": False, "b": True}
+    anyio.run(wf.process)
+    assert wf.outputs.ALL == {"y": True}
+
+    wf.inputs = {"b": False}
+    assert anyio.run(wf.get_output, "y") is False
+    if memory_budget is None:
+        assert wf.last_run_stats.modules_reused == 1
+    else:
+        # the output of 'not' was released after the last run, so it has to be computed again
+        assert wf.last_run_stats.modules_processed == 2
+
+
+def test_auto_process_follows_input_changes(not_and_workflow):
+
+    wf = dharpa.create_workflow(not_and_workflow)
+    results = []
+
+    async def change_inputs():
+
+        async with anyio.create_task_group() as tg:
+            await tg.spawn(wf.auto_process, None, 0)
+            # nothing is processed until the inputs are valid
+            await anyio.sleep(0.1)
+            assert wf.last_run_stats is None
+
+            wf.inputs = {"a": False, "b": True}
+            await anyio.sleep(0.2)
+            results.append(wf.outputs.ALL)
+
+            # rapid changes are coalesced, only the latest inputs are processed
+            for b in (False, True, False):
+                wf.inputs = {"b": b}
+            await anyio.sleep(0.2)
+            results.append(wf.outputs.ALL)
+
+            await tg.cancel_scope.cancel()
+
+    anyio.run(change_inputs)
+
+    assert results == [{"y": True}, {"y": False}]
+    assert wf._inputs_changed is None
+
+
+def test_runtime_stats_are_saved_once_per_run(tmp_path, monkeypatch):
+
+    store = RuntimeStatsStore(tmp_path / "runtime_stats.json")
+    saved = []
+    save = store.save
+    monkeypatch.setattr(store, "save", lambda: saved.append(save()))
+
+    # 'xor' contains the nested workflow 'nand'
+    wf = dharpa.create_workflow("xor")
+    wf.runtime_stats = store
+    wf.inputs = {"a": True, "b": False}
+    anyio.run(wf.process)
+
+    assert wf.outputs.ALL == {"y": True}
+    assert len(saved) == 1
+    # modules of nested workflows are recorded as well
+    nested = wf.structure.get_module("nand").structure  # type: ignore
+    assert store.estimate(nested.get_module("not")) is not None
+    assert RuntimeStatsStore(tmp_path / "runtime_stats.json").stats == store.stats
+
+
+def test_run_options_apply_to_nested_workflows(tmp_path):
+
+    store = RuntimeStatsStore(tmp_path / "runtime_stats.json")
+    wf = dharpa.create_workflow("xor")
+    wf.run_options = RunOptions(runtime_stats=store)
+    assert wf.runtime_stats is store
+    wf.inputs = {"a": True, "b": False}
+    anyio.run(wf.process)
+
+    nested = wf.structure.get_module("nand")
+    assert nested.run_options.runtime_stats is store  # type: ignore
+    assert store.estimate(nested.structure.get_module("not")) is not None  # type: ignore
+
+    # the processing object of a workflow is processed with the same options, outside of a workflow module as well
+    processing_obj = wf._processing_obj
+    inputs = InputItems(**processing_obj.input_schemas)
+    inputs.set_values(a=False, b=False)
+    outputs = OutputItems(**processing_obj.output_schemas)
+    saved = []
+    store.save = lambda: saved.append(True)
+    anyio.run(processing_obj.process, inputs, outputs)
+    assert outputs.ALL == {"y": False}
+    assert saved == [True]
+
+
+@pytest.fixture(scope="module")
+def duplicates_workflow():
+
+    config = {
+        "modules": [
+            {"module_type": "not", "module_alias": "not_1"},
+            {"module_type": "not", "module_alias": "not_2"},
+            {"module_type": "and", "input_links": {"a": "not_1.y", "b": "not_2.y"}},
+        ],
+        "input_aliases": {"not_1__a": "a", "not_2__a": "a"},
+        "output_aliases": {"and__y": "y"},
+    }
+    dharpa.DHARPA_MODULES.get_workflow_configs()["duplicates"] = {
+        "data": config,
+        "path": "duplicates.json",
+    }
+    yield "duplicates"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("duplicates")
+
+
+@pytest.mark.parametrize("deduplicate_modules", [False, True])
+def test_duplicate_modules_are_processed_once(duplicates_workflow, deduplicate_modules):
+
+    wf = dharpa.create_workflow(duplicates_workflow)
+    wf.deduplicate_modules = deduplicate_modules
+    wf.inputs = {"a": False}
+    anyio.run(wf.process)
+
+    assert wf.outputs.ALL == {"y": True}
+    # the outputs of a duplicate are copied, so it's in the same state as if it had been processed
+    assert wf.structure.get_module("not_2").outputs.y is True
+
+    stats = wf.last_run_stats
+    if deduplicate_modules:
+        assert stats.modules_deduplicated == 1
+        assert stats.modules_processed == 2
+        assert stats.duplicate_groups == {"not_1": ["not_2"]}
+    else:
+        assert stats.modules_deduplicated == 0
+        assert stats.modules_processed == 3
+
+
+@pytest.mark.parametrize("a", [False, True])
+@pytest.mark.parametrize("b", [False, True])
+def test_flattened_workflows_have_the_same_results(a, b):
+
+    expected = dharpa.create_workflow("xor")
+    expected.inputs = {"a": a, "b": b}
+    anyio.run(expected.process)
+
+    wf = dharpa.create_workflow("xor")
+    wf.flatten = True
+    wf.inputs = {"a": a, "b": b}
+    anyio.run(wf.process)
+
+    assert wf.outputs.ALL == expected.outputs.ALL == {"y": a != b}
+    # 'or', 'and', and the two modules of the nested 'nand' workflow
+    assert wf.last_run_stats.modules_total == 4
+    assert wf.last_run_stats.modules_processed == 4
+    # values are written back into the nested workflow
+    nand = wf.structure.get_module("nand")
+    assert nand.outputs.y == (not (a and b))
+    assert nand.structure.get_module("and").outputs.y == (a and b)  # type: ignore
+    assert wf.to_dict() == expected.to_dict()
+
+
+@pytest.fixture(scope="module")
+def nested_duplicates_workflow():
+
+    config = {
+        "modules": [
+            {"module_type": "nand", "module_alias": "nand_1"},
+            {"module_type": "nand", "module_alias": "nand_2"},
+            {"module_type": "and", "input_links": {"a": "nand_1.y", "b": "nand_2.y"}},
+        ],
+        "input_aliases": {
+            "nand_1__a": "a",
+            "nand_1__b": "b",
+            "nand_2__a": "a",
+            "nand_2__b": "b",
+        },
+        "output_aliases": {"and__y": "y"},
+    }
+    dharpa.DHARPA_MODULES.get_workflow_configs()["nested_duplicates"] = {
+        "data": config,
+        "path": "nested_duplicates.json",
+    }
+    yield "nested_duplicates"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("nested_duplicates")
+
+
+def test_flattened_workflows_deduplicate_nested_modules(nested_duplicates_workflow):
+
+    wf = dharpa.create_workflow(nested_duplicates_workflow)
+    wf.flatten = True
+    wf.deduplicate_modules = True
+    wf.inputs = {"a": True, "b": False}
+    anyio.run(wf.process)
+
+    assert wf.outputs.ALL == {"y": True}
+    assert wf.structure.get_module("nand_2").outputs.y is True
+    assert wf.last_run_stats.duplicate_groups == {
+        "nand_1.and": ["nand_2.and"],
+        "nand_1.not": ["nand_2.not"],
+    }
+    assert wf.last_run_stats.modules_processed == 3
+
+
+@pytest.fixture(scope="module")
+def two_outputs_workflow():
+
+    config = {
+        "modules": [
+            {"module_type": "not"},
+            {"module_type": "and", "input_links": {"a": "not.y"}},
+            {"module_type": "or", "input_links": {"a": "not.y"}},
+        ],
+        "input_aliases": {"not__a": "a", "and__b": "b", "or__b": "b"},
+        "output_aliases": {"and__y": "y", "or__y": "z"},
+    }
+    dharpa.DHARPA_MODULES.get_workflow_configs()["two_outputs"] = {
+        "data": config,
+        "path": "two_outputs.json",
+    }
+    yield "two_outputs"
+    dharpa.DHARPA_MODULES.get_workflow_configs().pop("two_outputs")
+
+
+def test_only_modules_for_requested_outputs_are_processed(two_outputs_workflow):
+
+    wf = dharpa.create_workflow(two_outputs_workflow)
+    wf.inputs = {"a": False, "b": False}
+
+    with pytest.raises(ValueError):
+        anyio.run(wf.process, None, ["x"])
+
+    anyio.run(wf.process, None, ["y"])
+    assert wf.outputs.ALL == {"y": False, "z": None}
+    assert wf.last_run_stats.modules_processed == 2
+    assert wf.last_run_stats.modules_pruned == 1
+
+    anyio.run(wf.process)
+    assert wf.outputs.ALL == {"y": False, "z": True}
+    assert wf.last_run_stats.modules_pruned == 0
+
+
+def test_unused_modules_are_pruned(two_outputs_workflow):
+
+    workflow_configs = dharpa.DHARPA_MODULES.get_workflow_configs()
+    config = dict(workflow_configs[two_outputs_workflow]["data"])
+    # the output of 'or' isn't a workflow output anymore, so it doesn't contribute to anything
+    config["output_aliases"] = {"and__y": "y"}
+    workflow_configs["one_output"] = {"data": config, "path": "one_output.json"}
+    try:
+        wf = dharpa.create_workflow("one_output")
+        wf.prune_unused_modules = True
+        wf.inputs = {"a": False, "b": False}
+        anyio.run(wf.process)
+    finally:
+        workflow_configs.pop("one_output")
+
+    assert wf.outputs.ALL == {"y": False}
+    assert wf.last_run_stats.modules_pruned == 1
+    assert wf.structure.get_module("or").outputs.y is None